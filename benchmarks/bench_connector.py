@@ -0,0 +1,86 @@
+"""
+Micro-benchmark of the per-call overhead of JelasticAPIConnector._()
+
+The httpx client is replaced by a stub returning a canned response, so that only
+the request construction (URI, payload, logging) and the response parsing are
+measured.
+
+    python -m benchmarks.bench_connector
+"""
+
+import logging
+import timeit
+
+import httpx
+
+from jelapi.connector import JelasticAPIConnector
+
+APIURL = "https://api.example.org/"
+CALLS = 20000
+ROUNDS = 5
+
+
+class _StubClient:
+    """
+    Stands in for httpx.Client, without any transport
+    """
+
+    def request(self, method: str, url: str, data: dict, **kwargs) -> httpx.Response:
+        return httpx.Response(200, content=b'{"result": 0}')
+
+
+class _LegacyConnector(JelasticAPIConnector):
+    """
+    Request construction as it was: split/format/lower and eager log formatting on each call
+    """
+
+    def _apicall(self, uri: str, method: str = "get", data: dict = {}):
+        self.logger.debug("_apicall {} {}, data:{}".format(method.upper(), uri, data))
+        data.update(self.apidata)
+        r = self.client.request(
+            method=method, url="{url}{uri}".format(url=self.apiurl, uri=uri), data=data
+        )
+        return self._parse_response(r, uri=uri, method=method)
+
+    def _(self, function: str, **kwargs):
+        self.logger.info("{fnc}({data})".format(fnc=function, data=kwargs))
+        uri_chunks = function.split(".")
+        uri = "{grp}/{cls}/REST/{fnc}".format(
+            grp=uri_chunks[0], cls=uri_chunks[1], fnc=uri_chunks[2]
+        ).lower()
+        return self._apicall(uri=uri, method="post", data=kwargs)
+
+
+def _connector(cls) -> JelasticAPIConnector:
+    connector = cls(apiurl=APIURL, apitoken="secret")
+    connector.client = _StubClient()
+    return connector
+
+
+def main() -> None:
+    import jelapi
+
+    logging.basicConfig(level=logging.WARNING)
+    variants = [
+        ("legacy", _LegacyConnector, True),
+        ("current", JelasticAPIConnector, True),
+        ("current, coalesce_reads off", JelasticAPIConnector, False),
+    ]
+    best = {name: float("inf") for name, _, _ in variants}
+    # Interleaved rounds, keeping each variant's best: the order doesn't favour any
+    for _ in range(ROUNDS):
+        for name, cls, coalesce_reads in variants:
+            jelapi.coalesce_reads = coalesce_reads
+            connector = _connector(cls)
+
+            def call():
+                connector._("Environment.Control.GetEnvInfo", envName="env-name")
+
+            best[name] = min(best[name], timeit.timeit(call, number=CALLS))
+    jelapi.coalesce_reads = True
+    for name, seconds in best.items():
+        print(f"{name:>28}: {seconds / CALLS * 1e6:8.2f} µs per call")
+
+
+if __name__ == "__main__":
+    main()
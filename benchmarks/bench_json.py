@@ -0,0 +1,57 @@
+"""
+Benchmark of the JSON backends on a large synthetic GetEnvs response
+
+Each environment has the standard nodeGroups and a few nodes; the response is
+decoded (as the connector does) and the topology encoded (as ChangeTopology does).
+
+    python -m benchmarks.bench_json [environments]
+"""
+
+import sys
+import timeit
+
+from jelapi import jsonbackend
+from tests.utils import get_standard_env, get_standard_node, get_standard_node_groups
+
+ENVIRONMENTS = 1000
+NODES = 4
+
+
+def _getenvs(environments: int) -> dict:
+    return {
+        "result": 0,
+        "infos": [
+            {
+                "env": {**get_standard_env(), "envName": f"env-{i}"},
+                "envGroups": ["group"],
+                "nodeGroups": get_standard_node_groups(),
+                "nodes": [get_standard_node(id=i * NODES + n) for n in range(NODES)],
+            }
+            for i in range(environments)
+        ],
+    }
+
+
+def main() -> None:
+    environments = int(sys.argv[1]) if len(sys.argv) > 1 else ENVIRONMENTS
+    getenvs = _getenvs(environments)
+    previous = jsonbackend.backend
+    payload = None
+    for name in ["json", "ujson", "orjson"]:
+        try:
+            jsonbackend.use(name)
+        except ImportError:
+            print(f"{name:>8}: not installed")
+            continue
+        payload = payload or jsonbackend.dumps(getenvs).encode()
+        loads = min(timeit.repeat(lambda: jsonbackend.loads(payload), number=5)) / 5
+        dumps = min(timeit.repeat(lambda: jsonbackend.dumps(getenvs), number=5)) / 5
+        print(
+            f"{name:>8}: loads {loads * 1e3:8.2f} ms, dumps {dumps * 1e3:8.2f} ms"
+            f" ({len(payload) / 2 ** 20:.1f} MiB)"
+        )
+    jsonbackend.use(previous)
+
+
+if __name__ == "__main__":
+    main()
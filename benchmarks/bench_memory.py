@@ -0,0 +1,58 @@
+"""
+Memory benchmark of a synthetic fleet of environments, built from jelapi.factories
+
+Each standard environment has three nodeGroups of one node each; the fleet is
+measured with tracemalloc, with and without retaining the raw API payloads.
+
+    python -m benchmarks.bench_memory [nodes]
+"""
+
+import gc
+import sys
+import tracemalloc
+from typing import List
+
+import jelapi
+from jelapi.classes import JelasticEnvironment
+from jelapi.factories import JelasticEnvironmentFactory
+
+NODES = 10000
+
+
+def _fleet(nodes: int) -> List[JelasticEnvironment]:
+    envs = []
+    built = 0
+    while built < nodes:
+        env = JelasticEnvironmentFactory()
+        built += sum(len(ng.nodes) for ng in env.nodeGroups.values())
+        envs.append(env)
+    return envs
+
+
+def _measure(nodes: int, retain_api_payload: bool) -> int:
+    jelapi.retain_api_payload = retain_api_payload
+    gc.collect()
+    tracemalloc.start()
+    fleet = _fleet(nodes)
+    gc.collect()
+    current, _ = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    del fleet
+    return current
+
+
+def main() -> None:
+    nodes = int(sys.argv[1]) if len(sys.argv) > 1 else NODES
+    # Warm up the factories' and the classes' lazy initializations
+    _fleet(3)
+    for retain_api_payload in [True, False]:
+        current = _measure(nodes, retain_api_payload)
+        print(
+            f"retain_api_payload={retain_api_payload!s:>5}: "
+            f"{current / 2 ** 20:8.2f} MiB, {current / nodes:8.0f} bytes per node"
+        )
+    jelapi.retain_api_payload = True
+
+
+if __name__ == "__main__":
+    main()
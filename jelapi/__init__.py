@@ -1,9 +1,49 @@
 # JelasticAPI
+import threading
 
 # Configuration variables
 api_url = None
 api_token = None
 hoster_domain = None
+# Seconds during which JelasticEnvironment.dict() and JelasticEnvGroup.dict() are cached
+# (None: forever), then seconds during which the stale value is served while revalidating
+cache_ttl = 300
+cache_stale_ttl = 60
+# Whether objects keep the raw API payload they were built from (_env, _node, ...); without
+# it, less memory is used, but refresh_dict() updates every object instead of the changed ones
+retain_api_payload = True
+# httpx connection pool of the connectors (the synchronous ones share one client per api_url),
+# and whether to use HTTP/2, multiplexing the concurrent calls over fewer connections
+pool_max_connections = 100
+pool_max_keepalive_connections = 20
+pool_keepalive_expiry = 5.0
+http2 = False
+# Retries of the idempotent calls (Get*, Read*, Check*) on transport errors and HTTP 502/503/504,
+# each after a random backoff of up to retry_backoff * 2**attempt (max retry_backoff_max) seconds
+retries = 3
+retry_backoff = 0.5
+retry_backoff_max = 10.0
+# Timeouts in seconds (None: none) of the idempotent calls, and of specific functions
+read_timeout = 60.0
+function_timeouts = {
+    "Environment.Control.ChangeTopology": 1800.0,
+    "Environment.Control.CloneEnv": 1800.0,
+    "Environment.Control.RedeployContainers": 1800.0,
+    "Environment.Control.RedeployContainersByGroup": 1800.0,
+}
+# Client-side rate limiter of all connectors without their own (see jelapi.ratelimit), None: none
+rate_limiter = None
+# Whether identical concurrent idempotent calls (same connector, function and arguments) share
+# one request; the first caller gets the response, the others deep copies of it
+coalesce_reads = True
+# Seconds during which the connectors cache the responses of these idempotent functions, e.g.
+# {"Environment.Control.GetEnvInfo": 10}; a successful mutating call on an envName forgets its
+# responses. At most response_cache_size responses are kept per apiurl, for all its connectors.
+response_cache_ttls = {}
+response_cache_size = 1024
+# jelapi.snapshot.FleetSnapshot in which the connectors store the GetEnvs, GetEnvInfo and
+# GetGroups responses, to hydrate the objects from at the next start; None: none
+fleet_snapshot = None
 
 
 from .classes import (  # noqa
@@ -20,6 +60,8 @@ from .exceptions import (  # noqa
 )
 
 _api_connector = None
+# Threads (see jelapi.fleet) must not each create their own global connector
+_api_connector_lock = threading.Lock()
 
 
 def api_connector():
@@ -29,14 +71,42 @@ def api_connector():
     global _api_connector, api_url, api_token
     from .connector import JelasticAPIConnector
 
+    with _api_connector_lock:
+        if (
+            isinstance(_api_connector, JelasticAPIConnector)
+            and _api_connector.is_functional()
+            and _api_connector.apiurl == api_url
+        ):
+            # Only return the global one if it is somewhat functional; keep it on token rotation
+            if _api_connector.apitoken != api_token:
+                _api_connector.set_token(api_token)
+            if _api_connector.is_functional():
+                return _api_connector
+
+        _api_connector = JelasticAPIConnector(apiurl=api_url, apitoken=api_token)
+        return _api_connector
+
+
+_async_api_connector = None
+
+
+def async_api_connector():
+    """
+    Get the global jelapi asynchronous api_connector
+    """
+    global _async_api_connector
+    from .connector import AsyncJelasticAPIConnector
+
     if (
-        isinstance(_api_connector, JelasticAPIConnector)
-        and _api_connector.is_functional()
-        and _api_connector.apiurl == api_url
-        and _api_connector.apitoken == api_token
+        isinstance(_async_api_connector, AsyncJelasticAPIConnector)
+        and _async_api_connector.is_functional()
+        and _async_api_connector.apiurl == api_url
     ):
-        # Only return the global one if it is somewhat functional
-        return _api_connector
+        # Only return the global one if it is somewhat functional; keep it on token rotation
+        if _async_api_connector.apitoken != api_token:
+            _async_api_connector.set_token(api_token)
+        if _async_api_connector.is_functional():
+            return _async_api_connector
 
-    _api_connector = JelasticAPIConnector(apiurl=api_url, apitoken=api_token)
-    return _api_connector
+    _async_api_connector = AsyncJelasticAPIConnector(apiurl=api_url, apitoken=api_token)
+    return _async_api_connector
@@ -0,0 +1,245 @@
+import threading
+import time
+from collections import OrderedDict
+from copy import deepcopy
+from functools import update_wrapper
+from typing import (
+    Any,
+    Callable,
+    Dict,
+    FrozenSet,
+    Hashable,
+    Iterator,
+    NamedTuple,
+    Optional,
+    Tuple,
+)
+
+
+class _CacheEntry(NamedTuple):
+    value: Any
+    stored_at: float
+
+
+def _hashable(value: Any) -> Any:
+    """
+    Lists and iterators (as fields=[...]) as tuples, sets as frozensets
+    """
+    if isinstance(value, (set, frozenset)):
+        return frozenset(value)
+    if isinstance(value, list) or isinstance(value, Iterator):
+        return tuple(value)
+    return value
+
+
+class _TTLCache:
+    """
+    Cache a function's results per (api_url, api_token) and arguments, for jelapi.cache_ttl seconds
+    Past that, and for jelapi.cache_stale_ttl more seconds, the stale result is still returned,
+    while it gets revalidated in a background thread (stale-while-revalidate).
+    Results of calls started before an invalidate() or cache_clear() aren't stored.
+    """
+
+    def __init__(self, fnc: Callable[..., Any]) -> None:
+        update_wrapper(self, fnc)
+        self._fnc = fnc
+        self._entries: Dict[Hashable, _CacheEntry] = {}
+        self._revalidating: Dict[Hashable, threading.Thread] = {}
+        self._lock = threading.Lock()
+        # Bumped by cache_clear(), and by invalidate() per (api_url, api_token)
+        self._generation = 0
+        self._generations: Dict[Tuple[Any, Any], int] = {}
+
+    @staticmethod
+    def _settings() -> Tuple[Any, Any, Any, Any]:
+        import jelapi
+
+        return (
+            jelapi.api_url,
+            jelapi.api_token,
+            jelapi.cache_ttl,
+            jelapi.cache_stale_ttl,
+        )
+
+    def _key_generation(self, key: Tuple) -> Tuple[int, int]:
+        return self._generation, self._generations.get(key[:2], 0)
+
+    def _store(self, key: Tuple, value: Any, generation: Tuple[int, int]) -> None:
+        with self._lock:
+            # Invalidated since the call started: its result may be outdated
+            if generation != self._key_generation(key):
+                return
+            self._entries[key] = _CacheEntry(value=value, stored_at=time.monotonic())
+
+    def _revalidate(
+        self, key: Tuple, args: tuple, kwargs: dict, generation: Tuple[int, int]
+    ) -> None:
+        try:
+            self._store(key, self._fnc(*args, **kwargs), generation)
+        except Exception:
+            # Keep serving the stale value; the next call past stale_ttl will raise
+            pass
+        finally:
+            with self._lock:
+                self._revalidating.pop(key, None)
+
+    def __call__(self, *args, **kwargs) -> Any:
+        api_url, api_token, ttl, stale_ttl = self._settings()
+        # The function gets the same, hashable, arguments as the key
+        args = tuple(_hashable(arg) for arg in args)
+        kwargs = {k: _hashable(v) for k, v in kwargs.items()}
+        key = (api_url, api_token, args, tuple(sorted(kwargs.items())))
+
+        with self._lock:
+            entry = self._entries.get(key)
+            generation = self._key_generation(key)
+        if entry:
+            age = time.monotonic() - entry.stored_at
+            if ttl is None or age < ttl:
+                return entry.value
+            if stale_ttl and age < ttl + stale_ttl:
+                with self._lock:
+                    if key not in self._revalidating:
+                        thread = threading.Thread(
+                            target=self._revalidate,
+                            args=(key, args, kwargs, generation),
+                            daemon=True,
+                        )
+                        self._revalidating[key] = thread
+                        thread.start()
+                return entry.value
+
+        value = self._fnc(*args, **kwargs)
+        self._store(key, value, generation)
+        return value
+
+    def invalidate(self) -> None:
+        """
+        Forget the cached values for the current api_url and api_token
+        """
+        api_url, api_token, _, _ = self._settings()
+        account = (api_url, api_token)
+        with self._lock:
+            self._generations[account] = self._generations.get(account, 0) + 1
+            for key in [k for k in self._entries if k[:2] == account]:
+                del self._entries[key]
+
+    def cache_clear(self) -> None:
+        """
+        Forget all cached values (lru_cache-compatible)
+        """
+        with self._lock:
+            self._generation += 1
+            self._entries.clear()
+
+
+def ttl_cache(fnc: Callable[..., Any]) -> _TTLCache:
+    """
+    Decorator, see _TTLCache
+    """
+    return _TTLCache(fnc)
+
+
+# Returned by ResponseCache.get() when it has no (fresh) response
+MISS = object()
+
+
+class ResponseCache:
+    """
+    Cache of the connectors' responses to idempotent calls, keyed by
+    (token, function, frozen set of arguments), for jelapi.response_cache_ttls[function] seconds.
+    It keeps up to jelapi.response_cache_size responses, evicting the least recently used;
+    get() and put() deep copy them, as callers keep and mutate what they get.
+    Mutating calls also bump generations, per envName (None: account-wide responses) and
+    overall, so that responses to reads started before them are neither cached nor shared.
+    """
+
+    def __init__(self) -> None:
+        self._entries: "OrderedDict[Hashable, _CacheEntry]" = OrderedDict()
+        self._lock = threading.Lock()
+        self._generation = 0
+        self._generations: Dict[Optional[str], int] = {}
+        self.hits = 0
+        self.misses = 0
+
+    @staticmethod
+    def ttl(function: str) -> Optional[float]:
+        """
+        Seconds the responses of that function are cached; None if they aren't
+        """
+        import jelapi
+
+        return jelapi.response_cache_ttls.get(function)
+
+    def get(self, key: Tuple[Any, str, FrozenSet]) -> Any:
+        """
+        Get a copy of the cached response, or MISS
+        """
+        ttl = self.ttl(key[1])
+        if ttl is None:
+            return MISS
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and time.monotonic() - entry.stored_at < ttl:
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return deepcopy(entry.value)
+            self.misses += 1
+        return MISS
+
+    def generation(self, envName: Optional[str]) -> Tuple[int, int]:
+        """
+        Generation of the responses about that envName (None: account-wide), to get before
+        doing a read; it changes with each mutating call invalidating them
+        """
+        return self._generation, self._generations.get(envName, 0)
+
+    def put(
+        self,
+        key: Tuple[Any, str, FrozenSet],
+        response: Any,
+        generation: Optional[Tuple[int, int]] = None,
+    ) -> None:
+        """
+        Cache a copy of the response, if its function is cached, and, when given the
+        generation the read started at, if no mutating call invalidated it since
+        """
+        import jelapi
+
+        if self.ttl(key[1]) is None:
+            return
+        envName = dict(key[2]).get("envName")
+        entry = _CacheEntry(value=deepcopy(response), stored_at=time.monotonic())
+        with self._lock:
+            if generation is not None and generation != self.generation(envName):
+                return
+            self._entries[key] = entry
+            self._entries.move_to_end(key)
+            while len(self._entries) > jelapi.response_cache_size:
+                self._entries.popitem(last=False)
+
+    def invalidate(self, kwargs: Dict[str, Any]) -> None:
+        """
+        A mutating call succeeded: forget the responses about its envName, and the
+        account-wide ones (GetEnvs, GetGroups, ...); all of them if it has no envName
+        """
+        envName = kwargs.get("envName")
+        with self._lock:
+            if envName is None:
+                self._generation += 1
+            else:
+                for name in (envName, None):
+                    self._generations[name] = self._generations.get(name, 0) + 1
+            for key in list(self._entries):
+                cached_envName = dict(key[2]).get("envName")
+                if envName is None or cached_envName in (None, envName):
+                    del self._entries[key]
+
+    def clear(self) -> None:
+        """
+        Forget all cached responses, and reset the counters
+        """
+        with self._lock:
+            self._entries.clear()
+            self.hits = 0
+            self.misses = 0
@@ -9,6 +9,9 @@ class _JelasticVolume(_JelasticObject):
     Represents a Jelastic Volume (CountainerVolume or MountPoint)
     """
 
+    _parent_attribute = "_nodeGroup"
+    _slots = ("_envName",)
+
     # 'parent'
     nodeGroup = _JelAttr(read_only=True, checked_for_differences=False)
 
@@ -1,10 +1,11 @@
-from copy import deepcopy
+import threading
 from enum import Enum
-from functools import lru_cache
-from json import dumps as jsondumps
-from typing import Any, Dict, List, Optional
+from typing import Any, Dict, Iterable, Iterator, List, Optional, Set
 
+from ..cache import ttl_cache
 from ..exceptions import JelasticObjectException, deprecation
+from ..jsonbackend import dumps
+from .group import JelasticEnvGroup
 from .jelasticobject import _JelasticAttribute as _JelAttr
 from .jelasticobject import (
     _JelasticObject,
@@ -44,6 +45,10 @@ class JelasticEnvironment(_JelasticObject):
         GOING_TO_SLEEP = 14
         REFRESHING = 1002
 
+    _slots = ("_env", "_lazy_info")
+    # Held while building lazy nodeGroups, or replacing what they'd be built from
+    _lazy_lock = threading.RLock()
+
     displayName = _JelAttrStr()
     envGroups = _JelAttrList()
     status = _JelAttr()
@@ -57,22 +62,38 @@ class JelasticEnvironment(_JelasticObject):
     sslstate = _JelAttrBool()
 
     @staticmethod
-    def get(envName: str) -> "JelasticEnvironment":
+    def get(
+        envName: str, fields: Optional[Iterable[str]] = None
+    ) -> "JelasticEnvironment":
         """
         Static method to get one environment
+        With fields, only these attributes are set (see update_projection_from_info())
         """
+        fields = None if fields is None else frozenset(fields)
         # This is needed as it's a static method
         from .. import api_connector as jelapi_connector
 
         response = jelapi_connector()._(
             "Environment.Control.GetEnvInfo", envName=envName
         )
-        j = JelasticEnvironment()
-        j.update_from_env_dict(response["env"])
-        j.update_env_groups_from_info(response.get("envGroups", []))
-        j.update_node_groups_from_info(response.get("nodeGroups", []))
-        j.update_nodes_from_info(response.get("nodes", []))
-        return j
+        return JelasticEnvironment._from_info(response, fields=fields)
+
+    @staticmethod
+    async def aget(
+        envName: str, fields: Optional[Iterable[str]] = None
+    ) -> "JelasticEnvironment":
+        """
+        Static coroutine to get one environment
+        With fields, only these attributes are set (see update_projection_from_info())
+        """
+        fields = None if fields is None else frozenset(fields)
+        # This is needed as it's a static method
+        from .. import async_api_connector as jelapi_async_connector
+
+        response = await jelapi_async_connector()._(
+            "Environment.Control.GetEnvInfo", envName=envName
+        )
+        return JelasticEnvironment._from_info(response, fields=fields)
 
     @staticmethod
     def list() -> Dict[str, "JelasticEnvironment"]:
@@ -85,26 +106,136 @@ class JelasticEnvironment(_JelasticObject):
         return JelasticEnvironment.dict()
 
     @staticmethod
-    @lru_cache(maxsize=1)
-    def dict() -> Dict[str, "JelasticEnvironment"]:
+    @ttl_cache
+    def dict(
+        lazy: bool = False, fields: Optional[Iterable[str]] = None
+    ) -> Dict[str, "JelasticEnvironment"]:
         """
         Static method to get all environments
+        If lazy, their nodeGroups and nodes are only built on first access of nodeGroups
+        With fields, only these attributes are set (see update_projection_from_info())
+        """
+        fields = None if fields is None else frozenset(fields)
+        # This is needed as it's a static method
+        from .. import api_connector as jelapi_connector
+
+        response = jelapi_connector()._("Environment.Control.GetEnvs")
+        return JelasticEnvironment._dict_from_infos(
+            response["infos"], lazy=lazy, fields=fields
+        )
+
+    @staticmethod
+    def iter(
+        lazy: bool = False, fields: Optional[Iterable[str]] = None
+    ) -> Iterator["JelasticEnvironment"]:
+        """
+        Static method to iterate over all environments (uncached), streaming the API
+        response: each environment is yielded as soon as its part is parsed
+        If lazy, their nodeGroups and nodes are only built on first access of nodeGroups
+        With fields, only these attributes are set (see update_projection_from_info())
+        """
+        fields = None if fields is None else frozenset(fields)
+        # This is needed as it's a static method
+        from .. import api_connector as jelapi_connector
+
+        for info in jelapi_connector()._iter("Environment.Control.GetEnvs", "infos"):
+            yield JelasticEnvironment._from_info(info, lazy=lazy, fields=fields)
+
+    @staticmethod
+    async def adict(
+        lazy: bool = False, fields: Optional[Iterable[str]] = None
+    ) -> Dict[str, "JelasticEnvironment"]:
+        """
+        Static coroutine to get all environments (uncached)
+        If lazy, their nodeGroups and nodes are only built on first access of nodeGroups
+        With fields, only these attributes are set (see update_projection_from_info())
+        """
+        fields = None if fields is None else frozenset(fields)
+        # This is needed as it's a static method
+        from .. import async_api_connector as jelapi_async_connector
+
+        response = await jelapi_async_connector()._("Environment.Control.GetEnvs")
+        return JelasticEnvironment._dict_from_infos(
+            response["infos"], lazy=lazy, fields=fields
+        )
+
+    @staticmethod
+    def refresh_dict(
+        envs: Dict[str, "JelasticEnvironment"],
+    ) -> Dict[str, "JelasticEnvironment"]:
+        """
+        Static method to refresh a dict of environments (as gotten from dict()) in place
+        Only the environments, nodeGroups and nodes whose API data changed are updated,
+        the objects are kept.
         """
         # This is needed as it's a static method
         from .. import api_connector as jelapi_connector
 
         response = jelapi_connector()._("Environment.Control.GetEnvs")
+        return JelasticEnvironment._refresh_dict_from_infos(envs, response["infos"])
+
+    @staticmethod
+    def _refresh_dict_from_infos(
+        envs: Dict[str, "JelasticEnvironment"],
+        infos: List[Dict[str, Any]],
+        changed: Optional[Set[str]] = None,
+    ) -> Dict[str, "JelasticEnvironment"]:
+        """
+        Update the environments' dict from GetEnvs' infos, incrementally
+        The names of the changed, added and removed environments are added to changed
+        """
+        if changed is None:
+            changed = set()
+        names = set()
+        for info in infos:
+            name = info["env"]["envName"]
+            names.add(name)
+            if name in envs:
+                if envs[name].refresh_from_info(info):
+                    changed.add(name)
+            else:
+                envs[name] = JelasticEnvironment()
+                envs[name].update_from_info(info)
+                changed.add(name)
+
+        for name in [name for name in envs if name not in names]:
+            del envs[name]
+            changed.add(name)
+
+        return envs
+
+    @staticmethod
+    def _dict_from_infos(
+        infos: List[Dict[str, Any]],
+        lazy: bool = False,
+        fields: Optional[Iterable[str]] = None,
+    ) -> Dict[str, "JelasticEnvironment"]:
+        """
+        Build the environments' dict from GetEnvs' infos
+        """
         envs = {}
-        for info in response["infos"]:
+        for info in infos:
             name = info["env"]["envName"]
-            envs[name] = JelasticEnvironment()
-            envs[name].update_from_env_dict(info["env"])
-            envs[name].update_env_groups_from_info(info.get("envGroups", []))
-            envs[name].update_node_groups_from_info(info.get("nodeGroups", []))
-            envs[name].update_nodes_from_info(info.get("nodes", []))
+            envs[name] = JelasticEnvironment._from_info(info, lazy=lazy, fields=fields)
 
         return envs
 
+    @staticmethod
+    def _from_info(
+        info: Dict[str, Any],
+        lazy: bool = False,
+        fields: Optional[Iterable[str]] = None,
+    ) -> "JelasticEnvironment":
+        """
+        Build an environment from GetEnvInfo, or one of GetEnvs' infos
+        """
+        env = JelasticEnvironment()
+        if fields is None:
+            env.update_from_info(info, lazy=lazy)
+        else:
+            env.update_projection_from_info(info, fields)
+        return env
+
     def clone(self, cloned_environment_name: str) -> "JelasticEnvironment":
         """
         Clone an environment, and return a new JelasticEnvironment matching the new one
@@ -118,6 +249,7 @@ class JelasticEnvironment(_JelasticObject):
             srcEnvName=self.envName,
             dstEnvName=cloned_environment_name,
         )
+        JelasticEnvironment.dict.invalidate()
         return JelasticEnvironment.get(envName=cloned_environment_name)
 
     def attach_node_group(self, node_group: JelasticNodeGroup) -> None:
@@ -132,27 +264,185 @@ class JelasticEnvironment(_JelasticObject):
         Update from the environment dict as gotten from API
         """
         # Allow exploration of the returned object, but don't act on it.
-        self._env = jelastic_env_dict
+        self._retain_api_payload("_env", jelastic_env_dict)
         # Read-only attributes
-        self._shortdomain = self._env["shortdomain"]
-        self._envName = self._env["envName"]
-        self._domain = self._env["domain"]
-        self._hardwareNodeGroup = self._env["hardwareNodeGroup"]
-        self._sslstate = self._env["sslstate"]
-        self._ishaneabled = self._env["ishaenabled"]
+        self._shortdomain = jelastic_env_dict["shortdomain"]
+        self._envName = jelastic_env_dict["envName"]
+        self._domain = jelastic_env_dict["domain"]
+        self._hardwareNodeGroup = jelastic_env_dict["hardwareNodeGroup"]
+        self._sslstate = jelastic_env_dict["sslstate"]
+        self._ishaneabled = jelastic_env_dict["ishaenabled"]
 
         # Read-write attributes
         # displayName is sometimes not-present, do not die
-        self.displayName = self._env.get("displayName", "")
+        self.displayName = jelastic_env_dict.get("displayName", "")
         self.status = next(
-            (status for status in self.Status if status.value == self._env["status"]),
+            (
+                status
+                for status in self.Status
+                if status.value == jelastic_env_dict["status"]
+            ),
             self.Status.UNKNOWN,
         )
-        self.extdomains = self._env["extdomains"]
+        self.extdomains = jelastic_env_dict["extdomains"]
 
         # Copy our attributes as it came from API
         self.copy_self_as_from_api()
 
+    def update_from_info(self, info: Dict[str, Any], lazy: bool = False) -> None:
+        """
+        Update everything from the info dict as gotten from API (GetEnvInfo, or GetEnvs' infos)
+        If lazy, the nodeGroups and nodes are only built on first access of nodeGroups
+        """
+        with self._lazy_lock:
+            # Forget the former lazy info, if any, without building it
+            self._lazy_info = None
+            # Everything gets set: not a projection anymore
+            self._projection = None
+            self.update_from_env_dict(info["env"])
+            self.update_env_groups_from_info(info.get("envGroups", []))
+            if lazy:
+                if hasattr(self, "_nodeGroups"):
+                    del self._nodeGroups
+                self._lazy_info = info
+            else:
+                if not hasattr(self, "_nodeGroups"):
+                    self.nodeGroups = {}
+                self.update_node_groups_from_info(info.get("nodeGroups", []))
+                self.update_nodes_from_info(info.get("nodes", []))
+
+    def update_projection_from_info(
+        self, info: Dict[str, Any], fields: Iterable[str]
+    ) -> None:
+        """
+        Only set these attributes (and envName, domain) from the info dict as gotten from API,
+        without retaining it; nodeGroups' and nodes' are prefixed, as in "nodes.intIP".
+        The nodeGroups (with their nodeGroupType) and nodes (with their id) are only
+        built if asked for, as "nodeGroups" and "nodes", or with one of their attributes.
+        Projections cannot be saved.
+        """
+        env_fields = {"envName", "domain"}
+        children_fields: Dict[str, Set[str]] = {}
+        for field in fields:
+            prefix, _, name = field.rpartition(".")
+            if not prefix and name in ("nodeGroups", "nodes"):
+                children_fields.setdefault(name, set())
+            elif prefix in ("nodeGroups", "nodes"):
+                children_fields.setdefault(prefix, set()).add(name)
+            elif prefix:
+                raise JelasticObjectException(
+                    f"{self.__class__.__name__}: cannot project '{field}'"
+                )
+            else:
+                env_fields.add(name)
+
+        self._lazy_info = None
+        self._update_projection(
+            info["env"],
+            env_fields,
+            {
+                "envGroups": lambda env: info.get("envGroups", []),
+                "status": lambda env: next(
+                    (status for status in self.Status if status.value == env["status"]),
+                    self.Status.UNKNOWN,
+                ),
+                "displayName": lambda env: env.get("displayName", ""),
+                "ishaneabled": lambda env: env["ishaenabled"],
+            },
+        )
+        if not children_fields:
+            return
+
+        self.nodeGroups = {}
+        for node_group_from_env in info.get("nodeGroups", []):
+            node_group = JelasticNodeGroup()
+            node_group.update_projection_from_env_dict(
+                node_group_from_env, children_fields.get("nodeGroups", ())
+            )
+            node_group.attach_to_environment(self)
+        if "nodes" in children_fields:
+            for node_dict in info.get("nodes", []):
+                if node_dict["nodeGroup"] not in self.nodeGroups:
+                    raise JelasticObjectException(
+                        "Environment got a node outside of one of its nodeGroups"
+                    )
+                node_group = self.nodeGroups[node_dict["nodeGroup"]]
+                jelnode = JelasticNode()
+                jelnode.update_projection_from_env_dict(
+                    node_dict, children_fields["nodes"]
+                )
+                jelnode.attach_to_node_group(node_group)
+                node_group.copy_self_as_from_api("nodes")
+        self.copy_self_as_from_api("nodeGroups")
+
+    def __getattr__(self, name: str) -> Any:
+        """
+        Only called for unset attributes: build the lazy nodeGroups on first access
+        """
+        if name == "_nodeGroups":
+            with self._lazy_lock:
+                try:
+                    # Built by another thread meanwhile
+                    return object.__getattribute__(self, name)
+                except AttributeError:
+                    pass
+                info = getattr(self, "_lazy_info", None)
+                if info is not None:
+                    self._build_lazy_node_groups(info)
+                    return self._nodeGroups
+        raise AttributeError(
+            f"'{self.__class__.__name__}' object has no attribute '{name}'"
+        )
+
+    def _build_lazy_node_groups(self, info: Dict[str, Any]) -> None:
+        """
+        Build the lazy nodeGroups and nodes apart, then set them at once:
+        other threads never see them partially built
+        """
+        scratch = JelasticEnvironment()
+        scratch._envName = self._envName
+        scratch.update_node_groups_from_info(info.get("nodeGroups", []))
+        scratch.update_nodes_from_info(info.get("nodes", []))
+        for node_group in scratch.nodeGroups.values():
+            node_group._parent = self
+        self.nodeGroups = scratch.nodeGroups
+        self._lazy_info = None
+        self.copy_self_as_from_api("nodeGroups")
+
+    def refresh_from_info(self, info: Dict[str, Any]) -> bool:
+        """
+        Update from the info dict as gotten from API, but only what changed since last time
+        nodeGroups and nodes (by id) are kept; unchanged objects keep their staged changes.
+        :returns whether anything changed
+        """
+        if getattr(self, "_projection", None) is not None:
+            # Nothing to compare against: all of it gets set, not a projection anymore
+            self.update_from_info(info)
+            return True
+        changed = False
+        with self._lazy_lock:
+            # Still not built: they will be from the latest info, when needed
+            lazy_info = getattr(self, "_lazy_info", None)
+            # Not pending while snapshotting ourselves, which would build them
+            self._lazy_info = None
+            # Without the retained payload, there is nothing to compare against
+            if info["env"] != getattr(self, "_env", None):
+                self.update_from_env_dict(info["env"])
+                changed = True
+            env_groups = info.get("envGroups", [])
+            if env_groups != self._from_api.get("envGroups"):
+                self.update_env_groups_from_info(env_groups)
+                changed = True
+            if lazy_info is not None:
+                self._lazy_info = info
+                return changed or any(
+                    info.get(key) != lazy_info.get(key)
+                    for key in ("nodeGroups", "nodes")
+                )
+        changed |= self.refresh_node_groups_from_info(info.get("nodeGroups", []))
+        changed |= self.refresh_nodes_from_info(info.get("nodes", []))
+        return changed
+
     def update_env_groups_from_info(self, env_groups: List[str]) -> None:
         """
         Update the envGroups as coming from API
@@ -176,6 +466,74 @@ class JelasticEnvironment(_JelasticObject):
 
         self.copy_self_as_from_api("nodeGroups")
 
+    def refresh_node_groups_from_info(self, node_groups: List[Dict[str, Any]]) -> bool:
+        """
+        Update the node groups (as gotten from API), keeping the unchanged ones
+        :returns whether any changed
+        """
+        node_groups_by_name = {ngdict["name"]: ngdict for ngdict in node_groups}
+        changed = updated = False
+        for name in [
+            name for name in self.nodeGroups if name not in node_groups_by_name
+        ]:
+            del self.nodeGroups[name]
+            changed = True
+
+        for name, node_group_from_env in node_groups_by_name.items():
+            node_group = self.nodeGroups.get(name)
+            if node_group is None:
+                node_group = JelasticNodeGroup()
+                node_group.update_from_env_dict(node_group_from_env=node_group_from_env)
+                node_group.attach_to_environment(self)
+                changed = True
+            elif getattr(node_group, "_node_group", None) != node_group_from_env:
+                node_group.update_from_env_dict(node_group_from_env=node_group_from_env)
+                updated = True
+
+        if changed:
+            self.copy_self_as_from_api("nodeGroups")
+        return changed or updated
+
+    def refresh_nodes_from_info(self, nodes: List[Dict[str, Any]]) -> bool:
+        """
+        Update the nodes (as gotten from API), keeping the nodes by id
+        Only the nodeGroups in which nodes changed get their nodes list rebuilt.
+        :returns whether any changed
+        """
+        existing_nodes = {n.id: n for ng in self.nodeGroups.values() for n in ng.nodes}
+        wanted_nodes: Dict[str, List[JelasticNode]] = {
+            name: [] for name in self.nodeGroups
+        }
+        changed_node_groups = set()
+
+        for node_dict in nodes:
+            if node_dict["nodeGroup"] not in self.nodeGroups:
+                raise JelasticObjectException(
+                    "Environment got a node outside of one of its nodeGroups"
+                )
+            jelnode = existing_nodes.get(node_dict["id"])
+            if jelnode is None:
+                jelnode = JelasticNode()
+                jelnode.update_from_env_dict(node_from_env=node_dict)
+                changed_node_groups.add(node_dict["nodeGroup"])
+            elif getattr(jelnode, "_node", None) != node_dict:
+                jelnode.update_from_env_dict(node_from_env=node_dict)
+                changed_node_groups.add(node_dict["nodeGroup"])
+            wanted_nodes[node_dict["nodeGroup"]].append(jelnode)
+
+        changed = False
+        for name, node_group in self.nodeGroups.items():
+            if name not in changed_node_groups and [
+                id(n) for n in node_group.nodes
+            ] == [id(n) for n in wanted_nodes[name]]:
+                continue
+            node_group.nodes = []
+            for jelnode in wanted_nodes[name]:
+                jelnode.attach_to_node_group(node_group)
+            node_group.copy_self_as_from_api("nodes")
+            changed = True
+        return changed
+
     def update_nodes_from_info(self, nodes: List[Dict[str, Any]]) -> None:
         """
         Construct/Update the nodes
@@ -246,11 +604,13 @@ class JelasticEnvironment(_JelasticObject):
 
     def refresh_from_api(self) -> None:
         response = self.api._("Environment.Control.GetEnvInfo", envName=self.envName)
-        self.update_from_env_dict(response["env"])
+        self.update_from_info(response)
 
-        self.update_env_groups_from_info(response.get("envGroups", []))
-        self.update_node_groups_from_info(response.get("nodeGroups", []))
-        self.update_nodes_from_info(response.get("nodes", []))
+    async def arefresh_from_api(self) -> None:
+        response = await self.aapi._(
+            "Environment.Control.GetEnvInfo", envName=self.envName
+        )
+        self.update_from_info(response)
 
     def __str__(self) -> str:
         return f"JelasticEnvironment '{self.envName}' <https://{self.domain}>"
@@ -275,8 +635,11 @@ class JelasticEnvironment(_JelasticObject):
             self.api._(
                 "Environment.Control.SetEnvGroup",
                 envName=self.envName,
-                envGroups=jsondumps(self.envGroups),
+                envGroups=dumps(self.envGroups),
             )
+            # Jelastic creates the missing envGroups
+            JelasticEnvironment.dict.invalidate()
+            JelasticEnvGroup.dict.invalidate()
             self.copy_self_as_from_api("envGroups")
 
     def _save_extDomains(self):
@@ -300,7 +663,7 @@ class JelasticEnvironment(_JelasticObject):
                         envName=self.envName,
                         extdomain=domain,
                     )
-            self._from_api["extdomains"] = self.extdomains
+            self.copy_self_as_from_api("extdomains")
 
     def _set_running_status(self, to_status_now: Status):
         """
@@ -369,13 +732,13 @@ class JelasticEnvironment(_JelasticObject):
                 raise JelasticObjectException("Wipeout of nodeGroups not allowed")
 
             # Backup the stuff we want to keep after topology change
-            wanted_node_groups = deepcopy(self.nodeGroups)
+            wanted_node_groups = dict(self.nodeGroups)
 
             apiresponse = self.api._(
                 "Environment.Control.ChangeTopology",
                 envName=self.envName,
-                env=jsondumps(self.get_topology()),
-                nodes=jsondumps([ng.get_topology() for ng in self.nodeGroups.values()]),
+                env=dumps(self.get_topology()),
+                nodes=dumps([ng.get_topology() for ng in self.nodeGroups.values()]),
             )
             response = apiresponse["response"]
 
@@ -404,10 +767,12 @@ class JelasticEnvironment(_JelasticObject):
 
                 # Make sure these get saved afterwards
                 ng._from_api["_mountPoints"] = []
+                for mp in ng._mountPoints:
+                    mp._from_api = None
 
         for ng in self.nodeGroups.values():
             ng.save()
-        self._from_api["nodeGroups"] = self.nodeGroups
+        self.copy_self_as_from_api("nodeGroups")
 
     def save_to_jelastic(self):
         """
@@ -1,9 +1,9 @@
 from enum import Enum
-from functools import lru_cache
-from json import dumps as jsondumps
-from typing import Any, Dict
+from typing import Any, Dict, List
 
+from ..cache import ttl_cache
 from ..exceptions import JelasticObjectException
+from ..jsonbackend import dumps
 from .jelasticobject import _JelasticAttribute as _JelAttr
 from .jelasticobject import (
     _JelasticObject,
@@ -29,6 +29,8 @@ class JelasticEnvGroup(_JelasticObject):
         HIDE = 1
         SHOW_IF_NOT_EMPTY = 2
 
+    _slots = ("_group",)
+
     id = _JelAttrInt(read_only=True)
     name = _JelAttrStr(read_only=True)
     color = _JelAttrHexColor()
@@ -54,21 +56,21 @@ class JelasticEnvGroup(_JelasticObject):
         """
         Update a JelasticEnvGroup from an API answer
         """
-        self._group = api_dict
+        self._retain_api_payload("_group", api_dict)
         # RO attributes
-        self._id = self._group["id"]
-        self._name = self._group["name"]
+        self._id = api_dict["id"]
+        self._name = api_dict["name"]
         # RW attributes
-        self.color = self._group.get("color", None)
-        self.isIsolated = self._group["isIsolated"]
+        self.color = api_dict.get("color", None)
+        self.isIsolated = api_dict["isIsolated"]
         self.visibility = next(
-            (v for v in self.Visibility if v.value == self._group["visibility"]),
+            (v for v in self.Visibility if v.value == api_dict["visibility"]),
             self.Visibility.SHOW,
         )
         self.copy_self_as_from_api()
 
     @staticmethod
-    @lru_cache(maxsize=1)
+    @ttl_cache
     def dict() -> Dict[str, "JelasticEnvGroup"]:
         """
         Static method to get all Environment Groups
@@ -77,9 +79,26 @@ class JelasticEnvGroup(_JelasticObject):
         from .. import api_connector as jelapi_connector
 
         response = jelapi_connector()._("Environment.Group.GetGroups")
+        return JelasticEnvGroup._dict_from_array(response["array"])
+
+    @staticmethod
+    async def adict() -> Dict[str, "JelasticEnvGroup"]:
+        """
+        Static coroutine to get all Environment Groups (uncached)
+        """
+        # This is needed as it's a static method
+        from .. import async_api_connector as jelapi_async_connector
 
+        response = await jelapi_async_connector()._("Environment.Group.GetGroups")
+        return JelasticEnvGroup._dict_from_array(response["array"])
+
+    @staticmethod
+    def _dict_from_array(array: List[Dict[str, Any]]) -> Dict[str, "JelasticEnvGroup"]:
+        """
+        Build the envGroups' dict from GetGroups' array
+        """
         groups = {}
-        for group in response["array"]:
+        for group in array:
             jeg = JelasticEnvGroup()
             jeg.update_from_api_dict(group)
             groups[jeg.name] = jeg
@@ -98,6 +117,16 @@ class JelasticEnvGroup(_JelasticObject):
                 f"JelasticEnvGroup {name} doesn't exist. Perhaps refresh with JelasticEnvGroup.dict.cache_clear()"
             )
 
+    @staticmethod
+    async def aget(name: str):
+        """
+        Get one envGroup object, awaiting a fresh list
+        """
+        try:
+            return (await JelasticEnvGroup.adict())[name]
+        except KeyError:
+            raise JelasticObjectException(f"JelasticEnvGroup {name} doesn't exist.")
+
     @property
     def children(self) -> Dict[str, "JelasticEnvGroup"]:
         """
@@ -130,14 +159,15 @@ class JelasticEnvGroup(_JelasticObject):
             self.api._(
                 "Environment.Group.EditGroup",
                 groupName=self.name,
-                data=jsondumps(data),
+                data=dumps(data),
             )
         else:
             self.api._(
                 "Environment.Group.CreateGroup",
                 groupName=self.name,
-                data=jsondumps(data),
+                data=dumps(data),
             )
+            JelasticEnvGroup.dict.invalidate()
         self.copy_self_as_from_api()
         assert not self.differs_from_api()
 
@@ -149,4 +179,5 @@ class JelasticEnvGroup(_JelasticObject):
             "Environment.Group.RemoveGroup",
             groupName=self.name,
         )
-        delattr(self, "_from_api")
+        JelasticEnvGroup.dict.invalidate()
+        self._from_api = None
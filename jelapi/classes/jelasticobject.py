@@ -1,8 +1,201 @@
+import asyncio
 import logging
-from abc import ABC, abstractmethod
+from abc import ABCMeta, abstractmethod
 from copy import deepcopy
 from datetime import datetime
-from typing import Any, Dict, Optional
+from typing import (
+    IO,
+    Any,
+    Callable,
+    Dict,
+    FrozenSet,
+    Iterable,
+    Iterator,
+    Optional,
+    Tuple,
+    Union,
+)
+
+from ..exceptions import JelasticObjectException
+
+
+def _tracking(method: Callable) -> Callable:
+    """
+    Wrap a list or dict mutating method, to mark the owner dirty
+    """
+
+    def tracked(self, *args, **kwargs):
+        result = method(self, *args, **kwargs)
+        self._owner._mark_dirty()
+        return result
+
+    return tracked
+
+
+class _TrackedList(list):
+    """
+    List that marks its owning _JelasticObject dirty when mutated
+    Copies are plain lists.
+    """
+
+    __slots__ = ("_owner",)
+
+    def __init__(self, iterable=(), *, owner: "_JelasticObject"):
+        super().__init__(iterable)
+        self._owner = owner
+
+    append = _tracking(list.append)
+    extend = _tracking(list.extend)
+    insert = _tracking(list.insert)
+    remove = _tracking(list.remove)
+    pop = _tracking(list.pop)
+    clear = _tracking(list.clear)
+    sort = _tracking(list.sort)
+    reverse = _tracking(list.reverse)
+    __setitem__ = _tracking(list.__setitem__)
+    __delitem__ = _tracking(list.__delitem__)
+    __iadd__ = _tracking(list.__iadd__)
+    __imul__ = _tracking(list.__imul__)
+
+    def __copy__(self) -> list:
+        return list(self)
+
+    def __deepcopy__(self, memo) -> list:
+        cp = []
+        memo[id(self)] = cp
+        cp.extend(deepcopy(item, memo) for item in self)
+        return cp
+
+    def __reduce_ex__(self, protocol):
+        return (list, (list(self),))
+
+
+class _TrackedDict(dict):
+    """
+    Dict that marks its owning _JelasticObject dirty when mutated
+    Copies are plain dicts.
+    """
+
+    __slots__ = ("_owner",)
+
+    def __init__(self, mapping=(), *, owner: "_JelasticObject"):
+        super().__init__(mapping)
+        self._owner = owner
+
+    __setitem__ = _tracking(dict.__setitem__)
+    __delitem__ = _tracking(dict.__delitem__)
+    pop = _tracking(dict.pop)
+    popitem = _tracking(dict.popitem)
+    clear = _tracking(dict.clear)
+    update = _tracking(dict.update)
+    setdefault = _tracking(dict.setdefault)
+    if hasattr(dict, "__ior__"):  # Python 3.9+
+        __ior__ = _tracking(dict.__ior__)
+
+    def __copy__(self) -> dict:
+        return dict(self)
+
+    def __deepcopy__(self, memo) -> dict:
+        cp = {}
+        memo[id(self)] = cp
+        cp.update((k, deepcopy(v, memo)) for k, v in self.items())
+        return cp
+
+    def __reduce_ex__(self, protocol):
+        return (dict, (dict(self),))
+
+
+class _FrozenList(tuple):
+    """
+    Immutable snapshot of a list, that compares equal to lists with the same items
+    """
+
+    __slots__ = ()
+
+    def __eq__(self, other: Any) -> bool:
+        if isinstance(other, list):
+            return len(self) == len(other) and all(a == b for a, b in zip(self, other))
+        return tuple.__eq__(self, other)
+
+    def __ne__(self, other: Any) -> bool:
+        return not self == other
+
+    __hash__ = tuple.__hash__
+
+
+def _frozen(method_name: str) -> Callable:
+    def frozen(self, *args, **kwargs):
+        raise TypeError(f"{self.__class__.__name__} is immutable ({method_name})")
+
+    return frozen
+
+
+class _FrozenDict(dict):
+    """
+    Immutable snapshot of a dict
+    """
+
+    __slots__ = ()
+
+    __setitem__ = _frozen("__setitem__")
+    __delitem__ = _frozen("__delitem__")
+    pop = _frozen("pop")
+    popitem = _frozen("popitem")
+    clear = _frozen("clear")
+    update = _frozen("update")
+    setdefault = _frozen("setdefault")
+    __ior__ = _frozen("__ior__")
+
+    def __deepcopy__(self, memo) -> "_FrozenDict":
+        return _FrozenDict((k, deepcopy(v, memo)) for k, v in self.items())
+
+    def __reduce_ex__(self, protocol):
+        return (_FrozenDict, (dict(self),))
+
+
+def _snapshot(value: Any) -> Any:
+    """
+    Copy-on-write snapshot of a value: lists and dicts get frozen (recursively),
+    anything else (str, int, Enum, _JelasticObject children) is kept by reference
+    """
+    if isinstance(value, list):
+        return _FrozenList(_snapshot(item) for item in value)
+    if isinstance(value, dict):
+        return _FrozenDict((k, _snapshot(v)) for k, v in value.items())
+    return value
+
+
+def _text_chunks(
+    content: Union[str, IO[str], Iterable[str]], chunk_size: int
+) -> Iterator[str]:
+    """
+    Split content (a str, a text file object, or an iterable of str) into chunks of
+    chunk_size characters (the last one may be shorter), without reading it all at once
+    """
+    if chunk_size < 1:
+        raise ValueError(f"chunk_size {chunk_size} must be at least 1")
+    if isinstance(content, str):
+        for start in range(0, len(content), chunk_size):
+            end = start + chunk_size
+            yield content[start:end]
+        return
+    pieces = (
+        iter(lambda: content.read(chunk_size), "")
+        if hasattr(content, "read")
+        else content
+    )
+    buf = ""
+    for piece in pieces:
+        # Slice big pieces in place, only the remainder is carried over
+        buf = buf + piece if buf else piece
+        start = 0
+        while len(buf) - start >= chunk_size:
+            end = start + chunk_size
+            yield buf[start:end]
+            start = end
+        buf = buf[start:]
+    if buf:
+        yield buf
 
 
 class _JelasticAttribute:
@@ -30,7 +223,13 @@ class _JelasticAttribute:
                 f"{self.__class__.__name__}: '{self.public_name}' is read only."
             )
         self.typecheck(value)
+        # Only _JelasticObjects track their changes
+        mark_dirty = getattr(obj, "_mark_dirty", None)
+        if mark_dirty:
+            value = self.track(obj, value)
         setattr(obj, self.private_name, value)
+        if mark_dirty:
+            mark_dirty()
 
     def typecheck(self, value: Any) -> None:
         """
@@ -38,6 +237,12 @@ class _JelasticAttribute:
         """
         pass
 
+    def track(self, obj: "_JelasticObject", value: Any) -> Any:
+        """
+        Return the value to store, such that its mutations mark obj dirty
+        """
+        return value
+
 
 class _JelAttrStr(_JelasticAttribute):
     def typecheck(self, value: Any) -> None:
@@ -69,6 +274,11 @@ class _JelAttrDict(_JelasticAttribute):
             raise TypeError(f"{value} is no dict")
         # Checking the dict _items_ for type doesn't work, see List
 
+    def track(self, obj: "_JelasticObject", value: Any) -> Any:
+        if isinstance(value, _TrackedDict) and value._owner is obj:
+            return value
+        return _TrackedDict(value, owner=obj)
+
 
 class _JelAttrList(_JelasticAttribute):
     def typecheck(self, value: Any) -> None:
@@ -76,6 +286,11 @@ class _JelAttrList(_JelasticAttribute):
             raise TypeError(f"{value} is no list")
         # Checking the list _items_ for type doesn't work reliably; one can l.append(item) and it won't be checked
 
+    def track(self, obj: "_JelasticObject", value: Any) -> Any:
+        if isinstance(value, _TrackedList) and value._owner is obj:
+            return value
+        return _TrackedList(value, owner=obj)
+
 
 class _JelAttrIPv4(_JelAttrStr):
     def typecheck(self, value: Any) -> None:
@@ -101,20 +316,232 @@ class _JelAttrHexColor(_JelAttrStr):
             raise TypeError(f"{value} is no Hexadecimal color")
 
 
-class _JelasticObject(ABC):
+_MISSING = object()
+
+
+class _JelasticObjectMeta(ABCMeta):
+    """
+    Give each _JelasticObject class __slots__ for the private names of its
+    _JelasticAttributes, and for the names listed in its _slots
+    Mangled (dunder-prefixed) names cannot be slots; they stay in __dict__
+    """
+
+    def __new__(mcls, name, bases, namespace, **kwargs):
+        if "__slots__" not in namespace:
+            inherited = {
+                slot
+                for base in bases
+                for klass in base.__mro__
+                for slot in vars(klass).get("__slots__", ())
+            }
+            wanted = [
+                f"_{attr_name}"
+                for attr_name, attr in namespace.items()
+                if isinstance(attr, _JelasticAttribute)
+            ]
+            wanted.extend(namespace.get("_slots", ()))
+            namespace["__slots__"] = tuple(
+                dict.fromkeys(
+                    slot
+                    for slot in wanted
+                    if slot not in inherited
+                    and slot not in namespace
+                    and not slot.startswith("__")
+                )
+            )
+        return super().__new__(mcls, name, bases, namespace, **kwargs)
+
+
+class _JelasticObject(metaclass=_JelasticObjectMeta):
     """
     Any Jelastic Object, that keeps the last data as fetched from the API
     _from_api                dict of attributes as last refreshed from API
+    _jelattrs                read-write _JelasticAttributes of the class, tracked in _from_api
+    _jelattrs_by_name        same, by public_name
+    _jelattrs_checked        the ones that are checked_for_differences
+    _jelattrs_lists          the _JelAttrLists that are not, but whose items are compared
+    _jelattrs_dicts          the _JelAttrDicts that are not, but whose items are compared
+    _dirty                   whether something changed since differs_from_api() last found no difference
+    _parent_attribute        name of the attribute holding the parent object, marked dirty too
+    _projection              if only some attributes were set from the API, their names; it can't be saved
+    _slots                   extra instance attributes to store in __slots__
     """
 
-    _from_api: Optional[Dict[str, Any]] = None
+    # The remaining attributes (tests' mocks, subclasses' extras) go to __dict__
+    __slots__ = ("__dict__", "__weakref__", "_from_api", "_dirty", "_projection")
+
+    _from_api: Optional[Dict[str, Any]]
+    _projection: FrozenSet[str]
     _logger: logging.Logger
 
+    _dirty: bool
+    _parent_attribute: Optional[str] = None
+    _slots: Tuple[str, ...] = ()
+    _slot_names: Tuple[str, ...] = ()
+
+    _jelattrs: Tuple["_JelasticAttribute", ...] = ()
+    _jelattrs_by_name: Dict[str, "_JelasticAttribute"] = {}
+    _jelattrs_checked: Tuple["_JelasticAttribute", ...] = ()
+    _jelattrs_lists: Tuple["_JelasticAttribute", ...] = ()
+    _jelattrs_dicts: Tuple["_JelasticAttribute", ...] = ()
+
+    def __init_subclass__(cls, **kwargs) -> None:
+        """
+        Compute the _JelasticAttribute registries once per class
+        Only the class' own attributes are tracked, not the inherited ones
+        """
+        super().__init_subclass__(**kwargs)
+        cls._logger = logging.getLogger(cls.__name__)
+        cls._slot_names = tuple(
+            slot
+            for klass in reversed(cls.__mro__)
+            for slot in vars(klass).get("__slots__", ())
+            if slot not in ("__dict__", "__weakref__")
+        )
+        cls._jelattrs = tuple(
+            attr
+            for attr in vars(cls).values()
+            if isinstance(attr, _JelasticAttribute) and not attr.read_only
+        )
+        cls._jelattrs_by_name = {attr.public_name: attr for attr in cls._jelattrs}
+        cls._jelattrs_checked = tuple(
+            attr for attr in cls._jelattrs if attr.checked_for_differences
+        )
+        cls._jelattrs_lists = tuple(
+            attr
+            for attr in cls._jelattrs
+            if not attr.checked_for_differences and isinstance(attr, _JelAttrList)
+        )
+        cls._jelattrs_dicts = tuple(
+            attr
+            for attr in cls._jelattrs
+            if not attr.checked_for_differences and isinstance(attr, _JelAttrDict)
+        )
+
     def __init__(self, *args, **kwargs) -> None:
         """
-        Instantiate logger
+        Start as not from API
+        """
+        self._from_api = None
+        self._dirty = True
+
+    def _retain_api_payload(self, private_name: str, payload: Any) -> None:
+        """
+        Keep the raw API payload for exploration, unless jelapi.retain_api_payload is off
         """
-        self._logger = logging.getLogger(self.__class__.__name__)
+        from .. import retain_api_payload
+
+        if retain_api_payload:
+            setattr(self, private_name, payload)
+        elif hasattr(self, private_name):
+            delattr(self, private_name)
+
+    @classmethod
+    def _jelattr(cls, name: str) -> Optional["_JelasticAttribute"]:
+        """
+        The _JelasticAttribute of that name, read-only or not, if any
+        """
+        for klass in cls.__mro__:
+            attr = vars(klass).get(name)
+            if isinstance(attr, _JelasticAttribute):
+                return attr
+        return None
+
+    def _update_projection(
+        self,
+        payload: Dict[str, Any],
+        fields: Iterable[str],
+        converters: Dict[str, Callable[[Dict[str, Any]], Any]],
+    ) -> None:
+        """
+        Only set these attributes from the API payload, which isn't retained; unset the others
+        converters get their value from the payload, the others are payload[name];
+        those missing from the payload stay unset.
+        """
+        fields = frozenset(fields)
+        for klass in type(self).__mro__:
+            for name, attr in vars(klass).items():
+                if (
+                    isinstance(attr, _JelasticAttribute)
+                    and name not in fields
+                    and hasattr(self, attr.private_name)
+                ):
+                    delattr(self, attr.private_name)
+        for name in fields:
+            attr = self._jelattr(name)
+            if attr is None:
+                raise JelasticObjectException(
+                    f"{self.__class__.__name__}: cannot project unknown attribute '{name}'"
+                )
+            try:
+                value = (
+                    converters[name](payload) if name in converters else payload[name]
+                )
+            except KeyError:
+                continue
+            if attr.read_only:
+                setattr(self, attr.private_name, value)
+            else:
+                setattr(self, name, value)
+        self._projection = fields
+        self.copy_self_as_from_api()
+
+    def raise_if_projection(self) -> None:
+        """
+        Projections miss attributes: saving them would wipe these out
+        """
+        projection = getattr(self, "_projection", None)
+        if projection is not None:
+            raise JelasticObjectException(
+                f"{self.__class__.__name__}: cannot save a projection on {sorted(projection)}"
+            )
+
+    def _write_file(
+        self,
+        path: str,
+        content: Union[str, IO[str], Iterable[str]],
+        chunk_size: int,
+        **target: Any,
+    ) -> None:
+        """
+        Write a file in the object's environment, by Environment.File.Write calls of
+        chunk_size characters: the first one creates or replaces it, the others append
+        target selects the node(s): nodeid=, or nodeGroup=
+        """
+        append = False
+        for chunk in _text_chunks(content, chunk_size):
+            self.api._(
+                "Environment.File.Write",
+                envName=self.envName,
+                path=path,
+                body=chunk,
+                isAppendMode=append,
+                **target,
+            )
+            append = True
+        if not append:
+            # Empty content: still create or empty the file
+            self.api._(
+                "Environment.File.Write",
+                envName=self.envName,
+                path=path,
+                body="",
+                isAppendMode=False,
+                **target,
+            )
+
+    def _mark_dirty(self) -> None:
+        """
+        Something changed in this object: it, and its parents, need a full differs_from_api() check
+        """
+        obj = self
+        while obj is not None:
+            obj._dirty = True
+            obj = (
+                getattr(obj, obj._parent_attribute, None)
+                if obj._parent_attribute
+                else None
+            )
 
     def _tracelog(self, msg, *args, **kwargs):
         """
@@ -130,10 +557,20 @@ class _JelasticObject(ABC):
         cls = self.__class__
         cp = cls.__new__(cls)
         memo[id(self)] = cp
+        for k in cls._slot_names:
+            v = getattr(self, k, _MISSING)
+            if v is not _MISSING:
+                setattr(cp, k, deepcopy(v, memo))
         for k, v in self.__dict__.items():
             setattr(cp, k, deepcopy(v, memo))
+        # Copied lists and dicts are plain: track them for the copy
+        for attr in cls._jelattrs:
+            v = getattr(cp, attr.private_name, _MISSING)
+            if v is not _MISSING:
+                setattr(cp, attr.private_name, attr.track(cp, v))
 
         cp._from_api = []
+        cp._dirty = True
         return cp
 
     def archive_from_api(self):
@@ -157,30 +594,27 @@ class _JelasticObject(ABC):
 
     def copy_self_as_from_api(self, only_this_key: str = None) -> None:
         """
-        Store a copy of ourselves, as it was from API
+        Store a snapshot of ourselves, as it was from API
+        Children objects are referenced, not copied: they keep their own _from_api
         """
-        # Instantiate dict
+        # Instantiate dict; writing in it marks us dirty
         if not self._from_api:
-            self._from_api = {}
-        for k, v in vars(self).items():
-            if k[0] == "_":
-                # Check public_name
-                k = k[1:]
-            if only_this_key and k != only_this_key:
-                # Only handle one key, and it's not this one
-                continue
-            # This convoluted syntax checks if self.k is a _JelasticAttribute
-            # These are the only ones we want to copy
-            try:
-                descriptor_class = vars(type(self))[k]
-            except KeyError:
-                descriptor_class = None
-
-            if (
-                isinstance(descriptor_class, _JelasticAttribute)
-                and not descriptor_class.read_only
-            ):
-                self._from_api[k] = deepcopy(v)
+            self._from_api = _TrackedDict(owner=self)
+        if only_this_key:
+            attrs = (
+                (self._jelattrs_by_name[only_this_key],)
+                if only_this_key in self._jelattrs_by_name
+                else ()
+            )
+        else:
+            attrs = self._jelattrs
+        # Only snapshot the _JelasticAttributes that are set
+        snapshots = {}
+        for attr in attrs:
+            v = getattr(self, attr.private_name, _MISSING)
+            if v is not _MISSING:
+                snapshots[attr.public_name] = _snapshot(v)
+        self._from_api.update(snapshots)
 
         self._from_api["copied_to_api_at"] = datetime.now()
 
@@ -202,61 +636,68 @@ class _JelasticObject(ABC):
             self._tracelog(f"differs_from_api() = {True} (as is_from_api = {False})")
             return True
 
-        for k, v in vars(self).items():
-            if k[0] == "_":
-                # Check public_name
-                k = k[1:]
-            # This convoluted syntax checks if self.k is a _JelasticAttribute
-            # These are the only ones we want to copy
-            try:
-                descriptor_class = vars(type(self))[k]
-            except KeyError:
-                descriptor_class = None
-            if (
-                isinstance(descriptor_class, _JelasticAttribute)
-                and not descriptor_class.read_only
-            ):
-                if descriptor_class.checked_for_differences:
-                    if k not in self._from_api or self._from_api[k] != v:
-                        self._tracelog(
-                            f"differs_from API because k:{k} was checked and differs"
-                        )
-                        return True
-                elif isinstance(descriptor_class, _JelAttrList):
-                    self._tracelog(f"Check if list {k} is in _from_api")
-                    if k not in self._from_api:
-                        self._tracelog(
-                            f"differs_from API because {k} is not in _from_api"
-                        )
-                        return True
-
-                    self._tracelog(
-                        f"Check if list {k} differs from API; {v} vs {self._from_api[k]}"
-                    )
-                    if len(v) != len(self._from_api[k]):
-                        self._tracelog(
-                            f"differs_from API because list:{k} was checked for length and differs from API ({len(v)} != {len(self._from_api[k])})"
-                        )
-                        return True
-                    if any(item.differs_from_api() for item in v):
-                        self._tracelog(
-                            f"differs_from API because list:{k} was checked and one item differs"
-                        )
-                        return True
-                elif isinstance(descriptor_class, _JelAttrDict):
-                    self._tracelog(
-                        f"Check if dict {k} differs from API; {v} vs {self._from_api[k]}"
-                    )
-                    if len(v) != len(self._from_api[k]):
-                        self._tracelog(
-                            f"differs_from API because dict:{k} was checked for length and differs from API ({len(v)} != {len(self._from_api[k])})"
-                        )
-                        return True
-                    if any(item.differs_from_api() for item in v.values()):
-                        self._tracelog(
-                            f"differs_from API because dict:{k} was checked and one item differs"
-                        )
-                        return True
+        if not self._dirty:
+            # Nothing changed in us, nor in our children since last check
+            return False
+
+        # Do not format the lists and dicts for nothing
+        tracing = self._logger.isEnabledFor(logging.DEBUG - 1)
+
+        for attr in self._jelattrs_checked:
+            v = getattr(self, attr.private_name, _MISSING)
+            if v is _MISSING:
+                continue
+            k = attr.public_name
+            if k not in self._from_api or self._from_api[k] != v:
+                self._tracelog(
+                    f"differs_from API because k:{k} was checked and differs"
+                )
+                return True
+
+        for attr in self._jelattrs_lists:
+            v = getattr(self, attr.private_name, _MISSING)
+            if v is _MISSING:
+                continue
+            k = attr.public_name
+            if k not in self._from_api:
+                self._tracelog(f"differs_from API because {k} is not in _from_api")
+                return True
+
+            if tracing:
+                self._tracelog(
+                    f"Check if list {k} differs from API; {v} vs {self._from_api[k]}"
+                )
+            if len(v) != len(self._from_api[k]):
+                self._tracelog(
+                    f"differs_from API because list:{k} was checked for length and differs from API ({len(v)} != {len(self._from_api[k])})"
+                )
+                return True
+            if any(item.differs_from_api() for item in v):
+                self._tracelog(
+                    f"differs_from API because list:{k} was checked and one item differs"
+                )
+                return True
+
+        for attr in self._jelattrs_dicts:
+            v = getattr(self, attr.private_name, _MISSING)
+            if v is _MISSING:
+                continue
+            k = attr.public_name
+            if tracing:
+                self._tracelog(
+                    f"Check if dict {k} differs from API; {v} vs {self._from_api[k]}"
+                )
+            if len(v) != len(self._from_api[k]):
+                self._tracelog(
+                    f"differs_from API because dict:{k} was checked for length and differs from API ({len(v)} != {len(self._from_api[k])})"
+                )
+                return True
+            if any(item.differs_from_api() for item in v.values()):
+                self._tracelog(
+                    f"differs_from API because dict:{k} was checked and one item differs"
+                )
+                return True
+        self._dirty = False
         return False
 
     @abstractmethod
@@ -270,6 +711,7 @@ class _JelasticObject(ABC):
         """
         Save the changes staged in attributes
         """
+        self.raise_if_projection()
         if self.differs_from_api():
             # Implements the saving of the changes to Jelastic
             self._tracelog("save() -> differs_from_api() -> save_to_jelastic()")
@@ -283,6 +725,17 @@ class _JelasticObject(ABC):
         assertmsg = f" {self.__class__.__name__}: save_to_jelastic() method only partially implemented."
         assert not self.differs_from_api(), assertmsg
 
+    async def asave(self) -> None:
+        """
+        Save the changes staged in attributes, without blocking the event loop
+        save() runs whole in the default executor: the refresh goes through the same (sync)
+        connector as the save_to_jelastic() calls, so that it sees them. Node, NodeGroup and
+        MountPoint have no refresh_from_api(): for them, that's only save_to_jelastic().
+        """
+        self.raise_if_projection()
+        self._tracelog("asave() -> save()")
+        await asyncio.get_running_loop().run_in_executor(None, self.save)
+
     @property
     def api(self):
         """
@@ -291,3 +744,12 @@ class _JelasticObject(ABC):
         from .. import api_connector as jelapi_connector
 
         return jelapi_connector()
+
+    @property
+    def aapi(self):
+        """
+        Return the global asynchronous api connector, as property
+        """
+        from .. import async_api_connector as jelapi_async_connector
+
+        return jelapi_async_connector()
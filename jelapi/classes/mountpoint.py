@@ -13,6 +13,8 @@ class JelasticMountPoint(_JelasticVolume):
     Represents a Jelastic MountPoint, a mount link between nodes
     """
 
+    _slots = ("_mount_point",)
+
     # Where it is mounted _from_
     sourceNode = _JelAttr(read_only=True)
     sourcePath = _JelAttrStr(read_only=True)
@@ -27,16 +29,16 @@ class JelasticMountPoint(_JelasticVolume):
             )
 
         # Allow exploration of the returned object, but don't act on it.
-        self._mount_point = mount_point_from_api
+        self._retain_api_payload("_mount_point", mount_point_from_api)
 
         # Set the name and path in _JelasticVolume
-        self._name = self._mount_point["name"]
-        self._path = self._mount_point["path"]
+        self._name = mount_point_from_api["name"]
+        self._path = mount_point_from_api["path"]
 
-        self._sourcePath = self._mount_point["sourcePath"]
+        self._sourcePath = mount_point_from_api["sourcePath"]
 
         # Now find internal source node
-        source_node_id = int(self._mount_point["sourceNodeId"])
+        source_node_id = int(mount_point_from_api["sourceNodeId"])
 
         for ng in self._nodeGroup._parent.nodeGroups.values():
             for node in ng.nodes:
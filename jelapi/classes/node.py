@@ -1,8 +1,10 @@
-import json
+import base64
+import shlex
 from enum import Enum
-from typing import Any, Dict, List
+from typing import IO, Any, Dict, Iterable, Iterator, List, Union
 
 from ..exceptions import JelasticObjectException, deprecation
+from ..jsonbackend import dumps
 from .jelasticobject import _JelasticAttribute as _JelAttr
 from .jelasticobject import (
     _JelasticObject,
@@ -28,6 +30,9 @@ class JelasticNode(_JelasticObject):
     Represents a Jelastic Node
     """
 
+    _parent_attribute = "_nodeGroup"
+    _slots = ("_node", "_docker_links", "docker_registry")
+
     class NodeType(Enum):
         """
         Available Node Types
@@ -103,13 +108,15 @@ class JelasticNode(_JelasticObject):
         Construct/Update our object from the structure
         """
         # Allow exploration of the returned object, but don't act on it.
-        self._node = node_from_env
+        self._retain_api_payload("_node", node_from_env)
 
         self._nodeType = next(
-            (nt for nt in self.NodeType if nt.value == self._node["nodeType"]), None
+            (nt for nt in self.NodeType if nt.value == node_from_env["nodeType"]), None
         )
         if not self.nodeType:
-            raise JelasticObjectException(f"nodeType unknown: {self._node['nodeType']}")
+            raise JelasticObjectException(
+                f"nodeType unknown: {node_from_env['nodeType']}"
+            )
 
         # Mandatory attributes, raises KeyError if missing
         for attr in [
@@ -118,7 +125,7 @@ class JelasticNode(_JelasticObject):
             "nodemission",
             "type",
         ]:
-            setattr(self, f"_{attr}", self._node[attr])
+            setattr(self, f"_{attr}", node_from_env[attr])
 
         from .environment import JelasticEnvironment
 
@@ -126,7 +133,7 @@ class JelasticNode(_JelasticObject):
             (
                 status
                 for status in JelasticEnvironment.Status
-                if status.value == self._node["status"]
+                if status.value == node_from_env["status"]
             ),
             JelasticEnvironment.Status.UNKNOWN,
         )
@@ -158,31 +165,69 @@ class JelasticNode(_JelasticObject):
             "version",
         ]:
             try:
-                setattr(self, f"_{attr}", self._node[attr])
+                setattr(self, f"_{attr}", node_from_env[attr])
             except KeyError:
                 pass
 
         try:
-            self._extIPs = self._extIPs_check_from_list(self._node["extIPs"])
+            self._extIPs = self._extIPs_check_from_list(node_from_env["extIPs"])
         except KeyError:
             self._extIPs = []
 
         #  This one must be present, for nodeGroup's sake
-        self._diskLimit = self._node["diskLimit"]
+        self._diskLimit = node_from_env["diskLimit"]
 
         # RW attrs
         for attr in ["fixedCloudlets", "flexibleCloudlets"]:
-            setattr(self, attr, self._node[attr])
+            setattr(self, attr, node_from_env[attr])
 
         if self.nodeType == self.NodeType.DOCKER:
             try:
-                self.docker_image = self._node["customitem"]["dockerName"]
+                self.docker_image = node_from_env["customitem"]["dockerName"]
             except KeyError:
                 self.docker_image = ""
 
+        # Keep the inwards docker links only, not the whole customitem
+        try:
+            self._docker_links = [
+                n
+                for n in node_from_env["customitem"]["dockerLinks"]
+                if n["type"] == "IN"
+            ]
+        except (KeyError, TypeError):
+            self._docker_links = []
+
         # Copy our attributes as it came from API
         self.copy_self_as_from_api()
 
+    def update_projection_from_env_dict(
+        self, node_from_env: Dict[str, Any], fields: Iterable[str]
+    ) -> None:
+        """
+        Only set these attributes (and id) from the structure; it can't be saved
+        """
+        from .environment import JelasticEnvironment
+
+        self._update_projection(
+            node_from_env,
+            {"id", *fields},
+            {
+                "nodeType": lambda node: next(
+                    nt for nt in self.NodeType if nt.value == node["nodeType"]
+                ),
+                "status": lambda node: next(
+                    (
+                        status
+                        for status in JelasticEnvironment.Status
+                        if status.value == node["status"]
+                    ),
+                    JelasticEnvironment.Status.UNKNOWN,
+                ),
+                "extIPs": lambda node: self._extIPs_check_from_list(node["extIPs"]),
+                "docker_image": lambda node: node["customitem"]["dockerName"],
+            },
+        )
+
     def __init__(
         self,
         *,
@@ -228,12 +273,7 @@ class JelasticNode(_JelasticObject):
         """
         Expose the inwards docker links, as they came from the API, for consumption from nodeGroup
         """
-        try:
-            return [
-                n for n in self._node["customitem"]["dockerLinks"] if n["type"] == "IN"
-            ]
-        except (KeyError, AttributeError):
-            return []
+        return getattr(self, "_docker_links", [])
 
     def __str__(self) -> str:
         return f"JelasticNode id:{self.id}"
@@ -279,6 +319,16 @@ class JelasticNode(_JelasticObject):
                 "Cannot fetch envVars from node without nodeGroup (not from API ?)"
             )
 
+    async def afetch_env_vars(self) -> Dict[str, str]:
+        """
+        The nodeGroup's envVars, lazy loaded without blocking the event loop
+        """
+        if not hasattr(self, "_nodeGroup"):
+            raise JelasticObjectException(
+                "Cannot fetch envVars from node without nodeGroup (not from API ?)"
+            )
+        return await self._nodeGroup.afetch_env_vars()
+
     def _extIPs_check_from_list(self, extips: List[str]):
         """
         Set the _extIPs from the node's content, or any list. It mostly does typechecking
@@ -325,7 +375,7 @@ class JelasticNode(_JelasticObject):
             "Environment.Control.ExecCmdById",
             envName=self.envName,
             nodeid=self.id,
-            commandList=json.dumps(command_list),
+            commandList=dumps(command_list),
         )
         return [
             {k: cr[k] for k in ["out", "result", "errOut"]}
@@ -354,6 +404,12 @@ class JelasticNode(_JelasticObject):
                 "Files cannot be read from environments not running."
             )
 
+        return self._read_file(path)
+
+    def _read_file(self, path: str) -> str:
+        """
+        Read a file in a node, its environment being known to run
+        """
         self.raise_unless_can_update_to_api()
 
         response = self.api._(
@@ -364,6 +420,87 @@ class JelasticNode(_JelasticObject):
         )
         return response["body"]
 
+    def iter_file(self, path: str, chunk_size: int = 1024 * 1024) -> Iterator[bytes]:
+        """
+        Read a file in a node by chunks of chunk_size bytes, without buffering it whole:
+        its size is read first, then each chunk with dd, base64-encoded, in its own
+        ExecCmdById call. Only that size is read (a growing log is read up to it), and
+        the failures of dd, or chunks shorter than expected (a truncated file), raise.
+        """
+        if not path:
+            raise TypeError(f"path {path} cannot be empty")
+        if chunk_size < 1:
+            raise ValueError(f"chunk_size {chunk_size} must be at least 1")
+
+        from .environment import JelasticEnvironment
+
+        if self.nodeGroup._parent.status != JelasticEnvironment.Status.RUNNING:
+            raise JelasticObjectException(
+                "Files cannot be read from environments not running."
+            )
+
+        self.raise_unless_can_update_to_api()
+
+        quoted_path = shlex.quote(path)
+
+        def run(command: str) -> str:
+            result = self.execute_command(command)
+            if result["result"] != 0:
+                raise JelasticObjectException(
+                    f"Reading {path} failed: {result['errOut']}"
+                )
+            return result["out"]
+
+        def chunks() -> Iterator[bytes]:
+            size = int(
+                run(
+                    f"if [ -r {quoted_path} ]; then stat -L -c %s {quoted_path};"
+                    f" else echo cannot read {quoted_path} >&2; exit 1; fi"
+                )
+            )
+            for offset in range(0, size, chunk_size):
+                # pipefail: dd's failures aren't hidden by base64's success;
+                # fullblock: short reads (procfs, FUSE, network filesystems) are completed
+                chunk = base64.b64decode(
+                    run(
+                        f"set -o pipefail; dd if={quoted_path} bs={chunk_size}"
+                        f" skip={offset // chunk_size} count=1 iflag=fullblock"
+                        " 2>/dev/null | base64"
+                    )
+                )
+                if len(chunk) != min(chunk_size, size - offset):
+                    raise JelasticObjectException(
+                        f"Reading {path} failed: got {len(chunk)} bytes at {offset}"
+                        f" of its {size}; was it truncated meanwhile?"
+                    )
+                yield chunk
+
+        return chunks()
+
+    def write_file(
+        self,
+        path: str,
+        content: Union[str, IO[str], Iterable[str]],
+        chunk_size: int = 1024 * 1024,
+    ) -> None:
+        """
+        Write a file in a node, from a str, a text file object or an iterable of str,
+        sent by chunks of chunk_size characters (Environment.File.Write)
+        """
+        if not path:
+            raise TypeError(f"path {path} cannot be empty")
+
+        from .environment import JelasticEnvironment
+
+        if self.nodeGroup._parent.status != JelasticEnvironment.Status.RUNNING:
+            raise JelasticObjectException(
+                "Files cannot be written to environments not running."
+            )
+
+        self.raise_unless_can_update_to_api()
+
+        self._write_file(path, content, chunk_size, nodeid=self.id)
+
     def _get_first_extIP_or_check(self, ip: str = None) -> str:
         """
         Either get the first extIP from self.extIPs, or return the given one if present
@@ -1,8 +1,9 @@
-import json
 from enum import Enum
-from typing import TYPE_CHECKING, Any, Dict, List
+from http import HTTPStatus
+from typing import IO, TYPE_CHECKING, Any, Dict, Iterable, Iterator, List, Union
 
-from ..exceptions import JelasticObjectException, deprecation
+from ..exceptions import JelasticAPIException, JelasticObjectException, deprecation
+from ..jsonbackend import dumps
 from .jelasticobject import _JelasticAttribute as _JelAttr
 from .jelasticobject import (
     _JelasticObject,
@@ -24,6 +25,9 @@ class JelasticNodeGroup(_JelasticObject):
     Represents a Jelastic NodeGroup, a sort of collection of Nodes within an environment
     """
 
+    _parent_attribute = "_parent"
+    _slots = ("_parent", "_node_group")
+
     class NodeGroupType(Enum):
         """
         Standard NodeGroups
@@ -68,10 +72,9 @@ class JelasticNodeGroup(_JelasticObject):
     # in Gb
     diskLimit = _JelAttrInt()
 
-    @property
-    def envVars(self):
+    def _raise_unless_env_vars_gatherable(self) -> None:
         """
-        Lazy load envVars when they're accessed
+        envVars can only be gathered on running environments
         """
         from .environment import JelasticEnvironment
 
@@ -85,6 +88,22 @@ class JelasticNodeGroup(_JelasticObject):
             raise JelasticObjectException(
                 "envVars cannot be gathered on environments not running"
             )
+
+    def _fetched_env_vars(self, response: Dict[str, Any]) -> Dict[str, str]:
+        """
+        Keep the envVars from the GetContainerEnvVarsByGroup response
+        """
+        self._envVars = response["object"]
+        self._envVars_need_fetching = False
+        self.copy_self_as_from_api("_envVars")
+        return self._envVars
+
+    @property
+    def envVars(self):
+        """
+        Lazy load envVars when they're accessed
+        """
+        self._raise_unless_env_vars_gatherable()
         if self._envVars_need_fetching:
             self.raise_unless_can_call_api()
 
@@ -93,9 +112,23 @@ class JelasticNodeGroup(_JelasticObject):
                 envName=self.envName,
                 nodeGroup=self.nodeGroupType.value,
             )
-            self._envVars = response["object"]
-            self._envVars_need_fetching = False
-            self.copy_self_as_from_api("_envVars")
+            return self._fetched_env_vars(response)
+        return self._envVars
+
+    async def afetch_env_vars(self) -> Dict[str, str]:
+        """
+        envVars, lazy loaded without blocking the event loop
+        """
+        self._raise_unless_env_vars_gatherable()
+        if self._envVars_need_fetching:
+            self.raise_unless_can_call_api()
+
+            response = await self.aapi._(
+                "Environment.Control.GetContainerEnvVarsByGroup",
+                envName=self.envName,
+                nodeGroup=self.nodeGroupType.value,
+            )
+            return self._fetched_env_vars(response)
         return self._envVars
 
     def _set_env_vars(self):
@@ -119,7 +152,7 @@ class JelasticNodeGroup(_JelasticObject):
                     "Environment.Control.SetContainerEnvVarsByGroup",
                     envName=self.envName,
                     nodeGroup=self.nodeGroupType.value,
-                    data=json.dumps(self._envVars),
+                    data=dumps(self._envVars),
                 )
                 self.copy_self_as_from_api("_envVars")
 
@@ -131,8 +164,6 @@ class JelasticNodeGroup(_JelasticObject):
         self.raise_unless_can_call_api()
 
         # from .environment import JelasticEnvironment
-        from .mountpoint import JelasticMountPoint
-
         # JelStatus = JelasticEnvironment.Status
         #
         # if self._parent.status not in [
@@ -149,14 +180,39 @@ class JelasticNodeGroup(_JelasticObject):
                 envName=self.envName,
                 nodeGroup=self.nodeGroupType.value,
             )
+            return self._fetched_mount_points(response)
+        return self._mountPoints
 
-            for mpdict in response["array"]:
-                mp = JelasticMountPoint()
-                mp.attach_to_node_group(self)
-                mp.update_from_env_dict(mpdict)
+    def _fetched_mount_points(
+        self, response: Dict[str, Any]
+    ) -> List["JelasticMountPoint"]:
+        """
+        Keep the mountPoints from the GetMountPoints response
+        """
+        from .mountpoint import JelasticMountPoint
 
-            self._mountPoints_need_fetching = False
-            self.copy_self_as_from_api("_mountPoints")
+        for mpdict in response["array"]:
+            mp = JelasticMountPoint()
+            mp.attach_to_node_group(self)
+            mp.update_from_env_dict(mpdict)
+
+        self._mountPoints_need_fetching = False
+        self.copy_self_as_from_api("_mountPoints")
+        return self._mountPoints
+
+    async def afetch_mount_points(self) -> List["JelasticMountPoint"]:
+        """
+        mountPoints, lazy loaded without blocking the event loop
+        """
+        self.raise_unless_can_call_api()
+
+        if self._mountPoints_need_fetching:
+            response = await self.aapi._(
+                "Environment.File.GetMountPoints",
+                envName=self.envName,
+                nodeGroup=self.nodeGroupType.value,
+            )
+            return self._fetched_mount_points(response)
         return self._mountPoints
 
     @property
@@ -221,14 +277,40 @@ class JelasticNodeGroup(_JelasticObject):
                 envName=self.envName,
                 nodeGroup=self.nodeGroupType.value,
             )
-            # We need to exclude the mountPoints
-            self._containerVolumes = [
-                cv
-                for cv in response["object"]
-                if cv not in [mp.path for mp in self.mountPoints]
-            ]
-            self._containerVolumes_need_fetching = False
-            self.copy_self_as_from_api("_containerVolumes")
+            return self._fetched_container_volumes(response, self.mountPoints)
+        return self._containerVolumes
+
+    def _fetched_container_volumes(
+        self, response: Dict[str, Any], mount_points: List["JelasticMountPoint"]
+    ) -> List[str]:
+        """
+        Keep the containerVolumes from the GetContainerVolumesByGroup response
+        """
+        # We need to exclude the mountPoints
+        self._containerVolumes = [
+            cv
+            for cv in response["object"]
+            if cv not in [mp.path for mp in mount_points]
+        ]
+        self._containerVolumes_need_fetching = False
+        self.copy_self_as_from_api("_containerVolumes")
+        return self._containerVolumes
+
+    async def afetch_container_volumes(self) -> List[str]:
+        """
+        containerVolumes, lazy loaded without blocking the event loop
+        """
+        self.raise_unless_can_call_api()
+
+        if self._containerVolumes_need_fetching:
+            response = await self.aapi._(
+                "Environment.Control.GetContainerVolumesByGroup",
+                envName=self.envName,
+                nodeGroup=self.nodeGroupType.value,
+            )
+            return self._fetched_container_volumes(
+                response, await self.afetch_mount_points()
+            )
         return self._containerVolumes
 
     def _save_container_volumes(self):
@@ -254,7 +336,7 @@ class JelasticNodeGroup(_JelasticObject):
                     "Environment.Control.RemoveContainerVolumes",
                     envName=self.envName,
                     nodeGroup=self.nodeGroupType.value,
-                    volumes=json.dumps(toremove),
+                    volumes=dumps(toremove),
                 )
 
             # Create the new mountpaths
@@ -268,7 +350,7 @@ class JelasticNodeGroup(_JelasticObject):
                     "Environment.Control.AddContainerVolumes",
                     envName=self.envName,
                     nodeGroup=self.nodeGroupType.value,
-                    volumes=json.dumps(toadd),
+                    volumes=dumps(toadd),
                 )
             self.copy_self_as_from_api("_containerVolumes")
 
@@ -343,8 +425,8 @@ class JelasticNodeGroup(_JelasticObject):
         """
         self.nodes.append(node)
         node._nodeGroup = self
-        # Update nodeGroup-level attributes
-        if len(self.nodes) == 1:
+        # Update nodeGroup-level attributes (not from projected nodes without diskLimit)
+        if len(self.nodes) == 1 and hasattr(node, "diskLimit"):
             # In node's API, diskLimit is given in bytes, but topology update, and at nodeGroup level, we store it as Gb
             self.diskLimit = int(node.diskLimit / 1000)
             self.copy_self_as_from_api("diskLimit")
@@ -378,19 +460,26 @@ class JelasticNodeGroup(_JelasticObject):
         Construct/Update our object from the structure
         """
         # Allow exploration of the returned object, but don't act on it.
-        self._node_group = node_group_from_env
+        self._retain_api_payload("_node_group", node_group_from_env)
 
         self._nodeGroupType = next(
-            (ng for ng in self.NodeGroupType if ng.value == self._node_group["name"]),
+            (
+                ng
+                for ng in self.NodeGroupType
+                if ng.value == node_group_from_env["name"]
+            ),
         )
 
         # R/W attributes
-        self._displayName = self._node_group.get(
+        self._displayName = node_group_from_env.get(
             "displayName", ""
         )  # Apparently optional
-        self._isSLBAccessEnabled = self._node_group.get("isSLBAccessEnabled")
+        self._isSLBAccessEnabled = node_group_from_env.get("isSLBAccessEnabled")
 
-        # These two need fetching now (it was from API)
+        # These need fetching now (it was from API); forget the previously fetched ones
+        self._mountPoints = []
+        self._containerVolumes = []
+        self._envVars = {}
         self._mountPoints_need_fetching = True
         self._containerVolumes_need_fetching = True
         self._envVars_need_fetching = True
@@ -398,6 +487,25 @@ class JelasticNodeGroup(_JelasticObject):
         # Copy our attributes as it came from API
         self.copy_self_as_from_api()
 
+    def update_projection_from_env_dict(
+        self, node_group_from_env: Dict[str, Any], fields: Iterable[str]
+    ) -> None:
+        """
+        Only set these attributes (and nodeGroupType) from the structure; it can't be saved
+        """
+        self._update_projection(
+            node_group_from_env,
+            {"nodeGroupType", "nodes", *fields},
+            {
+                # Only the projected nodes get attached
+                "nodes": lambda ng: [],
+                "nodeGroupType": lambda ng: next(
+                    t for t in self.NodeGroupType if t.value == ng["name"]
+                ),
+                "displayName": lambda ng: ng.get("displayName", ""),
+            },
+        )
+
     def raise_unless_can_call_api(self):
         """
         Check if we can update to API, or raise
@@ -476,7 +584,7 @@ class JelasticNodeGroup(_JelasticObject):
                 "Environment.NodeGroup.ApplyData",
                 envName=self.envName,
                 nodeGroup=self.nodeGroupType.value,
-                data=json.dumps(data),
+                data=dumps(data),
             )
             for k in data.keys():
                 self._from_api[k] = data[k]
@@ -543,6 +651,90 @@ class JelasticNodeGroup(_JelasticObject):
         )
         return response["body"]
 
+    def execute_commands(
+        self, commands: List[str], concurrency: int = 8
+    ) -> Dict["JelasticNode", List[Dict[str, str]]]:
+        """
+        Execute a list of commands in all nodes of this nodeGroup, in one ExecCmdByGroup call
+        Returns each node's results; if the API doesn't have the group call (HTTP 404 or 501),
+        falls back to calling execute_commands() on the nodes, concurrency of them at once.
+        Other failures are raised: the commands may have run, they aren't run again.
+        """
+        if not isinstance(commands, list):
+            raise TypeError("execute_commands() takes a a list of commands")
+
+        self.raise_unless_can_call_api()
+
+        try:
+            command_results = self.api._(
+                "Environment.Control.ExecCmdByGroup",
+                envName=self.envName,
+                nodeGroup=self.nodeGroupType.value,
+                commandList=dumps([{"command": cmd, "params": ""} for cmd in commands]),
+            )
+        except JelasticAPIException as e:
+            if e.status_code not in (HTTPStatus.NOT_FOUND, HTTPStatus.NOT_IMPLEMENTED):
+                raise
+            self._logger.info(
+                "ExecCmdByGroup unavailable for %s, executing on each node", self
+            )
+            from ..fleet import run_on_fleet
+
+            outcomes = run_on_fleet(
+                self.nodes,
+                lambda node: node.execute_commands(commands),
+                concurrency=concurrency,
+            )
+            for outcome in outcomes:
+                if not outcome.ok:
+                    raise outcome.exception
+            return {outcome.item: outcome.result for outcome in outcomes}
+
+        results: Dict["JelasticNode", List[Dict[str, str]]] = {
+            node: [] for node in self.nodes
+        }
+        nodes_by_id = {node.id: node for node in self.nodes}
+        for cr in command_results["responses"]:
+            node = nodes_by_id.get(cr.get("nodeid"))
+            if node is not None:
+                results[node].append({k: cr[k] for k in ["out", "result", "errOut"]})
+        return results
+
+    def iter_file(self, path: str, chunk_size: int = 1024 * 1024) -> Iterator[bytes]:
+        """
+        Read a file in the nodeGroup's master node by chunks (see JelasticNode.iter_file())
+        """
+        self.raise_unless_can_call_api()
+
+        if not self.nodes:
+            raise JelasticObjectException(f"{self} has no node to read from")
+        master = next((n for n in self.nodes if getattr(n, "ismaster", False)), None)
+        return (master or self.nodes[0]).iter_file(path, chunk_size=chunk_size)
+
+    def write_file(
+        self,
+        path: str,
+        content: Union[str, IO[str], Iterable[str]],
+        chunk_size: int = 1024 * 1024,
+    ) -> None:
+        """
+        Write a file in all nodes of a nodeGroup, from a str, a text file object or
+        an iterable of str, sent by chunks of chunk_size characters (Environment.File.Write)
+        """
+        self.raise_unless_can_call_api()
+
+        if not path:
+            raise TypeError(f"path {path} cannot be empty")
+
+        from .environment import JelasticEnvironment
+
+        if self._parent.status != JelasticEnvironment.Status.RUNNING:
+            raise JelasticObjectException(
+                "Files cannot be written to environments not running."
+            )
+
+        self._write_file(path, content, chunk_size, nodeGroup=self.nodeGroupType.value)
+
     def redeploy(self, docker_tag: str = "latest"):
         """
         Redeploy a nodeGroup to a certain docker tag
@@ -1,22 +1,205 @@
+import asyncio
 import logging
-from typing import Dict
+import random
+import threading
+import time
+from copy import deepcopy
+from functools import lru_cache
+from typing import (
+    TYPE_CHECKING,
+    Any,
+    Callable,
+    Dict,
+    Hashable,
+    Iterator,
+    Optional,
+    Tuple,
+    Union,
+)
 
 import httpx
 
+from .cache import MISS, ResponseCache
 from .exceptions import JelasticAPIException
+from .jsonbackend import ArrayStream, loads
 
+if TYPE_CHECKING:  # pragma: no cover
+    from .ratelimit import RateLimiter
 
-class JelasticAPIConnector:
-    def __init__(self, apiurl: str, apitoken: str):
+
+@lru_cache(maxsize=None)
+def _function_uri(function: str) -> str:
+    """
+    Convert a function path into its URI, memoized:
+        'Environment.Control.GetEnvs' -> 'environment/control/rest/getenvs'
+    """
+    # Determine function endpoint from the two-dotted string
+    uri_chunks = function.split(".")
+    if len(uri_chunks) != 3:
+        raise JelasticAPIException(
+            "Function ({fnc}) doesn't match standard Jelastic function (Group.Class.Function)".format(
+                fnc=function
+            )
+        )
+    return "{grp}/{cls}/REST/{fnc}".format(
+        grp=uri_chunks[0], cls=uri_chunks[1], fnc=uri_chunks[2]
+    ).lower()
+
+
+# Functions (by their name's prefix) that can safely be retried
+_IDEMPOTENT_PREFIXES = ("Get", "Read", "Check")
+# HTTP codes of the transient errors worth retrying
+_RETRY_STATUSES = (
+    httpx.codes.BAD_GATEWAY,
+    httpx.codes.SERVICE_UNAVAILABLE,
+    httpx.codes.GATEWAY_TIMEOUT,
+)
+
+
+@lru_cache(maxsize=None)
+def _is_idempotent(function: str) -> bool:
+    """
+    Whether calling that function twice has the same effect as once:
+        'Environment.Control.GetEnvInfo' -> True
+        'Environment.Control.ChangeTopology' -> False
+    """
+    return function.rsplit(".", 1)[-1].startswith(_IDEMPOTENT_PREFIXES)
+
+
+@lru_cache(maxsize=None)
+def _function_family(function: str) -> str:
+    """
+    The rate limiting key of a function, memoized:
+        'Environment.Control.GetEnvs' -> 'Environment.Control'
+    """
+    return function.rsplit(".", 1)[0]
+
+
+@lru_cache(maxsize=None)
+def _function_spec(function: str) -> Tuple[str, bool, str]:
+    """
+    URI, idempotency and rate limiting key of that function, memoized together
+    """
+    return _function_uri(function), _is_idempotent(function), _function_family(function)
+
+
+def _call_policy(function: str) -> Tuple[str, Union[float, None], bool, str]:
+    """
+    URI, timeout, idempotency and rate limiting key of that function; only the timeout is
+    looked up in the jelapi configuration variables on each call
+    """
+    import jelapi
+
+    uri, idempotent, family = _function_spec(function)
+    timeout = jelapi.function_timeouts.get(
+        function, jelapi.read_timeout if idempotent else None
+    )
+    return uri, timeout, idempotent, family
+
+
+def _retry_delay(attempt: int) -> float:
+    """
+    Jittered exponential backoff before the next attempt: uniformly up to
+    retry_backoff * 2**attempt seconds, capped at retry_backoff_max
+    """
+    import jelapi
+
+    return random.uniform(
+        0, min(jelapi.retry_backoff_max, jelapi.retry_backoff * 2**attempt)
+    )
+
+
+class _Flight:
+    """
+    One in-flight call, whose outcome is shared with the identical calls made meanwhile
+    """
+
+    __slots__ = ("done", "result", "exception")
+
+    def __init__(self) -> None:
+        # Only created once another call joins, under the connector's _flights_lock
+        self.done: Optional[threading.Event] = None
+        self.result: Any = None
+        self.exception: Optional[BaseException] = None
+
+
+def _client_options() -> Dict:
+    """
+    httpx client options, from the jelapi configuration variables
+    Default to no timeouts, as the Jelastic API is _synchronous_.
+    """
+    import jelapi
+
+    return {
+        "timeout": None,
+        "http2": jelapi.http2,
+        "limits": httpx.Limits(
+            max_connections=jelapi.pool_max_connections,
+            max_keepalive_connections=jelapi.pool_max_keepalive_connections,
+            keepalive_expiry=jelapi.pool_keepalive_expiry,
+        ),
+    }
+
+
+# httpx clients, shared between the connectors to the same apiurl
+_shared_clients: Dict[Optional[str], httpx.Client] = {}
+_shared_clients_lock = threading.Lock()
+
+
+def _shared_client(apiurl: Optional[str]) -> httpx.Client:
+    """
+    Get the httpx client for that apiurl, creating it (with the current configuration) if needed
+    """
+    with _shared_clients_lock:
+        client = _shared_clients.get(apiurl)
+        if client is None or client.is_closed:
+            client = _shared_clients[apiurl] = httpx.Client(**_client_options())
+        return client
+
+
+def close_shared_clients() -> None:
+    """
+    Close the shared httpx clients; the next connectors get new ones, with the current configuration
+    """
+    with _shared_clients_lock:
+        for client in _shared_clients.values():
+            client.close()
+        _shared_clients.clear()
+
+
+# Response caches, shared between the connectors (sync and async) to the same apiurl, so that
+# a write through any of them forgets the responses they cached; keys include the token
+_shared_response_caches: Dict[Optional[str], ResponseCache] = {}
+
+
+def _shared_response_cache(apiurl: Optional[str]) -> ResponseCache:
+    """
+    Get the response cache for that apiurl, creating it if needed
+    """
+    with _shared_clients_lock:
+        cache = _shared_response_caches.get(apiurl)
+        if cache is None:
+            cache = _shared_response_caches[apiurl] = ResponseCache()
+        return cache
+
+
+class _JelasticAPIConnectorBase:
+    def __init__(self, apiurl: str, apitoken: str, rate_limiter: "RateLimiter" = None):
         """
         Get all needed data to connect to a Jelastic API
         """
         self.apiurl = apiurl
+        self.set_token(apitoken)
+        self.rate_limiter = rate_limiter
+        self.response_cache = _shared_response_cache(apiurl)
+        self.logger = logging.getLogger(self.__class__.__name__)
+
+    def set_token(self, apitoken: str) -> None:
+        """
+        Use another token for the next calls, keeping the client and its connections
+        """
         self.apitoken = apitoken
         self.apidata = {"session": apitoken}
-        self.logger = logging.getLogger(self.__class__.__name__)
-        # httpx client. Default to no timeouts, as the Jelastic API is _synchronous_.
-        self.client = httpx.Client(timeout=None)
 
     def is_functional(self) -> bool:
         """
@@ -27,49 +210,427 @@ class JelasticAPIConnector:
         except (TypeError, AttributeError):
             return False
 
-    def _apicall(self, uri: str, method: str = "get", data: dict = {}) -> Dict:
+    def _call_key(self, function: str, kwargs: Dict) -> Optional[Hashable]:
         """
-        Lowest-level API call: that's the method that talks over the network to the Jelastic API
+        Key of an idempotent call, to cache it or coalesce identical concurrent ones;
+        None if it can't be
+        """
+        try:
+            # Hashes the arguments, whatever their order
+            return self.apitoken, function, frozenset(kwargs.items())
+        except TypeError:
+            return None
+
+    def _record(self, function: str, kwargs: Dict, response: Dict) -> None:
+        """
+        Store the response in jelapi.fleet_snapshot, if one is set
+        """
+        import jelapi
+
+        if jelapi.fleet_snapshot is not None:
+            jelapi.fleet_snapshot.record(
+                self.apiurl, self.apitoken, function, kwargs, response
+            )
+
+    def _rate_limit_delay(self, rate_key: Optional[str]) -> float:
+        """
+        Reserve a call on the rate limiter (ours, or jelapi.rate_limiter)
+        :returns the seconds to wait before doing it
         """
-        # Make sure we have our session in
-        self.logger.debug("_apicall {} {}, data:{}".format(method.upper(), uri, data))
-        data.update(self.apidata)
-        r = self.client.request(
-            method=method, url="{url}{uri}".format(url=self.apiurl, uri=uri), data=data
+        import jelapi
+
+        rate_limiter = self.rate_limiter or jelapi.rate_limiter
+        if rate_limiter is None or rate_key is None:
+            return 0.0
+        return rate_limiter.reserve(rate_key)
+
+    def _should_retry(
+        self,
+        attempt: int,
+        idempotent: bool,
+        uri: str,
+        r: httpx.Response = None,
+        error: Exception = None,
+    ) -> bool:
+        """
+        Whether a transient failure (transport error, or HTTP 502/503/504) gets another attempt
+        """
+        if r is not None and r.status_code not in _RETRY_STATUSES:
+            return False
+
+        import jelapi
+
+        if not idempotent or attempt >= jelapi.retries:
+            return False
+        self.logger.warning(
+            "%s failed (%s), retrying",
+            uri,
+            error if error is not None else r.status_code,
         )
+        return True
+
+    def _check_status(self, r: httpx.Response, uri: str, method: str) -> None:
+        """
+        Check the HTTP response
+        """
         if r.status_code != httpx.codes.OK:
             raise JelasticAPIException(
                 "{method} to {uri} failed with HTTP code {code}".format(
                     method=method, uri=uri, code=r.status_code
-                )
+                ),
+                status_code=r.status_code,
             )
 
-        response = r.json()
+    def _check_result(self, response: Dict, uri: str, method: str) -> None:
+        """
+        Check the Jelastic result in the response
+        """
         if response["result"] != 0:
             raise JelasticAPIException(
                 "{method} to {uri} returned non-zero result: {result}".format(
                     method=method, uri=uri, result=response
-                )
+                ),
+                response=response,
             )
-        self.logger.debug(" response : {}".format(response))
+
+    def _parse_response(self, r: httpx.Response, uri: str, method: str) -> Dict:
+        """
+        Check the HTTP response, and the Jelastic result in it
+        """
+        self._check_status(r, uri=uri, method=method)
+        response = loads(r.content)
+        self._check_result(response, uri=uri, method=method)
+        self.logger.debug(" response : %s", response)
         return response
 
+
+class JelasticAPIConnector(_JelasticAPIConnectorBase):
+    def __init__(
+        self,
+        apiurl: str,
+        apitoken: str,
+        client: httpx.Client = None,
+        rate_limiter: "RateLimiter" = None,
+    ):
+        """
+        Get all needed data to connect to a Jelastic API
+        """
+        super().__init__(apiurl=apiurl, apitoken=apitoken, rate_limiter=rate_limiter)
+        # httpx client, shared with the other connectors to this apiurl unless given
+        self._client_given = client is not None
+        self.client = client if client is not None else _shared_client(apiurl)
+        # In-flight idempotent calls, by _call_key()
+        self._flights: Dict[Hashable, _Flight] = {}
+        self._flights_lock = threading.Lock()
+
+    def _live_client(self) -> httpx.Client:
+        """
+        The client to use: the shared one is looked up again once closed, as by close_shared_clients()
+        """
+        if not self._client_given and getattr(self.client, "is_closed", False):
+            self.client = _shared_client(self.apiurl)
+        return self.client
+
+    def _apicall(
+        self,
+        uri: str,
+        method: str = "get",
+        data: dict = None,
+        timeout: Union[float, None] = None,
+        idempotent: bool = False,
+        rate_key: str = None,
+    ) -> Dict:
+        """
+        Lowest-level API call: that's the method that talks over the network to the Jelastic API
+        Idempotent calls are retried on transient failures; each attempt is rate limited on rate_key
+        """
+        self.logger.debug("_apicall %s %s, data:%s", method.upper(), uri, data)
+        # Fresh payload for each call, with our session in
+        payload = {**data, **self.apidata} if data else dict(self.apidata)
+        attempt = 0
+        while True:
+            delay = self._rate_limit_delay(rate_key)
+            if delay:
+                time.sleep(delay)
+            try:
+                r = self._live_client().request(
+                    method=method, url=self.apiurl + uri, data=payload, timeout=timeout
+                )
+            except httpx.TransportError as e:
+                if not self._should_retry(attempt, idempotent, uri, error=e):
+                    raise
+            else:
+                if not self._should_retry(attempt, idempotent, uri, r=r):
+                    return self._parse_response(r, uri=uri, method=method)
+            time.sleep(_retry_delay(attempt))
+            attempt += 1
+
+    def _iter(self, function: str, key: str, **kwargs) -> Iterator[Any]:
+        """
+        Direct API call, streaming the response: yields the items of its top-level key
+        array as they arrive, without loading it whole; allows:
+            JelasticAPIConnector._iter('Environment.Control.GetEnvs', 'infos')
+        The Jelastic result is checked at the end. Streamed calls aren't retried nor cached.
+        """
+        self.logger.info("%s(%s)", function, kwargs)
+        uri, timeout, _, family = _call_policy(function)
+        payload = {**kwargs, **self.apidata}
+
+        delay = self._rate_limit_delay(family)
+        if delay:
+            time.sleep(delay)
+        with self._live_client().stream(
+            "post", self.apiurl + uri, data=payload, timeout=timeout
+        ) as r:
+            self._check_status(r, uri=uri, method="post")
+            stream = ArrayStream(r.iter_bytes(), key)
+            yield from stream
+        self._check_result(stream.envelope, uri=uri, method="post")
+
+    def _single_flight(self, key: Hashable, call: Callable[[], Dict]) -> Dict:
+        """
+        Do the call, unless an identical one is in flight: then share its outcome
+        The first caller gets the response, the others deep copies of it
+        """
+        # Lock-free for the first caller: setdefault() is atomic
+        new_flight = _Flight()
+        flight = self._flights.setdefault(key, new_flight)
+        if flight is new_flight:
+            try:
+                flight.result = call()
+                return flight.result
+            except BaseException as e:
+                flight.exception = e
+                raise
+            finally:
+                with self._flights_lock:
+                    del self._flights[key]
+                    done = flight.done
+                # Nobody joined, nobody to wake up
+                if done is not None:
+                    done.set()
+
+        with self._flights_lock:
+            # Unless it landed meanwhile, have it wake us up
+            in_flight = self._flights.get(key) is flight
+            if in_flight and flight.done is None:
+                flight.done = threading.Event()
+        if in_flight:
+            flight.done.wait()
+        if flight.exception is not None:
+            raise flight.exception
+        return deepcopy(flight.result)
+
     def _(self, function: str, **kwargs) -> Dict:
         """
         Direct API call, converting function paths into URLs; allows:
             JelasticAPIConnector._('Environment.Control.GetEnvs')
+        Idempotent calls' responses may be cached; identical concurrent ones share one request
         """
-        self.logger.info("{fnc}({data})".format(fnc=function, data=kwargs))
-        # Determine function endpoint from the two-dotted string
-        uri_chunks = function.split(".")
-        if len(uri_chunks) != 3:
-            raise JelasticAPIException(
-                "Function ({fnc}) doesn't match standard Jelastic function (Group.Class.Function)".format(
-                    fnc=function
+        import jelapi
+
+        self.logger.info("%s(%s)", function, kwargs)
+        uri, timeout, idempotent, family = _call_policy(function)
+
+        def call() -> Dict:
+            return self._apicall(
+                uri=uri,
+                method="post",
+                data=kwargs,
+                timeout=timeout,
+                idempotent=idempotent,
+                rate_key=family,
+            )
+
+        if not idempotent:
+            response = call()
+            self.response_cache.invalidate(kwargs)
+            return response
+
+        # Neither cached nor coalesced: no key nor generation to build
+        cached = jelapi.response_cache_ttls.get(function) is not None
+        if not cached and not jelapi.coalesce_reads:
+            response = call()
+            self._record(function, kwargs, response)
+            return response
+
+        key = self._call_key(function, kwargs)
+        if key is None:
+            return call()
+
+        # Taken first: reads started after a mutating call don't join the flights,
+        # nor cache the responses, of the reads started before it
+        generation = self.response_cache.generation(kwargs.get("envName"))
+        response = self.response_cache.get(key) if cached else MISS
+        if response is MISS:
+            response = (
+                self._single_flight((key, generation), call)
+                if jelapi.coalesce_reads
+                else call()
+            )
+            if cached:
+                self.response_cache.put(key, response, generation)
+            self._record(function, kwargs, response)
+        return response
+
+
+class AsyncJelasticAPIConnector(_JelasticAPIConnectorBase):
+    def __init__(
+        self,
+        apiurl: str,
+        apitoken: str,
+        client: httpx.AsyncClient = None,
+        rate_limiter: "RateLimiter" = None,
+    ):
+        """
+        Get all needed data to connect to a Jelastic API, asynchronously
+        """
+        super().__init__(apiurl=apiurl, apitoken=apitoken, rate_limiter=rate_limiter)
+        # httpx async client; its connections are bound to an event loop, so it isn't shared,
+        # and unless given, it gets replaced when used from another event loop
+        self._client_given = client is not None
+        self.client = (
+            client if client is not None else httpx.AsyncClient(**_client_options())
+        )
+        self._client_loop: Optional[asyncio.AbstractEventLoop] = None
+        # In-flight idempotent calls, by _call_key()
+        self._flights: Dict[Hashable, asyncio.Future] = {}
+
+    def _loop_client(self) -> httpx.AsyncClient:
+        """
+        The client to use in the running event loop: the pooled connections of the former
+        loop's (as with successive asyncio.run()) can neither be used, nor closed, from it
+        """
+        loop = asyncio.get_running_loop()
+        if self._client_loop is not loop:
+            if self._client_loop is not None and not self._client_given:
+                self.logger.debug("Event loop changed, using a new httpx client")
+                self.client = httpx.AsyncClient(**_client_options())
+            # Referenced, so that no other loop gets its identity
+            self._client_loop = loop
+        return self.client
+
+    async def _apicall(
+        self,
+        uri: str,
+        method: str = "get",
+        data: dict = None,
+        timeout: Union[float, None] = None,
+        idempotent: bool = False,
+        rate_key: str = None,
+    ) -> Dict:
+        """
+        Lowest-level API call: that's the coroutine that talks over the network to the Jelastic API
+        Idempotent calls are retried on transient failures; each attempt is rate limited on rate_key
+        """
+        self.logger.debug("_apicall %s %s, data:%s", method.upper(), uri, data)
+        # Fresh payload for each call, with our session in
+        payload = {**data, **self.apidata} if data else dict(self.apidata)
+        attempt = 0
+        while True:
+            delay = self._rate_limit_delay(rate_key)
+            if delay:
+                await asyncio.sleep(delay)
+            try:
+                r = await self._loop_client().request(
+                    method=method, url=self.apiurl + uri, data=payload, timeout=timeout
                 )
+            except httpx.TransportError as e:
+                if not self._should_retry(attempt, idempotent, uri, error=e):
+                    raise
+            else:
+                if not self._should_retry(attempt, idempotent, uri, r=r):
+                    return self._parse_response(r, uri=uri, method=method)
+            await asyncio.sleep(_retry_delay(attempt))
+            attempt += 1
+
+    async def _single_flight(self, key: Hashable, call: Callable) -> Dict:
+        """
+        Await the call, unless an identical one is in flight: then share its outcome
+        The first caller gets the response, the others deep copies of it
+        """
+        flight = self._flights.get(key)
+        if flight is not None and flight.get_loop() is asyncio.get_running_loop():
+            return deepcopy(await asyncio.shield(flight))
+
+        flight = asyncio.ensure_future(call())
+        self._flights[key] = flight
+
+        def landed(_) -> None:
+            if self._flights.get(key) is flight:
+                del self._flights[key]
+
+        flight.add_done_callback(landed)
+        # Shielded: cancelling the first caller doesn't cancel the others' call
+        return await asyncio.shield(flight)
+
+    async def _arecord(self, function: str, kwargs: Dict, response: Dict) -> None:
+        """
+        _record(), in the default executor: serializing the response and writing it to
+        the SQLite file would block the event loop
+        """
+        import jelapi
+
+        snapshot = jelapi.fleet_snapshot
+        if snapshot is not None and function in snapshot.FUNCTIONS:
+            await asyncio.get_running_loop().run_in_executor(
+                None, self._record, function, kwargs, response
+            )
+
+    async def _(self, function: str, **kwargs) -> Dict:
+        """
+        Direct API call, converting function paths into URLs; allows:
+            await AsyncJelasticAPIConnector._('Environment.Control.GetEnvs')
+        Idempotent calls' responses may be cached; identical concurrent ones share one request
+        """
+        import jelapi
+
+        self.logger.info("%s(%s)", function, kwargs)
+        uri, timeout, idempotent, family = _call_policy(function)
+
+        def call():
+            return self._apicall(
+                uri=uri,
+                method="post",
+                data=kwargs,
+                timeout=timeout,
+                idempotent=idempotent,
+                rate_key=family,
             )
-        uri = "{grp}/{cls}/REST/{fnc}".format(
-            grp=uri_chunks[0], cls=uri_chunks[1], fnc=uri_chunks[2]
-        ).lower()
 
-        return self._apicall(uri=uri, method="post", data=kwargs)
+        if not idempotent:
+            response = await call()
+            self.response_cache.invalidate(kwargs)
+            return response
+
+        # Neither cached nor coalesced: no key nor generation to build
+        cached = jelapi.response_cache_ttls.get(function) is not None
+        if not cached and not jelapi.coalesce_reads:
+            response = await call()
+            await self._arecord(function, kwargs, response)
+            return response
+
+        key = self._call_key(function, kwargs)
+        if key is None:
+            return await call()
+
+        # Taken first: reads started after a mutating call don't join the flights,
+        # nor cache the responses, of the reads started before it
+        generation = self.response_cache.generation(kwargs.get("envName"))
+        response = self.response_cache.get(key) if cached else MISS
+        if response is MISS:
+            response = await (
+                self._single_flight((key, generation), call)
+                if jelapi.coalesce_reads
+                else call()
+            )
+            if cached:
+                self.response_cache.put(key, response, generation)
+            await self._arecord(function, kwargs, response)
+        return response
+
+    async def aclose(self) -> None:
+        """
+        Close the underlying httpx client
+        """
+        await self.client.aclose()
@@ -1,3 +1,4 @@
+from typing import Any, Dict, Optional
 from warnings import warn
 
 
@@ -12,9 +13,19 @@ class JelapiException(Exception):
 class JelasticAPIException(JelapiException):
     """
     Low-level API Exception
-    """
-
-    pass
+    With the HTTP status code of the failing response, or the Jelastic response with a
+    non-zero result, when there is one
+    """
+
+    def __init__(
+        self,
+        *args: Any,
+        status_code: Optional[int] = None,
+        response: Optional[Dict[str, Any]] = None,
+    ) -> None:
+        super().__init__(*args)
+        self.status_code = status_code
+        self.response = response
 
 
 class JelasticObjectException(JelapiException):
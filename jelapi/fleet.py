@@ -0,0 +1,248 @@
+import asyncio
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from itertools import islice
+from typing import (
+    Any,
+    Callable,
+    Dict,
+    Iterable,
+    Iterator,
+    List,
+    NamedTuple,
+    Optional,
+    Tuple,
+    Union,
+)
+
+from .classes import JelasticEnvironment, JelasticNode, JelasticNodeGroup
+from .exceptions import JelasticObjectException
+
+Operation = Union[str, Callable[[Any], Any]]
+
+
+class FleetOutcome(NamedTuple):
+    """
+    What happened to one item of the fleet
+    """
+
+    item: Any
+    result: Any = None
+    exception: Optional[Exception] = None
+
+    @property
+    def ok(self) -> bool:
+        return self.exception is None
+
+
+def _resolve(item: Any, operation: Operation) -> Callable[[], Any]:
+    """
+    Get the callable to run for that item: either its method by name, or the operation called on it
+    """
+    if isinstance(operation, str):
+        return getattr(item, operation)
+    return lambda: operation(item)
+
+
+def _run_one(item: Any, operation: Operation) -> FleetOutcome:
+    try:
+        return FleetOutcome(item=item, result=_resolve(item, operation)())
+    except Exception as e:
+        return FleetOutcome(item=item, exception=e)
+
+
+def run_on_fleet(
+    items: Iterable[Any], operation: Operation, concurrency: int = 8
+) -> List[FleetOutcome]:
+    """
+    Run operation on all items (environments, nodeGroups, nodes) in a thread pool
+    operation is either a method name ("sleep") or a callable taking the item
+    Exceptions don't abort the batch; outcomes are returned in the items' order
+    """
+    if concurrency < 1:
+        raise ValueError(f"concurrency {concurrency} must be at least 1")
+
+    with ThreadPoolExecutor(max_workers=concurrency) as executor:
+        return list(executor.map(lambda item: _run_one(item, operation), items))
+
+
+def iter_on_fleet(
+    items: Iterable[Any], operation: Operation, concurrency: int = 8
+) -> Iterator[FleetOutcome]:
+    """
+    Like run_on_fleet(), but yield each outcome as soon as its operation completes
+    Only concurrency items are submitted at once; closing the iterator stops submitting
+    """
+    if concurrency < 1:
+        raise ValueError(f"concurrency {concurrency} must be at least 1")
+
+    def outcomes(items: Iterator[Any]) -> Iterator[FleetOutcome]:
+        with ThreadPoolExecutor(max_workers=concurrency) as executor:
+            running = {
+                executor.submit(_run_one, item, operation)
+                for item in islice(items, concurrency)
+            }
+            while running:
+                done, running = wait(running, return_when=FIRST_COMPLETED)
+                for future in done:
+                    for item in islice(items, 1):
+                        running.add(executor.submit(_run_one, item, operation))
+                    yield future.result()
+
+    return outcomes(iter(items))
+
+
+def select_nodes(
+    envs: Iterable[JelasticEnvironment],
+    envNames: Optional[Iterable[str]] = None,
+    node_group_types: Optional[
+        Iterable[Union[JelasticNodeGroup.NodeGroupType, str]]
+    ] = None,
+    docker_images: Optional[Iterable[str]] = None,
+    env_groups: Optional[Iterable[str]] = None,
+) -> List[JelasticNode]:
+    """
+    The nodes of the environments (e.g. JelasticEnvironment.dict().values()) matching
+    all the given criteria: in one of these envNames, nodeGroup types ("cp"),
+    docker images, envGroups
+    """
+    envNames = set(envNames) if envNames is not None else None
+    if node_group_types is not None:
+        node_group_types = {
+            t.value if isinstance(t, JelasticNodeGroup.NodeGroupType) else t
+            for t in node_group_types
+        }
+    docker_images = set(docker_images) if docker_images is not None else None
+    env_groups = set(env_groups) if env_groups is not None else None
+
+    nodes = []
+    for env in envs:
+        if envNames is not None and env.envName not in envNames:
+            continue
+        if env_groups is not None and env_groups.isdisjoint(env.envGroups):
+            continue
+        for name, node_group in env.nodeGroups.items():
+            if node_group_types is not None and name not in node_group_types:
+                continue
+            nodes.extend(
+                node
+                for node in node_group.nodes
+                if docker_images is None
+                or getattr(node, "docker_image", None) in docker_images
+            )
+    return nodes
+
+
+def execute_on_fleet(
+    nodes: Iterable[JelasticNode], commands: List[str], concurrency: int = 8
+) -> Iterator[FleetOutcome]:
+    """
+    Execute the commands on all nodes (see select_nodes()), with at most concurrency
+    nodes at once; yield each node's outcome as soon as it completes, its result being
+    the commands' [{"out", "errOut", "result"}]
+    """
+    if not isinstance(commands, list):
+        raise TypeError("execute_on_fleet() takes a list of commands")
+
+    def execute(node: JelasticNode) -> List[Dict[str, str]]:
+        return node.execute_commands(commands)
+
+    return iter_on_fleet(nodes, execute, concurrency=concurrency)
+
+
+def read_files(
+    nodes: Iterable[JelasticNode], paths: Iterable[str], concurrency: int = 8
+) -> List[FleetOutcome]:
+    """
+    Read all paths on all nodes, concurrency files at once; each outcome's item is the
+    (node, path), its result the file's content. The environments are checked to be
+    running once each, not per file.
+    To cache the contents, per envName, nodeid and path, set a TTL in
+    jelapi.response_cache_ttls["Environment.File.Read"]
+    """
+    paths = list(paths)
+    for path in paths:
+        if not path:
+            raise TypeError(f"path {path} cannot be empty")
+
+    running = {}
+    pairs = []
+    for node in nodes:
+        env = node.nodeGroup._parent
+        if id(env) not in running:
+            running[id(env)] = env.status == JelasticEnvironment.Status.RUNNING
+        pairs.extend((node, path) for path in paths)
+
+    def env_running(pair: Tuple[JelasticNode, str]) -> bool:
+        return running[id(pair[0].nodeGroup._parent)]
+
+    read = iter(
+        run_on_fleet(
+            [pair for pair in pairs if env_running(pair)],
+            lambda pair: pair[0]._read_file(pair[1]),
+            concurrency=concurrency,
+        )
+    )
+    return [
+        (
+            next(read)
+            if env_running(pair)
+            else FleetOutcome(
+                item=pair,
+                exception=JelasticObjectException(
+                    "Files cannot be read from environments not running."
+                ),
+            )
+        )
+        for pair in pairs
+    ]
+
+
+async def arun_on_fleet(
+    items: Iterable[Any], operation: Operation, concurrency: int = 8
+) -> List[FleetOutcome]:
+    """
+    Run operation on all items, with at most concurrency of them at once
+    Coroutine functions (e.g. "asave") are awaited, others run in the default executor
+    Exceptions don't abort the batch; outcomes are returned in the items' order
+    """
+    if concurrency < 1:
+        raise ValueError(f"concurrency {concurrency} must be at least 1")
+
+    semaphore = asyncio.Semaphore(concurrency)
+    loop = asyncio.get_running_loop()
+
+    async def run_one(item: Any) -> FleetOutcome:
+        async with semaphore:
+            try:
+                if isinstance(operation, str):
+                    fnc = getattr(item, operation)
+                    if asyncio.iscoroutinefunction(fnc):
+                        result = await fnc()
+                    else:
+                        result = await loop.run_in_executor(None, fnc)
+                elif asyncio.iscoroutinefunction(operation):
+                    result = await operation(item)
+                else:
+                    result = await loop.run_in_executor(None, operation, item)
+                return FleetOutcome(item=item, result=result)
+            except Exception as e:
+                return FleetOutcome(item=item, exception=e)
+
+    return list(await asyncio.gather(*(run_one(item) for item in items)))
+
+
+def refresh_many(envs: Iterable[Any], concurrency: int = 8) -> List[FleetOutcome]:
+    """
+    Refresh the environments from API (GetEnvInfo, then update_from_info()), concurrently
+    over the shared connection pool; failures are reported in their outcomes
+    """
+    return run_on_fleet(envs, "refresh_from_api", concurrency=concurrency)
+
+
+async def arefresh_many(
+    envs: Iterable[Any], concurrency: int = 8
+) -> List[FleetOutcome]:
+    """
+    Refresh the environments from API, awaiting at most concurrency GetEnvInfo at once
+    """
+    return await arun_on_fleet(envs, "arefresh_from_api", concurrency=concurrency)
@@ -0,0 +1,156 @@
+import threading
+from typing import (
+    Any,
+    Dict,
+    FrozenSet,
+    Hashable,
+    Iterable,
+    List,
+    Optional,
+    Set,
+    Tuple,
+    Union,
+)
+
+from .classes import JelasticEnvironment, JelasticNode
+
+# (index, key, object) entries an environment contributes to the indexes
+_Entry = Tuple[str, Hashable, Any]
+
+
+class FleetIndex:
+    """
+    Hash indexes over the environments (as gotten from JelasticEnvironment.dict()), to find
+    nodes by id, IP (intIP and extIPs), nodeType or docker image, and environments by
+    domain (domain and extdomains) or envGroup, without scanning the fleet:
+        index = FleetIndex(JelasticEnvironment.dict())
+        env = index.environment_of_node(1234)
+    refresh() updates the environments in place, then reindexes only the ones that changed.
+    """
+
+    def __init__(self, envs: Dict[str, JelasticEnvironment]) -> None:
+        self.envs = envs
+        self._indexes: Dict[str, Dict[Hashable, Dict[int, Any]]] = {
+            "node_id": {},
+            "ip": {},
+            "node_type": {},
+            "docker_image": {},
+            "domain": {},
+            "env_group": {},
+        }
+        self._entries: Dict[str, FrozenSet[_Entry]] = {}
+        self._lock = threading.Lock()
+        self.reindex()
+
+    @staticmethod
+    def _entries_of(env: JelasticEnvironment) -> FrozenSet[_Entry]:
+        """
+        The index entries of an environment; projected ones only have theirs
+        """
+        entries = {("domain", getattr(env, "domain", None), env)}
+        entries.update(("domain", d, env) for d in getattr(env, "extdomains", []))
+        entries.update(("env_group", g, env) for g in getattr(env, "envGroups", []))
+        for node_group in getattr(env, "nodeGroups", {}).values():
+            for node in node_group.nodes:
+                entries.add(("node_id", getattr(node, "id", None), node))
+                entries.add(("ip", getattr(node, "intIP", None), node))
+                entries.update(("ip", ip, node) for ip in getattr(node, "extIPs", []))
+                node_type = getattr(node, "nodeType", None)
+                entries.add(("node_type", node_type and node_type.value, node))
+                entries.add(("docker_image", getattr(node, "docker_image", None), node))
+        return frozenset(entry for entry in entries if entry[1])
+
+    def _update(self, envName: str, entries: FrozenSet[_Entry]) -> None:
+        """
+        Replace the entries of that environment, only touching the ones that changed
+        """
+        former = self._entries.get(envName, frozenset())
+        for index, key, obj in former - entries:
+            objects = self._indexes[index][key]
+            del objects[id(obj)]
+            if not objects:
+                del self._indexes[index][key]
+        for index, key, obj in entries - former:
+            self._indexes[index].setdefault(key, {})[id(obj)] = obj
+        if entries:
+            self._entries[envName] = entries
+        else:
+            self._entries.pop(envName, None)
+
+    def _reindex(self, names: Iterable[str]) -> None:
+        for name in names:
+            env = self.envs.get(name)
+            self._update(name, self._entries_of(env) if env else frozenset())
+
+    def reindex(self, envName: Optional[str] = None) -> None:
+        """
+        Update the indexes from the environments (or only that one), as they are now
+        """
+        with self._lock:
+            self._reindex({envName} if envName else set(self._entries) | set(self.envs))
+
+    def refresh(self) -> None:
+        """
+        Refresh the environments from API (as JelasticEnvironment.refresh_dict()), then
+        reindex the ones that changed; lookups meanwhile see them as before or after
+        """
+        from . import api_connector
+
+        # Not holding the lock while waiting for the API
+        infos = api_connector()._("Environment.Control.GetEnvs")["infos"]
+        with self._lock:
+            changed: Set[str] = set()
+            JelasticEnvironment._refresh_dict_from_infos(self.envs, infos, changed)
+            self._reindex(changed)
+
+    def _lookup(self, index: str, key: Hashable) -> List[Any]:
+        with self._lock:
+            return list(self._indexes[index].get(key, {}).values())
+
+    def node(self, node_id: int) -> Optional[JelasticNode]:
+        """
+        The node with that id, if any
+        """
+        return next(iter(self._lookup("node_id", node_id)), None)
+
+    def node_by_ip(self, ip: str) -> Optional[JelasticNode]:
+        """
+        The node with that internal or external IP, if any
+        """
+        return next(iter(self._lookup("ip", ip)), None)
+
+    def nodes_by_type(
+        self, node_type: Union[JelasticNode.NodeType, str]
+    ) -> List[JelasticNode]:
+        """
+        The nodes of that nodeType
+        """
+        if isinstance(node_type, JelasticNode.NodeType):
+            node_type = node_type.value
+        return self._lookup("node_type", node_type)
+
+    def nodes_by_docker_image(self, docker_image: str) -> List[JelasticNode]:
+        """
+        The docker nodes running that image (as "repository/name:tag")
+        """
+        return self._lookup("docker_image", docker_image)
+
+    def environment_of_node(self, node_id: int) -> Optional[JelasticEnvironment]:
+        """
+        The environment owning the node with that id, if any
+        """
+        with self._lock:
+            node = next(iter(self._indexes["node_id"].get(node_id, {}).values()), None)
+            return self.envs.get(node.envName) if node else None
+
+    def environment_by_domain(self, domain: str) -> Optional[JelasticEnvironment]:
+        """
+        The environment with that domain or external domain, if any
+        """
+        return next(iter(self._lookup("domain", domain)), None)
+
+    def environments_in_group(self, env_group: str) -> List[JelasticEnvironment]:
+        """
+        The environments in that envGroup
+        """
+        return self._lookup("env_group", env_group)
@@ -0,0 +1,161 @@
+"""
+JSON encoding and decoding of the API payloads, with the fastest available backend:
+orjson, then ujson, then the standard library's json. Select another one with use().
+"""
+
+import json
+import re
+from typing import Any, Callable, Dict, Iterable, Iterator, Optional, Tuple, Union
+
+
+def _orjson() -> Tuple[Callable[[Any], str], Callable[[Union[str, bytes]], Any]]:
+    import orjson
+
+    def dumps(obj: Any) -> str:
+        # Like json.dumps, serialize non-str dict keys
+        return orjson.dumps(obj, option=orjson.OPT_NON_STR_KEYS).decode()
+
+    return dumps, orjson.loads
+
+
+def _ujson() -> Tuple[Callable[[Any], str], Callable[[Union[str, bytes]], Any]]:
+    import ujson
+
+    def dumps(obj: Any) -> str:
+        return ujson.dumps(obj, escape_forward_slashes=False)
+
+    return dumps, ujson.loads
+
+
+def _json() -> Tuple[Callable[[Any], str], Callable[[Union[str, bytes]], Any]]:
+    return json.dumps, json.loads
+
+
+_BACKENDS: Dict[str, Callable] = {
+    "orjson": _orjson,
+    "ujson": _ujson,
+    "json": _json,
+}
+
+backend = None
+_dumps = None
+_loads = None
+
+
+def use(name: str = None) -> str:
+    """
+    Select the backend by name, or the first importable one
+    :raises ImportError if the named backend isn't installed
+    """
+    global backend, _dumps, _loads
+
+    for candidate in [name] if name else list(_BACKENDS):
+        try:
+            _dumps, _loads = _BACKENDS[candidate]()
+        except ImportError:
+            if name:
+                raise
+            continue
+        backend = candidate
+        return backend
+    raise ImportError("No JSON backend")  # pragma: no cover
+
+
+def dumps(obj: Any) -> str:
+    """
+    Serialize obj to a JSON str
+    """
+    return _dumps(obj)
+
+
+def loads(data: Union[str, bytes]) -> Any:
+    """
+    Deserialize a JSON str or bytes
+    """
+    return _loads(data)
+
+
+# The bytes that matter to find the JSON values' boundaries
+_STRUCTURAL = re.compile(rb'["\\\[\]{}]')
+
+
+class ArrayStream:
+    """
+    Incrementally parse the objects of the `key` array of a top-level JSON object,
+    as the chunks of the document arrive; iterating yields them one at a time:
+        stream = ArrayStream(response.iter_bytes(), "infos")
+        for info in stream: ...
+    Once exhausted, envelope is the top-level object, with that array emptied.
+    Only the current object is buffered, not the whole document.
+    """
+
+    def __init__(self, chunks: Iterable[bytes], key: str) -> None:
+        self.chunks = chunks
+        self.key = key.encode()
+        self.envelope: Optional[Dict[str, Any]] = None
+
+    def __iter__(self) -> Iterator[Any]:
+        buf = b""
+        # The document before the array's items, to build the envelope with what follows
+        head = b""
+        pos = skip_to = depth = 0
+        in_string = False
+        # Past the opening quote of the current string, and the closing one of the last one
+        string_start = last_string_end = 0
+        last_string = None
+        # 0: looking for the array, 1: in it, 2: after it
+        array_state = 0
+        item_start = None
+
+        for chunk in self.chunks:
+            buf += chunk
+            if array_state == 2:
+                continue
+            for match in _STRUCTURAL.finditer(buf, pos):
+                i = match.start()
+                end = i + 1
+                if i < skip_to:
+                    continue
+                c = buf[i]
+                if in_string:
+                    if c == 0x5C:  # backslash: skip the escaped byte
+                        skip_to = i + 2
+                    elif c == 0x22:
+                        in_string = False
+                        if depth == 1:
+                            last_string, last_string_end = buf[string_start:i], i + 1
+                elif c == 0x22:
+                    in_string, string_start = True, i + 1
+                elif c in b"{[":
+                    depth += 1
+                    if array_state == 1 and depth == 3:
+                        item_start = i
+                    elif (
+                        array_state == 0
+                        and depth == 2
+                        and c == 0x5B
+                        and last_string == self.key
+                        and buf[last_string_end:i].strip() == b":"
+                    ):
+                        array_state, head = 1, buf[:end]
+                else:
+                    depth -= 1
+                    if array_state == 1 and depth == 2:
+                        yield loads(buf[item_start:end])
+                        item_start = None
+                    elif array_state == 1 and depth == 1:
+                        array_state, buf = 2, buf[i:]
+                        break
+
+            if array_state == 1:
+                # Only keep the object being parsed
+                keep = len(buf) if item_start is None else item_start
+                buf, skip_to = buf[keep:], skip_to - keep
+                if item_start is not None:
+                    item_start = 0
+            pos = len(buf)
+
+        self.envelope = loads(head + buf if array_state == 2 else buf)
+
+
+use()
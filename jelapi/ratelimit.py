@@ -0,0 +1,103 @@
+import json
+import threading
+import time
+from abc import ABC, abstractmethod
+from typing import Dict, Tuple
+
+
+class RateLimiter(ABC):
+    """
+    Client-side rate limiter of the API calls
+    The connectors reserve() each call, then wait the returned delay before doing it
+    """
+
+    @abstractmethod
+    def reserve(self, key: str) -> float:
+        """
+        Reserve a call for key (a function family, e.g. 'Environment.Control')
+        :returns the seconds to wait before doing it
+        """
+
+
+class TokenBucketRateLimiter(RateLimiter):
+    """
+    Token bucket per function family: calls are allowed in bursts of up to
+    `burst` calls, then at `rate` calls per second. `rates` overrides both per family:
+        TokenBucketRateLimiter(rate=5, burst=10, rates={"Environment.File": (1, 2)})
+    Reservations are thread-safe: a shared limiter spreads concurrent calls over time.
+    """
+
+    def __init__(
+        self,
+        rate: float,
+        burst: int = 1,
+        rates: Dict[str, Tuple[float, int]] = None,
+    ) -> None:
+        if rate <= 0 or burst < 1:
+            raise ValueError("rate must be positive, and burst at least 1")
+        self.rate = rate
+        self.burst = burst
+        self.rates = rates or {}
+        self._buckets: Dict[str, Tuple[float, float]] = {}
+        self._lock = threading.Lock()
+
+    def _clock(self) -> float:
+        return time.monotonic()
+
+    def _take(self, key: str, bucket: Tuple[float, float], now: float):
+        """
+        Take one token from the bucket (tokens, at); they can go negative: that's a reservation
+        :returns the new bucket, and the seconds to wait
+        """
+        rate, burst = self.rates.get(key, (self.rate, self.burst))
+        tokens, at = bucket if bucket else (burst, now)
+        tokens = min(burst, tokens + (now - at) * rate) - 1
+        return (tokens, now), (-tokens / rate if tokens < 0 else 0.0)
+
+    def reserve(self, key: str) -> float:
+        with self._lock:
+            self._buckets[key], delay = self._take(
+                key, self._buckets.get(key), self._clock()
+            )
+        return delay
+
+
+class FileTokenBucketRateLimiter(TokenBucketRateLimiter):
+    """
+    Same token buckets, kept in a local file (e.g. in /dev/shm), to be shared between
+    processes; the file is locked with fcntl (POSIX only) while reserving
+    """
+
+    def __init__(
+        self,
+        path: str,
+        rate: float,
+        burst: int = 1,
+        rates: Dict[str, Tuple[float, int]] = None,
+    ) -> None:
+        super().__init__(rate=rate, burst=burst, rates=rates)
+        self.path = path
+
+    def _clock(self) -> float:
+        # Shared between processes, so not monotonic
+        return time.time()
+
+    def reserve(self, key: str) -> float:
+        import fcntl
+
+        with self._lock, open(self.path, "a+") as f:
+            fcntl.flock(f, fcntl.LOCK_EX)
+            try:
+                f.seek(0)
+                try:
+                    buckets = json.loads(f.read() or "{}")
+                except ValueError:
+                    buckets = {}
+                buckets[key], delay = self._take(key, buckets.get(key), self._clock())
+                f.seek(0)
+                f.truncate()
+                f.write(json.dumps(buckets))
+                f.flush()
+            finally:
+                fcntl.flock(f, fcntl.LOCK_UN)
+        return delay
@@ -0,0 +1,208 @@
+import hashlib
+import json
+import logging
+import os
+import sqlite3
+import threading
+import time
+from contextlib import closing
+from datetime import datetime
+from typing import Any, Callable, Dict, Optional, Tuple
+
+from .classes import JelasticEnvGroup, JelasticEnvironment
+from .jsonbackend import dumps, loads
+
+
+class FleetSnapshot:
+    """
+    Persistent snapshot of the fleet, in a local SQLite file: the last GetEnvs, GetEnvInfo
+    and GetGroups responses, per api_url and api_token, are stored by the connectors once
+    it is set as jelapi.fleet_snapshot. At the next start, the Jelastic objects are hydrated
+    from it instantly, then revalidated against the API in a background thread, into new
+    objects: the hydrated ones are never modified, so they can be used meanwhile.
+        jelapi.fleet_snapshot = FleetSnapshot("~/.cache/jelapi.sqlite")
+        envs = jelapi.fleet_snapshot.environments(on_revalidated=swap_envs)
+    """
+
+    FUNCTIONS = (
+        "Environment.Control.GetEnvs",
+        "Environment.Control.GetEnvInfo",
+        "Environment.Group.GetGroups",
+    )
+
+    def __init__(self, path: str) -> None:
+        # sqlite3 doesn't expand ~ itself
+        self.path = os.path.expanduser(path)
+        self.logger = logging.getLogger(self.__class__.__name__)
+        # The last background revalidation, to join() it if needed, and its result
+        self.revalidation: Optional[threading.Thread] = None
+        self.revalidated: Any = None
+        self._lock = threading.Lock()
+        with closing(self._connect()) as db, db:
+            db.execute(
+                "CREATE TABLE IF NOT EXISTS responses ("
+                " account TEXT, function TEXT, arguments TEXT, response TEXT, stored_at REAL,"
+                " PRIMARY KEY (account, function, arguments))"
+            )
+
+    def _connect(self) -> sqlite3.Connection:
+        # One connection per operation: they can't be shared between threads
+        return sqlite3.connect(self.path, timeout=30)
+
+    @staticmethod
+    def _account(apiurl: str, apitoken: str) -> str:
+        """
+        Key of the account; the token isn't stored in clear
+        """
+        return hashlib.sha256(f"{apiurl} {apitoken}".encode()).hexdigest()
+
+    @staticmethod
+    def _arguments(kwargs: Dict[str, Any]) -> str:
+        """
+        Key of the call's arguments, stable whatever the JSON backend
+        """
+        return json.dumps(kwargs, sort_keys=True)
+
+    @staticmethod
+    def _current() -> Tuple[str, str]:
+        import jelapi
+
+        return jelapi.api_url, jelapi.api_token
+
+    def record(
+        self,
+        apiurl: str,
+        apitoken: str,
+        function: str,
+        kwargs: Dict[str, Any],
+        response: Dict[str, Any],
+    ) -> None:
+        """
+        Store the response, if it is one of the snapshotted functions'
+        """
+        if function not in self.FUNCTIONS:
+            return
+        with closing(self._connect()) as db, db:
+            db.execute(
+                "INSERT OR REPLACE INTO responses VALUES (?, ?, ?, ?, ?)",
+                (
+                    self._account(apiurl, apitoken),
+                    function,
+                    self._arguments(kwargs),
+                    dumps(response),
+                    time.time(),
+                ),
+            )
+
+    def _load(self, function: str, **kwargs) -> Optional[Tuple[Dict[str, Any], float]]:
+        with closing(self._connect()) as db:
+            row = db.execute(
+                "SELECT response, stored_at FROM responses"
+                " WHERE account = ? AND function = ? AND arguments = ?",
+                (
+                    self._account(*self._current()),
+                    function,
+                    self._arguments(kwargs),
+                ),
+            ).fetchone()
+        if row is None:
+            return None
+        return loads(row[0]), row[1]
+
+    def stored_at(self, function: str, **kwargs) -> Optional[datetime]:
+        """
+        When the current account's response to that call was stored, if it was
+        """
+        loaded = self._load(function, **kwargs)
+        return datetime.fromtimestamp(loaded[1]) if loaded else None
+
+    def _revalidate(
+        self, fetch: Callable[[], Any], on_revalidated: Optional[Callable[[Any], Any]]
+    ) -> None:
+        def run() -> None:
+            try:
+                result = fetch()
+                with self._lock:
+                    self.revalidated = result
+                if on_revalidated is not None:
+                    on_revalidated(result)
+            except Exception:
+                self.logger.exception("Revalidation of the fleet snapshot failed")
+
+        self.revalidation = threading.Thread(target=run, daemon=True)
+        self.revalidation.start()
+
+    def environments(
+        self,
+        revalidate: bool = True,
+        on_revalidated: Optional[
+            Callable[[Dict[str, JelasticEnvironment]], Any]
+        ] = None,
+    ) -> Dict[str, JelasticEnvironment]:
+        """
+        The environments' dict, from the last GetEnvs; from the API if there's none
+        With revalidate, a new one is then built from the API in the background, set as
+        .revalidated and passed to on_revalidated; the returned one isn't modified
+        """
+        loaded = self._load("Environment.Control.GetEnvs")
+        if loaded is None:
+            return JelasticEnvironment.dict()
+
+        envs = JelasticEnvironment._dict_from_infos(loaded[0]["infos"])
+        if revalidate:
+
+            def fetch() -> Dict[str, JelasticEnvironment]:
+                from . import api_connector
+
+                response = api_connector()._("Environment.Control.GetEnvs")
+                return JelasticEnvironment._dict_from_infos(response["infos"])
+
+            self._revalidate(fetch, on_revalidated)
+        return envs
+
+    def environment(
+        self,
+        envName: str,
+        revalidate: bool = True,
+        on_revalidated: Optional[Callable[[JelasticEnvironment], Any]] = None,
+    ) -> JelasticEnvironment:
+        """
+        One environment, from its last GetEnvInfo; from the API if there's none
+        With revalidate, a new one is then built from the API in the background, set as
+        .revalidated and passed to on_revalidated; the returned one isn't modified
+        """
+        loaded = self._load("Environment.Control.GetEnvInfo", envName=envName)
+        if loaded is None:
+            return JelasticEnvironment.get(envName)
+
+        env = JelasticEnvironment()
+        env.update_from_info(loaded[0])
+        if revalidate:
+            self._revalidate(lambda: JelasticEnvironment.get(envName), on_revalidated)
+        return env
+
+    def env_groups(
+        self,
+        revalidate: bool = True,
+        on_revalidated: Optional[Callable[[Dict[str, JelasticEnvGroup]], Any]] = None,
+    ) -> Dict[str, JelasticEnvGroup]:
+        """
+        The envGroups' dict, from the last GetGroups; from the API if there's none
+        With revalidate, a new one is then built from the API in the background, set as
+        .revalidated and passed to on_revalidated; the returned one isn't modified
+        """
+        loaded = self._load("Environment.Group.GetGroups")
+        if loaded is None:
+            return JelasticEnvGroup.dict()
+
+        groups = JelasticEnvGroup._dict_from_array(loaded[0]["array"])
+        if revalidate:
+
+            def fetch() -> Dict[str, JelasticEnvGroup]:
+                from . import api_connector
+
+                array = api_connector()._("Environment.Group.GetGroups")["array"]
+                return JelasticEnvGroup._dict_from_array(array)
+
+            self._revalidate(fetch, on_revalidated)
+        return groups
@@ -29,6 +29,7 @@ setup(
     install_requires=install_requires,
     extras_require={
         "test": test_requires,
+        "json": ["orjson"],
     },
     classifiers=[
         "Programming Language :: Python :: 3",
@@ -0,0 +1,311 @@
+import asyncio
+import threading
+import time
+from unittest.mock import Mock
+
+import pytest
+import respx
+from httpx import Response, codes
+
+import jelapi
+from jelapi import api_connector as jelapic
+from jelapi.cache import MISS, ResponseCache, ttl_cache
+from jelapi.classes import JelasticEnvGroup, JelasticEnvironment
+from jelapi.connector import (
+    AsyncJelasticAPIConnector,
+    JelasticAPIConnector,
+    _shared_response_caches,
+)
+
+from .utils import get_standard_env
+
+APIURL = "https://api.example.org/"
+
+
+def test_ttl_cache_caches_per_api_url_and_token():
+    """
+    The cache is keyed by api_url and api_token
+    """
+    fnc = Mock(side_effect=lambda: object())
+    cached = ttl_cache(fnc)
+
+    first = cached()
+    assert cached() is first
+    fnc.assert_called_once()
+
+    api_token = jelapi.api_token
+    jelapi.api_token = "another-token"
+    assert cached() is not first
+    assert fnc.call_count == 2
+
+    jelapi.api_token = api_token
+    assert cached() is first
+    assert fnc.call_count == 2
+
+
+def test_ttl_cache_expires():
+    """
+    Past cache_ttl (and without stale window), the function gets called again
+    """
+    cache_ttl, cache_stale_ttl = jelapi.cache_ttl, jelapi.cache_stale_ttl
+    jelapi.cache_ttl, jelapi.cache_stale_ttl = 0, 0
+    try:
+        fnc = Mock(side_effect=lambda: object())
+        cached = ttl_cache(fnc)
+        assert cached() is not cached()
+        assert fnc.call_count == 2
+    finally:
+        jelapi.cache_ttl, jelapi.cache_stale_ttl = cache_ttl, cache_stale_ttl
+
+
+def test_ttl_cache_stale_while_revalidate():
+    """
+    Within the stale window, the stale value is returned while revalidating in the background
+    """
+    cache_ttl, cache_stale_ttl = jelapi.cache_ttl, jelapi.cache_stale_ttl
+    jelapi.cache_ttl, jelapi.cache_stale_ttl = 0, 60
+    try:
+        fnc = Mock(side_effect=["first", "second"])
+        cached = ttl_cache(fnc)
+        assert cached() == "first"
+        assert cached() == "first"
+        for _ in range(100):
+            if not cached._revalidating:
+                break
+            time.sleep(0.01)
+        assert fnc.call_count == 2
+        assert cached._entries[next(iter(cached._entries))].value == "second"
+    finally:
+        jelapi.cache_ttl, jelapi.cache_stale_ttl = cache_ttl, cache_stale_ttl
+
+
+def test_ttl_cache_invalidate_and_clear():
+    fnc = Mock(side_effect=lambda: object())
+    cached = ttl_cache(fnc)
+    cached()
+    cached.invalidate()
+    cached()
+    cached.cache_clear()
+    cached()
+    assert fnc.call_count == 3
+
+
+def test_ttl_cache_drops_revalidations_started_before_invalidate():
+    """
+    A revalidation still running when the cache gets invalidated doesn't store its result
+    """
+    cache_ttl, cache_stale_ttl = jelapi.cache_ttl, jelapi.cache_stale_ttl
+    jelapi.cache_ttl, jelapi.cache_stale_ttl = 0, 60
+    revalidating, invalidated = threading.Event(), threading.Event()
+    results = iter(["first", "stale", "fresh"])
+
+    def fnc():
+        result = next(results)
+        if result == "stale":
+            revalidating.set()
+            invalidated.wait(1)
+        return result
+
+    try:
+        cached = ttl_cache(fnc)
+        assert cached() == "first"
+        assert cached() == "first"
+        revalidating.wait(1)
+        cached.invalidate()
+        invalidated.set()
+        for thread in list(cached._revalidating.values()):
+            thread.join(1)
+        assert cached._entries == {}
+
+        jelapi.cache_ttl = 60
+        assert cached() == "fresh"
+        assert cached() == "fresh"
+    finally:
+        jelapi.cache_ttl, jelapi.cache_stale_ttl = cache_ttl, cache_stale_ttl
+
+
+def test_JelasticEnvironment_dict_invalidated_by_envGroups_change():
+    """
+    Saving envGroups invalidates both the environments' and the envGroups' dicts
+    """
+    jelapic()._ = Mock(return_value={"infos": [], "array": []})
+    JelasticEnvironment.dict.cache_clear()
+    JelasticEnvGroup.dict.cache_clear()
+    JelasticEnvironment.dict()
+    JelasticEnvGroup.dict()
+    assert jelapic()._.call_count == 2
+
+    jelenv = JelasticEnvironment()
+    jelenv.update_from_env_dict(get_standard_env())
+    jelenv.update_env_groups_from_info(["A"])
+    jelenv.envGroups.append("B")
+    jelenv._save_envGroups()
+    assert jelapic()._.call_count == 3
+
+    JelasticEnvironment.dict()
+    JelasticEnvGroup.dict()
+    assert jelapic()._.call_count == 5
+
+
+def test_JelasticEnvGroup_dict_invalidated_by_create_and_remove():
+    jelapic()._ = Mock(return_value={"array": []})
+    JelasticEnvGroup.dict.cache_clear()
+    JelasticEnvGroup.dict()
+
+    jeg = JelasticEnvGroup(name="new", color="#123456")
+    jeg.save()
+    JelasticEnvGroup.dict()
+    jeg.delete_from_api()
+    JelasticEnvGroup.dict()
+    assert [c.args[0] for c in jelapic()._.call_args_list] == [
+        "Environment.Group.GetGroups",
+        "Environment.Group.CreateGroup",
+        "Environment.Group.GetGroups",
+        "Environment.Group.RemoveGroup",
+        "Environment.Group.GetGroups",
+    ]
+
+
+@pytest.fixture
+def cached_functions():
+    jelapi.response_cache_ttls = {
+        "Environment.Control.GetEnvInfo": 60,
+        "Environment.Control.GetEnvs": 60,
+    }
+    _shared_response_caches.clear()
+    yield
+    _shared_response_caches.clear()
+    jelapi.response_cache_ttls = {}
+    jelapi.response_cache_size = 1024
+
+
+def getenvinfo_key(envName):
+    return ("token", "Environment.Control.GetEnvInfo", (("envName", envName),))
+
+
+def test_response_cache_hits_and_misses(cached_functions):
+    cache = ResponseCache()
+    key = getenvinfo_key("env")
+    response = {"result": 0, "env": {"envName": "env"}}
+
+    assert cache.get(key) is MISS
+    cache.put(key, response)
+    cached = cache.get(key)
+    assert cached == response
+    assert cached is not response
+    assert (cache.hits, cache.misses) == (1, 1)
+
+    # Functions without TTL are neither cached nor counted
+    other = ("token", "Environment.Control.GetContainerEnvVars", ())
+    cache.put(other, response)
+    assert cache.get(other) is MISS
+    assert (cache.hits, cache.misses) == (1, 1)
+
+    cache.clear()
+    assert cache.get(key) is MISS
+    assert (cache.hits, cache.misses) == (0, 1)
+
+
+def test_response_cache_expires(cached_functions):
+    cache = ResponseCache()
+    key = getenvinfo_key("env")
+    cache.put(key, {"result": 0})
+    jelapi.response_cache_ttls["Environment.Control.GetEnvInfo"] = 0.01
+    time.sleep(0.02)
+    assert cache.get(key) is MISS
+
+
+def test_response_cache_evicts_least_recently_used(cached_functions):
+    jelapi.response_cache_size = 2
+    cache = ResponseCache()
+    for envName in ["a", "b"]:
+        cache.put(getenvinfo_key(envName), {"result": 0})
+    assert cache.get(getenvinfo_key("a")) is not MISS
+    cache.put(getenvinfo_key("c"), {"result": 0})
+    assert cache.get(getenvinfo_key("b")) is MISS
+    assert cache.get(getenvinfo_key("a")) is not MISS
+    assert cache.get(getenvinfo_key("c")) is not MISS
+
+
+def test_response_cache_invalidation(cached_functions):
+    cache = ResponseCache()
+    getenvs = ("token", "Environment.Control.GetEnvs", ())
+    for key in [getenvinfo_key("a"), getenvinfo_key("b"), getenvs]:
+        cache.put(key, {"result": 0})
+
+    # A mutation on "a" forgets it, and the account-wide responses
+    cache.invalidate({"envName": "a", "nodeGroup": "cp"})
+    assert cache.get(getenvinfo_key("a")) is MISS
+    assert cache.get(getenvs) is MISS
+    assert cache.get(getenvinfo_key("b")) is not MISS
+
+    # A mutation without envName forgets everything
+    cache.invalidate({"groupName": "group"})
+    assert cache.get(getenvinfo_key("b")) is MISS
+
+
+def test_response_cache_drops_responses_to_reads_older_than_a_write(cached_functions):
+    cache = ResponseCache()
+    getenvs = ("token", "Environment.Control.GetEnvs", ())
+    started = {
+        key: cache.generation(dict(key[2]).get("envName"))
+        for key in [getenvinfo_key("a"), getenvinfo_key("b"), getenvs]
+    }
+
+    # A write on "a" lands while these reads are in flight
+    cache.invalidate({"envName": "a"})
+    for key, generation in started.items():
+        cache.put(key, {"result": 0}, generation)
+    assert cache.get(getenvinfo_key("a")) is MISS
+    assert cache.get(getenvs) is MISS
+    assert cache.get(getenvinfo_key("b")) is not MISS
+
+    # One without envName outdates them all
+    generation = cache.generation("b")
+    cache.invalidate({"groupName": "group"})
+    cache.put(getenvinfo_key("b"), {"result": 0}, generation)
+    assert cache.get(getenvinfo_key("b")) is MISS
+
+
+@respx.mock
+def test_connector_caches_responses(cached_functions):
+    japic = JelasticAPIConnector(apiurl=APIURL, apitoken="token")
+    getenvinfo = respx.post(f"{APIURL}environment/control/rest/getenvinfo").mock(
+        return_value=Response(status_code=codes.OK, json={"result": 0, "env": {}})
+    )
+    respx.post(f"{APIURL}environment/control/rest/startenv").mock(
+        return_value=Response(status_code=codes.OK, json={"result": 0})
+    )
+
+    for _ in range(3):
+        assert japic._("Environment.Control.GetEnvInfo", envName="env") == {
+            "result": 0,
+            "env": {},
+        }
+    assert getenvinfo.call_count == 1
+    assert (japic.response_cache.hits, japic.response_cache.misses) == (2, 1)
+
+    japic._("Environment.Control.StartEnv", envName="env")
+    japic._("Environment.Control.GetEnvInfo", envName="env")
+    assert getenvinfo.call_count == 2
+
+
+@respx.mock
+def test_connectors_share_the_response_cache_per_apiurl(cached_functions):
+    japic = JelasticAPIConnector(apiurl=APIURL, apitoken="token")
+    ajapic = AsyncJelasticAPIConnector(apiurl=APIURL, apitoken="token")
+    getenvinfo = respx.post(f"{APIURL}environment/control/rest/getenvinfo").mock(
+        return_value=Response(status_code=codes.OK, json={"result": 0, "env": {}})
+    )
+    respx.post(f"{APIURL}environment/control/rest/startenv").mock(
+        return_value=Response(status_code=codes.OK, json={"result": 0})
+    )
+
+    asyncio.run(ajapic._("Environment.Control.GetEnvInfo", envName="env"))
+    japic._("Environment.Control.GetEnvInfo", envName="env")
+    assert getenvinfo.call_count == 1
+
+    # A write through the sync connector forgets what the async one cached
+    japic._("Environment.Control.StartEnv", envName="env")
+    asyncio.run(ajapic._("Environment.Control.GetEnvInfo", envName="env"))
+    assert getenvinfo.call_count == 2
@@ -1,9 +1,22 @@
+import asyncio
+import threading
+import time
+from unittest.mock import Mock, patch
+
+import httpx
 import pytest
 import respx
 from httpx import Response, codes
 
+import jelapi
 from jelapi import JelasticAPIException
-from jelapi.connector import JelasticAPIConnector
+from jelapi.connector import (
+    AsyncJelasticAPIConnector,
+    JelasticAPIConnector,
+    _Flight,
+    _retry_delay,
+    close_shared_clients,
+)
 
 APIURL = "https://api.example.org/"
 
@@ -32,9 +45,11 @@ def test_connector_failed_empty_answer():
     getenvs_route = respx.post(f"{APIURL}environment/control/rest/getenvs").mock(
         return_value=Response(status_code=codes.OK, json={"result": 1})
     )
-    with pytest.raises(JelasticAPIException):
+    with pytest.raises(JelasticAPIException) as excinfo:
         japic._("Environment.Control.GetEnvs")
-        assert getenvs_route.called
+    assert getenvs_route.called
+    assert excinfo.value.status_code is None
+    assert excinfo.value.response == {"result": 1}
 
 
 @respx.mock
@@ -47,9 +62,11 @@ def test_connector_fails_on_non_OK_status():
     getenvs_route = respx.post(f"{APIURL}environment/control/rest/getenvs").mock(
         return_value=Response(status_code=codes.IM_A_TEAPOT, json={"result": 0})
     )
-    with pytest.raises(JelasticAPIException):
+    with pytest.raises(JelasticAPIException) as excinfo:
         japic._("Environment.Control.GetEnvs")
-        assert getenvs_route.called
+    assert getenvs_route.called
+    assert excinfo.value.status_code == codes.IM_A_TEAPOT
+    assert excinfo.value.response is None
 
 
 def test_connector_refuses_wrongly_formatted_functions():
@@ -101,3 +118,497 @@ def test_connector_is_not_functional_without_api_token():
 def test_connector_is_functional_with_both():
     japic = JelasticAPIConnector(apiurl=APIURL, apitoken="secret")
     assert japic.is_functional()
+
+
+@respx.mock
+def test_async_connector_successfull_empty_answer():
+    """
+    Check that a simple awaited call with a 'result': 0 is successful
+    """
+    japic = AsyncJelasticAPIConnector(apiurl=APIURL, apitoken="string")
+
+    getenvs_route = respx.post(f"{APIURL}environment/control/rest/getenvs").mock(
+        return_value=Response(status_code=codes.OK, json={"result": 0})
+    )
+    assert asyncio.run(japic._("Environment.Control.GetEnvs")) == {"result": 0}
+    assert getenvs_route.called
+    assert getenvs_route.calls.last.request.content == b"session=string"
+
+
+@respx.mock
+def test_async_connector_failed_empty_answer():
+    """
+    Check that a simple awaited call with a 'result': 1 raises
+    """
+    japic = AsyncJelasticAPIConnector(apiurl=APIURL, apitoken="string")
+
+    respx.post(f"{APIURL}environment/control/rest/getenvs").mock(
+        return_value=Response(status_code=codes.OK, json={"result": 1})
+    )
+    with pytest.raises(JelasticAPIException):
+        asyncio.run(japic._("Environment.Control.GetEnvs"))
+
+
+@respx.mock
+def test_async_connector_survives_successive_event_loops():
+    """
+    Check that an async connector can be used from successive asyncio.run(), with a new
+    httpx client for each event loop, unless that client was given
+    """
+    japic = AsyncJelasticAPIConnector(apiurl=APIURL, apitoken="string")
+
+    getenvs_route = respx.post(f"{APIURL}environment/control/rest/getenvs").mock(
+        return_value=Response(status_code=codes.OK, json={"result": 0})
+    )
+    assert asyncio.run(japic._("Environment.Control.GetEnvs")) == {"result": 0}
+    first_client = japic.client
+    assert asyncio.run(japic._("Environment.Control.GetEnvs")) == {"result": 0}
+    assert japic.client is not first_client
+    assert not japic.client.is_closed
+    assert getenvs_route.call_count == 2
+
+    client = httpx.AsyncClient()
+    japic = AsyncJelasticAPIConnector(apiurl=APIURL, apitoken="string", client=client)
+    asyncio.run(japic._("Environment.Control.GetEnvs"))
+    asyncio.run(japic._("Environment.Control.GetEnvs"))
+    assert japic.client is client
+
+
+@respx.mock
+def test_async_connector_fails_on_non_OK_status():
+    """
+    Check that an awaited call with an HTTP status != 200 raises
+    """
+    japic = AsyncJelasticAPIConnector(apiurl=APIURL, apitoken="string")
+
+    respx.post(f"{APIURL}environment/control/rest/getenvs").mock(
+        return_value=Response(status_code=codes.IM_A_TEAPOT, json={"result": 0})
+    )
+    with pytest.raises(JelasticAPIException):
+        asyncio.run(japic._("Environment.Control.GetEnvs"))
+
+
+def test_async_connector_refuses_wrongly_formatted_functions():
+    """
+    Check that functions need to be in the First.Second.Word format
+    """
+    japic = AsyncJelasticAPIConnector(apiurl=APIURL, apitoken="string")
+
+    with pytest.raises(JelasticAPIException):
+        asyncio.run(japic._("Not.A.Function.Call"))
+
+
+@respx.mock
+def test_async_connector_runs_calls_concurrently():
+    """
+    Check that many calls can be awaited together
+    """
+    japic = AsyncJelasticAPIConnector(apiurl=APIURL, apitoken="string")
+
+    getenvinfo_route = respx.post(f"{APIURL}environment/control/rest/getenvinfo").mock(
+        return_value=Response(status_code=codes.OK, json={"result": 0})
+    )
+
+    async def gather():
+        return await asyncio.gather(
+            *(
+                japic._("Environment.Control.GetEnvInfo", envName=f"env-{i}")
+                for i in range(10)
+            )
+        )
+
+    assert len(asyncio.run(gather())) == 10
+    assert getenvinfo_route.call_count == 10
+
+
+def test_async_connector_is_functional_with_both():
+    japic = AsyncJelasticAPIConnector(apiurl=APIURL, apitoken="secret")
+    assert japic.is_functional()
+    japic = AsyncJelasticAPIConnector(apiurl=APIURL, apitoken="")
+    assert not japic.is_functional()
+
+
+@respx.mock
+def test_connector_payload_is_fresh_for_each_call():
+    """
+    Check that the given data is not modified, and doesn't leak to the next call
+    """
+    japic = JelasticAPIConnector(apiurl=APIURL, apitoken="string")
+
+    route = respx.post(f"{APIURL}environment/control/rest/getenvinfo").mock(
+        return_value=Response(status_code=codes.OK, json={"result": 0})
+    )
+    data = {"envName": "first"}
+    japic._apicall("environment/control/rest/getenvinfo", method="post", data=data)
+    assert data == {"envName": "first"}
+    assert route.calls.last.request.content == b"envName=first&session=string"
+
+    japic._apicall("environment/control/rest/getenvinfo", method="post")
+    assert route.calls.last.request.content == b"session=string"
+
+
+def test_connectors_share_the_client_per_apiurl():
+    """
+    Connectors to the same apiurl reuse the same httpx client, whatever their token
+    """
+    japic = JelasticAPIConnector(apiurl=APIURL, apitoken="string")
+    assert JelasticAPIConnector(apiurl=APIURL, apitoken="other").client is japic.client
+    assert (
+        JelasticAPIConnector(
+            apiurl="https://other.example.org/", apitoken="string"
+        ).client
+        is not japic.client
+    )
+
+    client = httpx.Client()
+    assert (
+        JelasticAPIConnector(apiurl=APIURL, apitoken="s", client=client).client
+        is client
+    )
+
+
+@respx.mock
+def test_connectors_recover_from_closed_shared_clients():
+    """
+    Closing the shared clients doesn't break the existing connectors, the global one included
+    """
+    route = respx.post(f"{jelapi.api_url}environment/control/rest/getenvinfo").mock(
+        return_value=Response(status_code=codes.OK, json={"result": 0})
+    )
+    jelapi._api_connector = None
+    japic = jelapi.api_connector()
+    closed = japic.client
+    close_shared_clients()
+    assert closed.is_closed
+
+    assert jelapi.api_connector()._apicall(
+        "environment/control/rest/getenvinfo", method="post"
+    ) == {"result": 0}
+    assert route.called
+    assert jelapi.api_connector().client is not closed
+    assert not jelapi.api_connector().client.is_closed
+
+    # A given client is the caller's to manage
+    client = httpx.Client()
+    japic = JelasticAPIConnector(apiurl=APIURL, apitoken="string", client=client)
+    client.close()
+    with pytest.raises(RuntimeError):
+        japic._apicall("environment/control/rest/getenvinfo", method="post")
+
+
+def test_connector_client_follows_the_configuration():
+    """
+    Shared clients are created with the configured pool limits and HTTP/2
+    """
+    jelapi.http2 = True
+    jelapi.pool_max_connections = 4
+    try:
+        close_shared_clients()
+        with patch("jelapi.connector.httpx.Client") as Client:
+            Client.return_value.is_closed = False
+            JelasticAPIConnector(apiurl=APIURL, apitoken="string")
+            JelasticAPIConnector(apiurl=APIURL, apitoken="other")
+        Client.assert_called_once()
+        assert Client.call_args[1]["http2"] is True
+        assert Client.call_args[1]["limits"].max_connections == 4
+    finally:
+        jelapi.http2 = False
+        jelapi.pool_max_connections = 100
+        close_shared_clients()
+
+    # Closed clients get replaced
+    japic = JelasticAPIConnector(apiurl=APIURL, apitoken="string")
+    japic.client.close()
+    assert (
+        JelasticAPIConnector(apiurl=APIURL, apitoken="string").client
+        is not japic.client
+    )
+
+
+@pytest.fixture
+def no_backoff():
+    jelapi.retry_backoff = 0
+    yield
+    jelapi.retry_backoff = 0.5
+
+
+@respx.mock
+def test_connector_retries_idempotent_calls(no_backoff):
+    """
+    Get* calls are retried on transport errors and HTTP 502/503/504
+    """
+    japic = JelasticAPIConnector(apiurl=APIURL, apitoken="string")
+
+    route = respx.post(f"{APIURL}environment/control/rest/getenvinfo").mock(
+        side_effect=[
+            httpx.ConnectError("refused"),
+            Response(status_code=codes.BAD_GATEWAY),
+            Response(status_code=codes.OK, json={"result": 0}),
+        ]
+    )
+    assert japic._("Environment.Control.GetEnvInfo", envName="env") == {"result": 0}
+    assert route.call_count == 3
+
+
+@respx.mock
+def test_connector_gives_up_retrying(no_backoff):
+    """
+    After jelapi.retries, the last failure is raised
+    """
+    japic = JelasticAPIConnector(apiurl=APIURL, apitoken="string")
+
+    route = respx.post(f"{APIURL}environment/control/rest/getenvinfo").mock(
+        return_value=Response(status_code=codes.SERVICE_UNAVAILABLE)
+    )
+    with pytest.raises(JelasticAPIException):
+        japic._("Environment.Control.GetEnvInfo", envName="env")
+    assert route.call_count == jelapi.retries + 1
+
+    route.mock(side_effect=httpx.ReadTimeout("too long"))
+    with pytest.raises(httpx.ReadTimeout):
+        japic._("Environment.Control.GetEnvInfo", envName="env")
+
+
+@respx.mock
+def test_connector_does_not_retry_non_idempotent_calls(no_backoff):
+    """
+    ChangeTopology, and other HTTP errors than 502/503/504, aren't retried
+    """
+    japic = JelasticAPIConnector(apiurl=APIURL, apitoken="string")
+
+    route = respx.post(f"{APIURL}environment/control/rest/changetopology").mock(
+        return_value=Response(status_code=codes.BAD_GATEWAY)
+    )
+    with pytest.raises(JelasticAPIException):
+        japic._("Environment.Control.ChangeTopology", envName="env")
+    assert route.call_count == 1
+
+    route = respx.post(f"{APIURL}environment/control/rest/getenvs").mock(
+        return_value=Response(status_code=codes.INTERNAL_SERVER_ERROR)
+    )
+    with pytest.raises(JelasticAPIException):
+        japic._("Environment.Control.GetEnvs")
+    assert route.call_count == 1
+
+
+@respx.mock
+def test_connector_applies_per_function_timeouts():
+    """
+    Reads get the read_timeout, listed functions theirs, the others none
+    """
+    japic = JelasticAPIConnector(apiurl=APIURL, apitoken="string")
+
+    route = respx.post(url__startswith=APIURL).mock(
+        return_value=Response(status_code=codes.OK, json={"result": 0})
+    )
+    japic._("Environment.Control.GetEnvInfo", envName="env")
+    assert route.calls.last.request.extensions["timeout"]["read"] == jelapi.read_timeout
+    japic._("Environment.Control.ChangeTopology", envName="env")
+    assert route.calls.last.request.extensions["timeout"]["read"] == 1800.0
+    japic._("Environment.Control.StartEnv", envName="env")
+    assert route.calls.last.request.extensions["timeout"]["read"] is None
+
+    # Changes to the configuration apply to the next calls
+    jelapi.function_timeouts["Environment.Control.StartEnv"] = 600.0
+    try:
+        japic._("Environment.Control.StartEnv", envName="env")
+    finally:
+        del jelapi.function_timeouts["Environment.Control.StartEnv"]
+    assert route.calls.last.request.extensions["timeout"]["read"] == 600.0
+
+
+@respx.mock
+def test_async_connector_retries_idempotent_calls(no_backoff):
+    """
+    The async connector retries the same way
+    """
+    japic = AsyncJelasticAPIConnector(apiurl=APIURL, apitoken="string")
+
+    route = respx.post(f"{APIURL}environment/control/rest/getenvinfo").mock(
+        side_effect=[
+            Response(status_code=codes.GATEWAY_TIMEOUT),
+            Response(status_code=codes.OK, json={"result": 0}),
+        ]
+    )
+    assert asyncio.run(japic._("Environment.Control.GetEnvInfo", envName="env")) == {
+        "result": 0
+    }
+    assert route.call_count == 2
+
+
+def test_connector_retry_delay_is_jittered_and_capped():
+    delays = [_retry_delay(attempt) for attempt in range(20)]
+    assert all(0 <= d <= jelapi.retry_backoff_max for d in delays)
+    assert len(set(delays)) > 1
+
+
+def test_connector_coalesces_identical_concurrent_reads():
+    """
+    Callers of an in-flight identical call wait for it, and get deep copies of its response
+    """
+    japic = JelasticAPIConnector(apiurl=APIURL, apitoken="string")
+    key = japic._call_key("Environment.Control.GetEnvInfo", {"envName": "env"})
+    flight = japic._flights[key] = _Flight()
+    call = Mock()
+
+    results = []
+    followers = [
+        threading.Thread(target=lambda: results.append(japic._single_flight(key, call)))
+        for _ in range(3)
+    ]
+    for t in followers:
+        t.start()
+    # The first one to join has the flight wake it up
+    while flight.done is None:
+        time.sleep(0.001)
+    flight.result = {"result": 0, "env": {"envName": "env"}}
+    flight.done.set()
+    for t in followers:
+        t.join()
+
+    call.assert_not_called()
+    assert results == [flight.result] * 3
+    assert all(r is not flight.result for r in results)
+
+
+def test_connector_single_flight_leader_calls_and_cleans_up():
+    japic = JelasticAPIConnector(apiurl=APIURL, apitoken="string")
+    response = {"result": 0}
+    assert japic._single_flight("key", Mock(return_value=response)) is response
+    assert japic._flights == {}
+
+    with pytest.raises(JelasticAPIException):
+        japic._single_flight("key", Mock(side_effect=JelasticAPIException("failed")))
+    assert japic._flights == {}
+
+
+@respx.mock
+def test_connector_reads_after_a_write_dont_join_older_flights():
+    """
+    A read started after a mutating call on its envName gets its own response
+    """
+    japic = JelasticAPIConnector(apiurl=APIURL, apitoken="string")
+    route = respx.post(f"{APIURL}environment/control/rest/getenvinfo").mock(
+        return_value=Response(status_code=codes.OK, json={"result": 0})
+    )
+    respx.post(f"{APIURL}environment/control/rest/startenv").mock(
+        return_value=Response(status_code=codes.OK, json={"result": 0})
+    )
+    # A read in flight before the write
+    key = japic._call_key("Environment.Control.GetEnvInfo", {"envName": "env"})
+    flight = _Flight()
+    flight.result = {"result": 0, "stale": True}
+    flight.done = threading.Event()
+    flight.done.set()
+    japic._flights[(key, japic.response_cache.generation("env"))] = flight
+
+    japic._("Environment.Control.StartEnv", envName="env")
+    assert japic._("Environment.Control.GetEnvInfo", envName="env") == {"result": 0}
+    assert route.called
+
+
+@respx.mock
+def test_async_connector_reads_after_a_write_dont_join_older_flights():
+    japic = AsyncJelasticAPIConnector(apiurl=APIURL, apitoken="string")
+    route = respx.post(f"{APIURL}environment/control/rest/getenvinfo").mock(
+        return_value=Response(status_code=codes.OK, json={"result": 0})
+    )
+    respx.post(f"{APIURL}environment/control/rest/startenv").mock(
+        return_value=Response(status_code=codes.OK, json={"result": 0})
+    )
+
+    async def write_then_read():
+        key = japic._call_key("Environment.Control.GetEnvInfo", {"envName": "env"})
+        flight = asyncio.get_running_loop().create_future()
+        flight.set_result({"result": 0, "stale": True})
+        japic._flights[(key, japic.response_cache.generation("env"))] = flight
+
+        await japic._("Environment.Control.StartEnv", envName="env")
+        return await japic._("Environment.Control.GetEnvInfo", envName="env")
+
+    assert asyncio.run(write_then_read()) == {"result": 0}
+    assert route.called
+
+
+@respx.mock
+def test_connector_only_coalesces_idempotent_calls():
+    japic = JelasticAPIConnector(apiurl=APIURL, apitoken="string")
+    japic._single_flight = Mock()
+
+    respx.post(url__startswith=APIURL).mock(
+        return_value=Response(status_code=codes.OK, json={"result": 0})
+    )
+    japic._("Environment.Control.StartEnv", envName="env")
+    japic._single_flight.assert_not_called()
+    japic._("Environment.Control.GetEnvInfo", envName="env")
+    japic._single_flight.assert_called_once()
+
+    # Not when disabled, nor with unhashable arguments
+    japic._("Environment.Control.GetEnvInfo", envName=["env"])
+    jelapi.coalesce_reads = False
+    try:
+        japic._("Environment.Control.GetEnvInfo", envName="env")
+    finally:
+        jelapi.coalesce_reads = True
+    japic._single_flight.assert_called_once()
+
+
+@respx.mock
+def test_connector_doesnt_key_uncached_uncoalesced_reads():
+    japic = JelasticAPIConnector(apiurl=APIURL, apitoken="string")
+    japic._call_key = Mock()
+
+    respx.post(url__startswith=APIURL).mock(
+        return_value=Response(status_code=codes.OK, json={"result": 0})
+    )
+    jelapi.coalesce_reads = False
+    try:
+        assert japic._("Environment.Control.GetEnvInfo", envName="env") == {"result": 0}
+    finally:
+        jelapi.coalesce_reads = True
+    japic._call_key.assert_not_called()
+
+
+def test_async_connector_coalesces_identical_concurrent_reads():
+    japic = AsyncJelasticAPIConnector(apiurl=APIURL, apitoken="string")
+    calls = []
+
+    async def call():
+        calls.append(1)
+        await asyncio.sleep(0.01)
+        return {"result": 0}
+
+    async def gather():
+        return await asyncio.gather(
+            *(japic._single_flight("key", call) for _ in range(5))
+        )
+
+    results = asyncio.run(gather())
+    assert len(calls) == 1
+    assert results == [{"result": 0}] * 5
+    assert len({id(r) for r in results}) == 5
+    assert japic._flights == {}
+
+
+@respx.mock
+def test_connector_streams_array_items():
+    japic = JelasticAPIConnector(apiurl=APIURL, apitoken="string")
+
+    route = respx.post(f"{APIURL}environment/control/rest/getenvs").mock(
+        return_value=Response(
+            status_code=codes.OK, json={"result": 0, "infos": [{"a": 1}, {"b": 2}]}
+        )
+    )
+    assert list(japic._iter("Environment.Control.GetEnvs", "infos")) == [
+        {"a": 1},
+        {"b": 2},
+    ]
+    assert route.calls.last.request.content == b"session=string"
+
+    route.mock(return_value=Response(status_code=codes.OK, json={"result": 1}))
+    with pytest.raises(JelasticAPIException):
+        list(japic._iter("Environment.Control.GetEnvs", "infos"))
+
+    route.mock(return_value=Response(status_code=codes.BAD_GATEWAY))
+    with pytest.raises(JelasticAPIException):
+        list(japic._iter("Environment.Control.GetEnvs", "infos"))
@@ -0,0 +1,282 @@
+import asyncio
+import threading
+import time
+from unittest.mock import Mock
+
+import pytest
+import respx
+from httpx import Response, codes
+
+import jelapi
+from jelapi import api_connector as jelapic
+from jelapi import async_api_connector as jelapic_async
+from jelapi.classes import JelasticEnvironment, JelasticNodeGroup
+from jelapi.exceptions import JelasticAPIException, JelasticObjectException
+from jelapi.fleet import (
+    arefresh_many,
+    arun_on_fleet,
+    execute_on_fleet,
+    iter_on_fleet,
+    read_files,
+    refresh_many,
+    run_on_fleet,
+    select_nodes,
+)
+
+from .utils import (
+    AsyncMock,
+    get_standard_env,
+    get_standard_node,
+    get_standard_node_groups,
+)
+
+
+def get_running_envs(count: int):
+    envs = []
+    for i in range(count):
+        env = JelasticEnvironment()
+        env.update_from_env_dict({**get_standard_env(), "envName": f"env-{i}"})
+        envs.append(env)
+    return envs
+
+
+def test_run_on_fleet_by_method_name():
+    """
+    Methods can be called by name on all items, outcomes come back in order
+    """
+    jelapic()._ = Mock()
+    envs = get_running_envs(10)
+    outcomes = run_on_fleet(envs, "sleep", concurrency=4)
+    assert [o.item for o in outcomes] == envs
+    assert all(o.ok for o in outcomes)
+    assert jelapic()._.call_count == 10
+    assert all(env.status == JelasticEnvironment.Status.SLEEPING for env in envs)
+
+
+def test_run_on_fleet_reports_exceptions_without_aborting():
+    """
+    One failing item doesn't stop the others
+    """
+
+    def failing_for_env_3(env):
+        if env.envName == "env-3":
+            raise JelasticAPIException("nope")
+        return env.envName
+
+    outcomes = run_on_fleet(get_running_envs(6), failing_for_env_3)
+    assert [o.ok for o in outcomes] == [True, True, True, False, True, True]
+    assert isinstance(outcomes[3].exception, JelasticAPIException)
+    assert outcomes[5].result == "env-5"
+
+
+def test_run_on_fleet_limits_concurrency():
+    """
+    No more than concurrency operations run at once
+    """
+    lock = threading.Lock()
+    running = []
+    peak = []
+
+    def operation(item):
+        with lock:
+            running.append(item)
+            peak.append(len(running))
+        time.sleep(0.01)
+        with lock:
+            running.remove(item)
+
+    run_on_fleet(range(20), operation, concurrency=3)
+    assert max(peak) <= 3
+
+
+def test_run_on_fleet_refuses_no_concurrency():
+    with pytest.raises(ValueError):
+        run_on_fleet([], "sleep", concurrency=0)
+    with pytest.raises(ValueError):
+        asyncio.run(arun_on_fleet([], "sleep", concurrency=0))
+
+
+def test_arun_on_fleet_with_sync_and_async_operations():
+    """
+    Synchronous operations run in the executor, coroutines are awaited
+    """
+    jelapic()._ = Mock()
+    envs = get_running_envs(5)
+    outcomes = asyncio.run(arun_on_fleet(envs, "stop", concurrency=2))
+    assert all(o.ok for o in outcomes)
+    assert jelapic()._.call_count == 5
+
+    running = []
+    peak = []
+
+    async def operation(env):
+        running.append(env)
+        peak.append(len(running))
+        await asyncio.sleep(0.01)
+        running.remove(env)
+        if env.envName == "env-1":
+            raise JelasticAPIException("nope")
+        return env.envName
+
+    outcomes = asyncio.run(arun_on_fleet(envs, operation, concurrency=2))
+    assert max(peak) <= 2
+    assert [o.result for o in outcomes] == ["env-0", None, "env-2", "env-3", "env-4"]
+    assert isinstance(outcomes[1].exception, JelasticAPIException)
+
+
+def test_refresh_many_reports_failures_without_aborting():
+    """
+    refresh_many() refreshes all environments from API; failures are reported
+    """
+
+    def get_env_info(function, envName):
+        if envName == "env-1":
+            raise JelasticAPIException("nope")
+        return {
+            "env": {**get_standard_env(), "envName": envName, "displayName": "new"},
+            "nodes": [],
+        }
+
+    jelapic()._ = Mock(side_effect=get_env_info)
+    envs = get_running_envs(4)
+    outcomes = refresh_many(envs, concurrency=2)
+    assert [o.ok for o in outcomes] == [True, False, True, True]
+    assert isinstance(outcomes[1].exception, JelasticAPIException)
+    assert [env.displayName for env in envs][:2] == ["new", "initial displayName"]
+    assert jelapic()._.call_count == 4
+
+
+def test_arefresh_many():
+    jelapic_async()._ = AsyncMock(
+        return_value={"env": {**get_standard_env(), "displayName": "new"}}
+    )
+    envs = get_running_envs(3)
+    outcomes = asyncio.run(arefresh_many(envs, concurrency=2))
+    assert all(o.ok for o in outcomes)
+    assert all(env.displayName == "new" for env in envs)
+
+
+def test_iter_on_fleet_yields_as_operations_complete():
+    """
+    Outcomes come as soon as available, with no more than concurrency operations at once
+    """
+    lock = threading.Lock()
+    running = []
+    peak = []
+
+    def operation(item):
+        with lock:
+            running.append(item)
+            peak.append(len(running))
+        time.sleep(0.05 if item == 0 else 0.001)
+        with lock:
+            running.remove(item)
+        return item
+
+    outcomes = list(iter_on_fleet(range(10), operation, concurrency=3))
+    assert max(peak) <= 3
+    assert sorted(o.result for o in outcomes) == list(range(10))
+    assert outcomes[-1].result == 0
+    with pytest.raises(ValueError):
+        iter_on_fleet([], operation, concurrency=0)
+
+
+def test_execute_on_fleet_on_selected_nodes():
+    """
+    Commands run on the nodes selected by environment, nodeGroup type, docker image and envGroup
+    """
+    infos = []
+    for i, image in enumerate(["debian:11", "debian:12", "alpine"]):
+        node = {**get_standard_node(id=i), "customitem": {"dockerName": image}}
+        infos.append(
+            {
+                "env": {**get_standard_env(), "envName": f"env-{i}"},
+                "envGroups": ["prod"] if i else [],
+                "nodeGroups": get_standard_node_groups(),
+                "nodes": [node, {**node, "id": 10 + i, "nodeGroup": "sqldb"}],
+            }
+        )
+    envs = JelasticEnvironment._dict_from_infos(infos).values()
+
+    assert len(select_nodes(envs)) == 6
+    assert [n.id for n in select_nodes(envs, envNames=["env-1"])] == [1, 11]
+    assert [
+        n.id
+        for n in select_nodes(
+            envs, node_group_types=[JelasticNodeGroup.NodeGroupType.SQL_DATABASE]
+        )
+    ] == [10, 11, 12]
+    assert [n.id for n in select_nodes(envs, docker_images=["debian:12"])] == [1, 11]
+    nodes = select_nodes(envs, env_groups=["prod"], node_group_types=["cp"])
+    assert [n.id for n in nodes] == [1, 2]
+
+    def exec_cmd(function, envName, nodeid, commandList):
+        if nodeid == 2:
+            raise JelasticAPIException("nope")
+        return {"responses": [{"out": f"{nodeid}", "errOut": "", "result": 0}]}
+
+    jelapic()._ = Mock(side_effect=exec_cmd)
+    outcomes = {o.item.id: o for o in execute_on_fleet(nodes, ["hostname"])}
+    assert outcomes[1].result == [{"out": "1", "errOut": "", "result": 0}]
+    assert isinstance(outcomes[2].exception, JelasticAPIException)
+    with pytest.raises(TypeError):
+        execute_on_fleet(nodes, "hostname")
+
+
+def get_envs_with_two_nodes(statuses):
+    infos = []
+    for i, status in enumerate(statuses):
+        node = get_standard_node(id=i)
+        infos.append(
+            {
+                "env": {**get_standard_env(status=status.value), "envName": f"env-{i}"},
+                "nodeGroups": get_standard_node_groups(),
+                "nodes": [node, {**node, "id": 10 + i}],
+            }
+        )
+    return JelasticEnvironment._dict_from_infos(infos).values()
+
+
+def test_read_files_checks_each_environment_once():
+    """
+    All (node, path) are read, but not in environments not running
+    """
+    Status = JelasticEnvironment.Status
+    envs = get_envs_with_two_nodes([Status.RUNNING, Status.STOPPED])
+    nodes = select_nodes(envs)
+    with pytest.raises(TypeError):
+        read_files(nodes, ["/etc/hosts", ""])
+
+    def read(function, envName, nodeid, path):
+        return {"body": f"{nodeid}:{path}"}
+
+    jelapic()._ = Mock(side_effect=read)
+    outcomes = read_files(nodes, ["/etc/hosts", "/etc/hostname"], concurrency=3)
+    assert [(o.item[0].id, o.item[1]) for o in outcomes] == [
+        (node.id, path) for node in nodes for path in ["/etc/hosts", "/etc/hostname"]
+    ]
+    assert [o.result for o in outcomes[:4]] == [
+        "0:/etc/hosts",
+        "0:/etc/hostname",
+        "10:/etc/hosts",
+        "10:/etc/hostname",
+    ]
+    assert all(isinstance(o.exception, JelasticObjectException) for o in outcomes[4:])
+    assert jelapic()._.call_count == 4
+
+
+@respx.mock
+def test_read_files_cached(monkeypatch):
+    """
+    With a TTL for Environment.File.Read, contents are cached per envName, nodeid and path
+    """
+    route = respx.post(url__startswith=jelapi.api_url).mock(
+        return_value=Response(status_code=codes.OK, json={"result": 0, "body": "x"})
+    )
+    monkeypatch.setattr(jelapi, "_api_connector", None)
+    monkeypatch.setattr(jelapi, "response_cache_ttls", {"Environment.File.Read": 60})
+    nodes = select_nodes(get_envs_with_two_nodes([JelasticEnvironment.Status.RUNNING]))
+    for _ in range(3):
+        outcomes = read_files(nodes, ["/etc/nginx/nginx.conf"])
+        assert [o.result for o in outcomes] == ["x", "x"]
+    assert route.call_count == 2
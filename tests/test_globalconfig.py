@@ -1,5 +1,5 @@
 import jelapi
-from jelapi.connector import JelasticAPIConnector
+from jelapi.connector import AsyncJelasticAPIConnector, JelasticAPIConnector
 
 
 def test_jelapi_api_connector_is_instance():
@@ -18,3 +18,26 @@ def test_jelapi_api_connector_sets_api_url():
 def test_jelapi_api_connector_got_token():
     jelapi.api_token = "new-secret"
     assert jelapi.api_connector().apidata["session"] == "new-secret"
+
+
+def test_jelapi_async_api_connector_is_instance():
+    assert isinstance(jelapi.async_api_connector(), AsyncJelasticAPIConnector)
+
+
+def test_jelapi_async_api_connector_follows_token():
+    jelapi.api_token = "async-secret"
+    assert jelapi.async_api_connector().apidata["session"] == "async-secret"
+    assert jelapi.async_api_connector() is jelapi.async_api_connector()
+
+
+def test_jelapi_api_connector_survives_token_rotation():
+    jelapi.api_url = "https://api.example.org/2.0/"
+    jelapi.api_token = "secret"
+    japic = jelapi.api_connector()
+    jelapi.api_token = "rotated-secret"
+    assert jelapi.api_connector() is japic
+    assert japic.apidata["session"] == "rotated-secret"
+
+    # Another apiurl gets another connector
+    jelapi.api_url = "https://api.example.org/3.0/"
+    assert jelapi.api_connector() is not japic
@@ -0,0 +1,165 @@
+from unittest.mock import Mock
+
+from jelapi import api_connector as jelapic
+from jelapi.classes import JelasticEnvironment, JelasticNode
+from jelapi.index import FleetIndex
+
+from .utils import get_standard_env, get_standard_node, get_standard_node_groups
+
+
+def get_info(envName, node_id, intIP, extdomains=None, envGroups=None, image="nginx"):
+    return {
+        "env": {
+            **get_standard_env(extdomains=extdomains),
+            "envName": envName,
+            "domain": f"{envName}.example.com",
+        },
+        "envGroups": envGroups or [],
+        "nodeGroups": get_standard_node_groups(),
+        "nodes": [
+            {
+                **get_standard_node(id=node_id),
+                "intIP": intIP,
+                "extIPs": [f"203.0.113.{node_id}"],
+                "customitem": {"dockerName": image},
+            }
+        ],
+    }
+
+
+def get_index():
+    return FleetIndex(
+        JelasticEnvironment._dict_from_infos(
+            [
+                get_info("one", 1, "192.0.2.1", ["www.one.org"], ["prod"]),
+                get_info("two", 2, "192.0.2.2", envGroups=["prod", "web"]),
+            ]
+        )
+    )
+
+
+def test_FleetIndex_lookups():
+    """
+    Nodes and environments are found by their keys
+    """
+    index = get_index()
+    one, two = index.envs["one"], index.envs["two"]
+    node = one.nodeGroups["cp"].nodes[0]
+    assert index.node(1) is node
+    assert index.node(3) is None
+    assert index.node_by_ip("192.0.2.1") is node
+    assert index.node_by_ip("203.0.113.1") is node
+    assert index.environment_of_node(2) is two
+    assert index.environment_of_node(3) is None
+    assert index.environment_by_domain("one.example.com") is one
+    assert index.environment_by_domain("www.one.org") is one
+    assert index.environment_by_domain("www.two.org") is None
+    assert sorted(e.envName for e in index.environments_in_group("prod")) == [
+        "one",
+        "two",
+    ]
+    assert index.environments_in_group("web") == [two]
+    assert len(index.nodes_by_type(JelasticNode.NodeType.DOCKER)) == 2
+    assert len(index.nodes_by_type("docker")) == 2
+    assert len(index.nodes_by_docker_image("nginx")) == 2
+    assert index.nodes_by_docker_image("redis") == []
+
+
+def test_FleetIndex_refresh_updates_the_changed_entries():
+    """
+    refresh() updates the environments in place, and the indexes
+    """
+    index = get_index()
+    one = index.envs["one"]
+    jelapic()._ = Mock(
+        return_value={
+            "result": 0,
+            "infos": [
+                get_info("one", 1, "192.0.2.10", ["www.one.com"], image="redis"),
+                get_info("three", 3, "192.0.2.3"),
+            ],
+        }
+    )
+    index.refresh()
+    jelapic()._.assert_called_once_with("Environment.Control.GetEnvs")
+    assert index.envs["one"] is one
+    assert index.node_by_ip("192.0.2.1") is None
+    assert index.node_by_ip("192.0.2.10") is one.nodeGroups["cp"].nodes[0]
+    assert index.environment_by_domain("www.one.org") is None
+    assert index.environment_by_domain("www.one.com") is one
+    assert index.environments_in_group("prod") == []
+    assert [n.envName for n in index.nodes_by_docker_image("nginx")] == ["three"]
+    assert index.node(2) is None
+    assert index.environment_of_node(3) is index.envs["three"]
+
+    # Local changes are indexed on reindex()
+    one.extdomains.append("www.one.net")
+    index.reindex("one")
+    assert index.environment_by_domain("www.one.net") is one
+    del index.envs["one"]
+    index.reindex()
+    assert index.environment_by_domain("www.one.com") is None
+    assert index.node(1) is None
+
+
+def test_FleetIndex_refresh_only_reindexes_the_changed_environments(monkeypatch):
+    """
+    refresh() updates the environments under the lock, and only reindexes the changed ones
+    """
+    index = get_index()
+    infos = [
+        get_info("one", 1, "192.0.2.1", ["www.one.org"], ["prod"]),
+        get_info("two", 2, "192.0.2.20", envGroups=["prod", "web"]),
+    ]
+    jelapic()._ = Mock(return_value={"result": 0, "infos": infos})
+
+    locked = []
+    refresh_dict_from_infos = JelasticEnvironment._refresh_dict_from_infos
+
+    def refresh_dict_from_infos_locked(*args):
+        locked.append(index._lock.locked())
+        return refresh_dict_from_infos(*args)
+
+    monkeypatch.setattr(
+        JelasticEnvironment,
+        "_refresh_dict_from_infos",
+        refresh_dict_from_infos_locked,
+    )
+    indexed = []
+    entries_of = FleetIndex._entries_of
+    monkeypatch.setattr(
+        FleetIndex,
+        "_entries_of",
+        staticmethod(lambda env: indexed.append(env.envName) or entries_of(env)),
+    )
+
+    index.refresh()
+    assert locked == [True]
+    assert indexed == ["two"]
+    assert index.node_by_ip("192.0.2.20") is index.envs["two"].nodeGroups["cp"].nodes[0]
+
+    # Nothing changed, nothing reindexed
+    index.refresh()
+    assert indexed == ["two"]
+
+
+def test_FleetIndex_of_projections():
+    """
+    Projected environments only get indexed on their attributes
+    """
+    jelapic()._ = Mock(
+        return_value={
+            "result": 0,
+            "infos": [get_info("one", 1, "192.0.2.1", envGroups=["prod"])],
+        }
+    )
+    JelasticEnvironment.dict.cache_clear()
+    index = FleetIndex(JelasticEnvironment.dict(fields=["nodes.intIP"]))
+    assert index.node_by_ip("192.0.2.1") is index.node(1)
+    assert index.environment_by_domain("one.example.com") is index.envs["one"]
+    assert index.environments_in_group("prod") == []
+
+    # Refreshed, they're whole
+    index.refresh()
+    assert index.environments_in_group("prod") == [index.envs["one"]]
+    assert index.node_by_ip("203.0.113.1") is index.node(1)
@@ -1,14 +1,23 @@
+import asyncio
+import threading
 import warnings
 from unittest.mock import Mock
 
 import pytest
 
+import jelapi
 from jelapi import api_connector as jelapic
+from jelapi import async_api_connector as jelapic_async
 from jelapi.classes import JelasticEnvironment, JelasticNode, JelasticNodeGroup
 from jelapi.exceptions import JelasticObjectException
 from jelapi.factories import JelasticEnvironmentFactory
 
-from .utils import get_standard_env, get_standard_node, get_standard_node_groups
+from .utils import (
+    AsyncMock,
+    get_standard_env,
+    get_standard_node,
+    get_standard_node_groups,
+)
 
 
 def test_JelasticEnvironment_simple():
@@ -744,3 +753,480 @@ def test_JelEnv_can_clone():
     j.clone("abcdefghijklmnopqrstuvwxyz0123456")
     # Called twice actually
     jelapic()._.assert_called()
+
+
+def test_JelasticEnvironment_async_getter_by_name():
+    """
+    JelasticEnvironment.aget() works, and does one awaited call to api
+    """
+    jelapic_async()._ = AsyncMock(
+        return_value={"env": get_standard_env(), "envGroups": ["A"]},
+    )
+    jelenv = asyncio.run(JelasticEnvironment.aget("envName"))
+    assert isinstance(jelenv, JelasticEnvironment)
+    assert jelenv.envGroups == ["A"]
+    jelapic_async()._.assert_called_once_with(
+        "Environment.Control.GetEnvInfo", envName="envName"
+    )
+
+
+def test_JelasticEnvironment_async_dict_all():
+    """
+    JelasticEnvironment.adict() works, and does one awaited call to api
+    """
+    jelapic_async()._ = AsyncMock(
+        return_value={
+            "infos": [
+                {
+                    "env": get_standard_env(),
+                    "nodeGroups": get_standard_node_groups(),
+                    "nodes": [get_standard_node()],
+                    "envGroups": [],
+                },
+            ]
+        },
+    )
+    jelenvs = asyncio.run(JelasticEnvironment.adict())
+    assert list(jelenvs) == ["envName"]
+    assert len(jelenvs["envName"].nodeGroups["cp"].nodes) == 1
+    jelapic_async()._.assert_called_once()
+
+
+def test_JelasticEnvironment_async_refresh_and_save():
+    """
+    JelasticEnvironment.asave() saves, then refreshes from API through the same connector
+    """
+    jelenv = JelasticEnvironment()
+    jelenv.update_from_env_dict(get_standard_env())
+    jelenv.update_env_groups_from_info(["A", "B"])
+
+    jelapic()._ = Mock(
+        return_value={"env": get_standard_env(), "envGroups": ["A", "B", "C"]},
+    )
+    jelapic_async()._ = AsyncMock()
+
+    jelenv.envGroups.append("C")
+    asyncio.run(jelenv.asave())
+    assert [c.args[0] for c in jelapic()._.call_args_list] == [
+        "Environment.Control.SetEnvGroup",
+        "Environment.Control.GetEnvInfo",
+    ]
+    jelapic_async()._.assert_not_called()
+    assert not jelenv.differs_from_api()
+
+    # A second save should not call the API
+    jelapic()._.reset_mock()
+    jelapic_async()._.reset_mock()
+    asyncio.run(jelenv.asave())
+    jelapic()._.assert_not_called()
+    jelapic_async()._.assert_not_called()
+
+
+def test_JelasticEnvironment_lazy_dict():
+    """
+    With lazy=True, nodeGroups and nodes are only built on first access
+    """
+    info = {
+        "env": get_standard_env(),
+        "envGroups": ["group"],
+        "nodeGroups": get_standard_node_groups(),
+        "nodes": [get_standard_node()],
+    }
+    jelapic()._ = Mock(return_value={"infos": [info]})
+    JelasticEnvironment.dict.cache_clear()
+    jelenv = JelasticEnvironment.dict(lazy=True)["envName"]
+    assert jelenv.envName == "envName"
+    assert jelenv.envGroups == ["group"]
+    assert jelenv._lazy_info is info
+
+    cp_node_group = jelenv.nodeGroups["cp"]
+    assert jelenv._lazy_info is None
+    assert cp_node_group._parent is jelenv
+    assert cp_node_group.nodes[0].id == 987
+    assert jelenv.nodeGroups["cp"] is cp_node_group
+    assert not jelenv.differs_from_api()
+
+    # Not the same cache entry as the eager one
+    assert JelasticEnvironment.dict()["envName"]._lazy_info is None
+
+
+def test_JelasticEnvironment_lazy_stranger_nodes_raise_on_access():
+    """
+    Lazy environments only raise for stranger nodes when their nodeGroups are accessed
+    """
+    jelenv = JelasticEnvironment()
+    jelenv.update_from_info(
+        {"env": get_standard_env(), "nodeGroups": [], "nodes": [get_standard_node()]},
+        lazy=True,
+    )
+    assert jelenv.envName == "envName"
+    with pytest.raises(JelasticObjectException):
+        jelenv.nodeGroups
+    with pytest.raises(AttributeError):
+        jelenv.not_an_attribute
+
+
+def test_JelasticEnvironment_lazy_build_is_thread_safe(monkeypatch):
+    """
+    While lazy nodeGroups are built, other threads wait for them to be complete
+    """
+    jelenv = JelasticEnvironment()
+    jelenv.update_from_info(
+        {
+            "env": get_standard_env(),
+            "nodeGroups": get_standard_node_groups(),
+            "nodes": [get_standard_node()],
+        },
+        lazy=True,
+    )
+    seen = []
+    reader = threading.Thread(
+        target=lambda: seen.append(
+            {name: list(ng.nodes) for name, ng in jelenv.nodeGroups.items()}
+        )
+    )
+    update_nodes_from_info = JelasticEnvironment.update_nodes_from_info
+
+    def update_nodes_from_info_meanwhile(self, nodes):
+        # The nodeGroups are there, without their nodes yet
+        reader.start()
+        reader.join(0.05)
+        assert reader.is_alive()
+        update_nodes_from_info(self, nodes)
+
+    monkeypatch.setattr(
+        JelasticEnvironment, "update_nodes_from_info", update_nodes_from_info_meanwhile
+    )
+    cp_node_group = jelenv.nodeGroups["cp"]
+    reader.join()
+    assert seen == [{name: ng.nodes for name, ng in jelenv.nodeGroups.items()}]
+    assert seen[0]["cp"] == cp_node_group.nodes
+    assert cp_node_group._parent is jelenv
+    assert cp_node_group.nodes[0].id == 987
+
+
+def test_JelasticEnvironment_lazy_refresh_keeps_it_lazy():
+    """
+    Refreshing a lazy environment keeps the latest info for when nodeGroups get accessed
+    """
+    jelenv = JelasticEnvironment()
+    jelenv.update_from_info(
+        {
+            "env": get_standard_env(),
+            "nodeGroups": get_standard_node_groups(),
+            "nodes": [get_standard_node()],
+        },
+        lazy=True,
+    )
+    info = {
+        "env": {**get_standard_env(), "displayName": "renamed"},
+        "nodeGroups": get_standard_node_groups(),
+        "nodes": [get_standard_node(fixed_cloudlets=3)],
+    }
+    assert jelenv.refresh_from_info(info)
+    assert not jelenv.refresh_from_info(info)
+    assert jelenv._lazy_info is info
+    assert jelenv.displayName == "renamed"
+    assert jelenv.nodeGroups["cp"].nodes[0].fixedCloudlets == 3
+
+    # Updating eagerly builds them
+    jelenv.update_from_info(info, lazy=True)
+    jelenv.update_from_info(info)
+    assert jelenv._lazy_info is None
+    assert jelenv.nodeGroups["cp"].nodes[0].fixedCloudlets == 3
+
+
+def test_JelasticEnvironment_dict_fields_projection():
+    """
+    JelasticEnvironment.dict(fields=...) only sets the projected attributes, and doesn't save
+    """
+    jelapic()._ = Mock(
+        return_value={
+            "result": 0,
+            "infos": [
+                {
+                    "env": get_standard_env(),
+                    "envGroups": ["group"],
+                    "nodeGroups": get_standard_node_groups(),
+                    "nodes": [get_standard_node()],
+                }
+            ],
+        }
+    )
+    JelasticEnvironment.dict.cache_clear()
+    envs = JelasticEnvironment.dict(fields=["status", "envGroups", "nodes.intIP"])
+    jelenv = envs["envName"]
+    assert jelenv.envName == "envName"
+    assert jelenv.status == JelasticEnvironment.Status.RUNNING
+    assert jelenv.envGroups == ["group"]
+    node = jelenv.nodeGroups["cp"].nodes[0]
+    assert (node.id, node.intIP, node.envName) == (987, "192.0.2.1", "envName")
+    assert not hasattr(jelenv, "_env")
+    assert not hasattr(node, "_node")
+    for obj, attribute in [(jelenv, "displayName"), (node, "fixedCloudlets")]:
+        with pytest.raises(AttributeError):
+            getattr(obj, attribute)
+    assert not jelenv.differs_from_api()
+    with pytest.raises(JelasticObjectException):
+        jelenv.save()
+    with pytest.raises(JelasticObjectException):
+        node.save()
+
+    # Cached per projection
+    assert (
+        JelasticEnvironment.dict(fields=["status", "envGroups", "nodes.intIP"]) is envs
+    )
+    assert JelasticEnvironment.dict() is not envs
+    # Without nodeGroups or nodes fields, they aren't built
+    jelenv = JelasticEnvironment.dict(fields=["status"])["envName"]
+    assert jelenv.domain == "domain"
+    assert str(jelenv) == "JelasticEnvironment 'envName' <https://domain>"
+    with pytest.raises(AttributeError):
+        jelenv.nodeGroups
+    assert list(JelasticEnvironment.dict(fields=["nodeGroups"])["envName"].nodeGroups)
+    for fields in [["notAnAttribute"], ["nodes.notAnAttribute"], ["envGroups.name"]]:
+        with pytest.raises(JelasticObjectException):
+            JelasticEnvironment.dict(fields=fields)
+
+
+def test_JelasticEnvironment_dict_fields_of_any_iterable():
+    """
+    Any iterable of fields projects all environments, and hits the cache when repeated
+    """
+    jelapic()._ = Mock(
+        return_value={
+            "result": 0,
+            "infos": [
+                {"env": {**get_standard_env(), "envName": name}}
+                for name in ["e0", "e1"]
+            ],
+        }
+    )
+    JelasticEnvironment.dict.cache_clear()
+    envs = JelasticEnvironment.dict(fields=(f for f in ["status", "displayName"]))
+    assert [env._projection for env in envs.values()] == [
+        frozenset({"envName", "domain", "status", "displayName"})
+    ] * 2
+    assert JelasticEnvironment.dict(fields=iter(["status", "displayName"])) is envs
+    assert JelasticEnvironment.dict(fields=["status", "displayName"]) is envs
+    assert jelapic()._.call_count == 1
+    by_set = JelasticEnvironment.dict(fields={"displayName", "status"})
+    assert by_set["e1"]._projection == envs["e1"]._projection
+    assert JelasticEnvironment.dict(fields={"status", "displayName"}) is by_set
+
+    jelapic()._iter = Mock(return_value=iter(jelapic()._.return_value["infos"]))
+    try:
+        envs = list(JelasticEnvironment.iter(fields=iter(["status"])))
+    finally:
+        del jelapic()._iter
+    assert [env._projection for env in envs] == [
+        frozenset({"envName", "domain", "status"})
+    ] * 2
+
+
+def test_JelasticEnvironment_refresh_dict_of_projections():
+    """
+    Refreshing projected environments sets them whole: they can be saved then
+    """
+    info = {
+        "env": get_standard_env(),
+        "envGroups": ["group"],
+        "nodeGroups": get_standard_node_groups(),
+        "nodes": [get_standard_node()],
+    }
+    jelapic()._ = Mock(return_value={"result": 0, "infos": [info]})
+    JelasticEnvironment.dict.cache_clear()
+    envs = JelasticEnvironment.dict(fields=["envName", "status"])
+    jelenv = envs["envName"]
+
+    assert JelasticEnvironment.refresh_dict(envs) is envs
+    assert envs["envName"] is jelenv
+    assert jelenv.displayName == get_standard_env()["displayName"]
+    assert jelenv.envGroups == ["group"]
+    assert jelenv.nodeGroups["cp"].nodes[0].id == 987
+    jelenv.save()
+
+
+def test_JelasticEnvironment_get_fields_projection():
+    """
+    JelasticEnvironment.get(fields=...) projects too, until refreshed from API
+    """
+    jelapic()._ = Mock(
+        return_value={
+            "env": get_standard_env(),
+            "nodeGroups": get_standard_node_groups(),
+            "nodes": [get_standard_node()],
+        }
+    )
+    jelenv = JelasticEnvironment.get("envName", fields=["nodeGroups.displayName"])
+    assert jelenv.nodeGroups["cp"].displayName == ""
+    assert jelenv.nodeGroups["cp"].nodes == []
+    with pytest.raises(JelasticObjectException):
+        jelenv.save()
+
+    jelenv.refresh_from_api()
+    assert jelenv.displayName == "initial displayName"
+    jelenv.save()
+
+
+def test_JelasticEnvironment_iter():
+    """
+    JelasticEnvironment.iter() yields the environments as they are streamed
+    """
+    infos = [
+        {"env": {**get_standard_env(), "envName": name}, "nodes": []}
+        for name in ["first", "second"]
+    ]
+    jelapic()._iter = Mock(return_value=iter(infos))
+    envs = JelasticEnvironment.iter()
+    first = next(envs)
+    assert first.envName == "first"
+    assert first.is_from_api
+    assert [env.envName for env in envs] == ["second"]
+    jelapic()._iter.assert_called_once_with("Environment.Control.GetEnvs", "infos")
+    del jelapic()._iter
+
+
+def test_JelasticEnvironment_refresh_dict_without_api_payload():
+    """
+    Without the API payloads, refresh_dict() updates everything, but keeps the objects
+    """
+    info = {
+        "env": get_standard_env(),
+        "nodeGroups": get_standard_node_groups(),
+        "nodes": [get_standard_node()],
+    }
+    jelapic()._ = Mock(return_value={"infos": [info]})
+    JelasticEnvironment.dict.cache_clear()
+    jelapi.retain_api_payload = False
+    try:
+        jelenvs = JelasticEnvironment.dict()
+        jelenv = jelenvs["envName"]
+        node = jelenv.nodeGroups["cp"].nodes[0]
+        assert not hasattr(jelenv, "_env")
+        assert not hasattr(jelenv.nodeGroups["cp"], "_node_group")
+        assert not hasattr(node, "_node")
+
+        info["nodes"] = [get_standard_node(fixed_cloudlets=3)]
+        JelasticEnvironment.refresh_dict(jelenvs)
+    finally:
+        jelapi.retain_api_payload = True
+    assert jelenvs["envName"] is jelenv
+    assert jelenv.nodeGroups["cp"].nodes[0] is node
+    assert node.fixedCloudlets == 3
+    assert not jelenv.differs_from_api()
+
+
+def test_JelasticEnvironment_refresh_dict_keeps_unchanged_objects():
+    """
+    JelasticEnvironment.refresh_dict() only updates what changed, and keeps the objects
+    """
+
+    def get_infos(fixed_cloudlets=1, with_second_node=False, with_other_env=True):
+        nodes = [get_standard_node(fixed_cloudlets=fixed_cloudlets)]
+        if with_second_node:
+            nodes.append(get_standard_node(id=988))
+        infos = [
+            {
+                "env": get_standard_env(),
+                "nodeGroups": get_standard_node_groups(),
+                "nodes": nodes,
+                "envGroups": [],
+            },
+        ]
+        if with_other_env:
+            infos.append({"env": {**get_standard_env(), "envName": "other"}})
+        return {"infos": infos}
+
+    jelapic()._ = Mock(return_value=get_infos())
+    JelasticEnvironment.dict.cache_clear()
+    jelenvs = JelasticEnvironment.dict()
+    jelenv = jelenvs["envName"]
+    cp_node_group = jelenv.nodeGroups["cp"]
+    node = cp_node_group.nodes[0]
+
+    # Nothing changed: same objects, nothing re-instantiated
+    assert JelasticEnvironment.refresh_dict(jelenvs) is jelenvs
+    assert jelenvs["envName"] is jelenv
+    assert jelenv.nodeGroups["cp"] is cp_node_group
+    assert cp_node_group.nodes == [node]
+    assert not jelenv.differs_from_api()
+
+    # A node changed, one got added, an environment disappeared
+    jelapic()._ = Mock(
+        return_value=get_infos(
+            fixed_cloudlets=4, with_second_node=True, with_other_env=False
+        )
+    )
+    JelasticEnvironment.refresh_dict(jelenvs)
+    assert list(jelenvs) == ["envName"]
+    assert jelenvs["envName"] is jelenv
+    assert cp_node_group.nodes[0] is node
+    assert node.fixedCloudlets == 4
+    assert [n.id for n in cp_node_group.nodes] == [987, 988]
+    assert cp_node_group.nodes[1].nodeGroup is cp_node_group
+    assert not jelenv.differs_from_api()
+
+    # The node got removed, the nodeGroup is rebuilt
+    jelapic()._ = Mock(return_value=get_infos(fixed_cloudlets=4))
+    JelasticEnvironment.refresh_dict(jelenvs)
+    assert cp_node_group.nodes == [node]
+    assert "other" in jelenvs
+
+
+def test_JelasticEnvironment_refresh_from_info_raises_for_stranger_nodes():
+    """
+    Nodes outside of the nodeGroups are refused, as in update_nodes_from_info()
+    """
+    jelenv = JelasticEnvironment()
+    jelenv.update_from_info({"env": get_standard_env()})
+    with pytest.raises(JelasticObjectException):
+        jelenv.refresh_from_info(
+            {"env": get_standard_env(), "nodes": [get_standard_node()]}
+        )
+
+
+def test_JelasticEnvironment_clean_differs_from_api_does_not_walk_the_tree():
+    """
+    Once checked clean, differs_from_api() doesn't go through the nodeGroups and nodes
+    until something changes in them
+    """
+    jelenv = JelasticEnvironmentFactory()
+    assert not jelenv.differs_from_api()
+
+    node_group = jelenv.nodeGroups["cp"]
+    node = node_group.nodes[0]
+    node_group.differs_from_api = Mock(return_value=False)
+    assert not jelenv.differs_from_api()
+    node_group.differs_from_api.assert_not_called()
+    del node_group.differs_from_api
+
+    # Changing a node marks its nodeGroup and environment dirty
+    node.fixedCloudlets = 12
+    assert node._dirty and node_group._dirty and jelenv._dirty
+    assert jelenv.differs_from_api()
+    node.fixedCloudlets = node._from_api["fixedCloudlets"]
+    assert not jelenv.differs_from_api()
+    assert not node._dirty
+
+
+def test_JelasticEnvironment_list_mutations_mark_dirty():
+    """
+    In-place changes to tracked lists and dicts are seen by differs_from_api()
+    """
+    jelenv = JelasticEnvironmentFactory()
+    jelenv.update_env_groups_from_info(["A"])
+    assert not jelenv.differs_from_api()
+
+    jelenv.extdomains.append("example.com")
+    assert jelenv.differs_from_api()
+    jelenv.extdomains.remove("example.com")
+    assert not jelenv.differs_from_api()
+
+    jelenv.envGroups += ["B"]
+    assert jelenv.differs_from_api()
+    del jelenv.envGroups[1]
+    assert not jelenv.differs_from_api()
+
+    del jelenv.nodeGroups["storage"]
+    assert jelenv.differs_from_api()
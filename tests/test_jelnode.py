@@ -1,13 +1,18 @@
+import asyncio
+import base64
+import io
 import warnings
 from copy import deepcopy
 from unittest.mock import Mock
 
 import pytest
 
+import jelapi
 from jelapi import api_connector as jelapic
 from jelapi.classes import JelasticEnvironment, JelasticNode
 from jelapi.exceptions import JelasticObjectException
 from jelapi.factories import JelasticEnvironmentFactory, JelasticNodeFactory
+from jelapi.jsonbackend import loads
 
 from .utils import get_standard_node
 
@@ -207,6 +212,10 @@ def test_JelasticNode_envVars_works_but_takes_from_node_group():
 
     assert "TEST" in node.envVars
     assert node.envVars["TEST"] == "example.com"
+    assert asyncio.run(node.afetch_env_vars())["TEST"] == "example.com"
+
+    with pytest.raises(JelasticObjectException):
+        asyncio.run(JelasticNodeFactory().afetch_env_vars())
 
 
 def test_JelasticNode_envVars_raises_if_env_is_not_running():
@@ -264,6 +273,42 @@ def test_JelasticNode_links_only_from_inwards():
     assert node.links[0]["sourceNodeId"] == 0
 
 
+def test_JelasticNode_compact_without_api_payload():
+    """
+    Without retaining the API payload, nodes still expose their attributes and links
+    """
+    ndict = get_standard_node()
+    ndict["customitem"] = {"dockerLinks": [{"type": "IN", "sourceNodeId": 0}]}
+    node = JelasticNode()
+    node.update_from_env_dict(ndict)
+    assert node._node is ndict
+
+    # A previously retained payload gets forgotten
+    jelapi.retain_api_payload = False
+    try:
+        node.update_from_env_dict(ndict)
+    finally:
+        jelapi.retain_api_payload = True
+    assert not hasattr(node, "_node")
+    assert node.id == 987
+    assert node.links == [{"type": "IN", "sourceNodeId": 0}]
+    assert not node.differs_from_api()
+
+
+def test_JelasticNode_attributes_are_slotted():
+    """
+    The JelasticAttributes are stored in __slots__, not in the instance's __dict__
+    """
+    node = JelasticNodeFactory()
+    assert "_fixedCloudlets" in JelasticNode.__slots__
+    assert "_fixedCloudlets" not in node.__dict__
+    assert "_node" not in node.__dict__
+    assert "_from_api" not in node.__dict__
+    cp = deepcopy(node)
+    assert cp.fixedCloudlets == node.fixedCloudlets
+    assert cp.id == node.id
+
+
 def test_JelasticNode_exec_commands():
     """
     We can launch multiple commands in sequence in nodes
@@ -358,6 +403,115 @@ def test_JelasticNode_read_file():
             assert body == "Text content"
 
 
+def test_JelasticNode_iter_file():
+    """
+    Files are read by chunks, each with its own command
+    """
+    node = JelasticNodeFactory()
+    node.attach_to_node_group(node_group)
+    node.nodeGroup._parent.status = JelasticEnvironment.Status.RUNNING
+    content = b"0123456789"
+
+    def exec_cmd(function, envName, nodeid, commandList):
+        command = loads(commandList)[0]["command"]
+        if "stat -L -c %s" in command:
+            out = str(len(content))
+        else:
+            start = int(command.split("skip=")[1].split()[0]) * 4
+            out = base64.b64encode(content[start:][:4]).decode()
+        return {"responses": [{"out": out, "errOut": "", "result": 0}]}
+
+    jelapic()._ = Mock(side_effect=exec_cmd)
+    with pytest.raises(TypeError):
+        node.iter_file("")
+    with pytest.raises(ValueError):
+        node.iter_file("/var/log/big.log", chunk_size=0)
+    assert list(node.iter_file("/var/log/big.log", chunk_size=4)) == [
+        b"0123",
+        b"4567",
+        b"89",
+    ]
+    assert jelapic()._.call_count == 4
+    command = loads(jelapic()._.call_args[1]["commandList"])[0]["command"]
+    assert command.startswith("set -o pipefail;")
+    assert "iflag=fullblock" in command
+
+    content = b"01234567"
+    jelapic()._.reset_mock()
+    assert b"".join(node.iter_file("/tmp/a b", chunk_size=4)) == content
+    assert jelapic()._.call_count == 3
+    assert "'/tmp/a b'" in loads(jelapic()._.call_args[1]["commandList"])[0]["command"]
+
+    content = b""
+    assert list(node.iter_file("/tmp/empty", chunk_size=4)) == []
+
+    jelapic()._ = Mock(
+        return_value={"responses": [{"out": "", "errOut": "cannot read", "result": 1}]}
+    )
+    with pytest.raises(JelasticObjectException):
+        list(node.iter_file("/nope"))
+
+
+def test_JelasticNode_iter_file_raises_on_truncated_reads():
+    """
+    A file read short of its size, or dd failing, raises instead of ending early
+    """
+    node = JelasticNodeFactory()
+    node.attach_to_node_group(node_group)
+    node.nodeGroup._parent.status = JelasticEnvironment.Status.RUNNING
+
+    def exec_cmd(dd_result, dd_out):
+        def exec_cmd(function, envName, nodeid, commandList):
+            if "stat -L -c %s" in loads(commandList)[0]["command"]:
+                response = {"out": "10", "errOut": "", "result": 0}
+            else:
+                response = {"out": dd_out, "errOut": "", "result": dd_result}
+            return {"responses": [response]}
+
+        return exec_cmd
+
+    # Truncated meanwhile
+    jelapic()._ = Mock(side_effect=exec_cmd(0, base64.b64encode(b"01").decode()))
+    with pytest.raises(JelasticObjectException):
+        list(node.iter_file("/var/log/big.log", chunk_size=4))
+    # I/O error
+    jelapic()._ = Mock(side_effect=exec_cmd(1, ""))
+    with pytest.raises(JelasticObjectException):
+        list(node.iter_file("/var/log/big.log", chunk_size=4))
+
+    node.nodeGroup._parent.status = JelasticEnvironment.Status.STOPPED
+    with pytest.raises(JelasticObjectException):
+        node.iter_file("/tmp/test")
+
+
+def test_JelasticNode_write_file():
+    """
+    Files are written by chunks, the first one replacing the file
+    """
+    node = JelasticNodeFactory()
+    node.attach_to_node_group(node_group)
+    node.nodeGroup._parent.status = JelasticEnvironment.Status.RUNNING
+
+    jelapic()._ = Mock(return_value={"result": 0})
+    with pytest.raises(TypeError):
+        node.write_file("", "content")
+    node.write_file("/etc/app.conf", io.StringIO("0123456789"), chunk_size=4)
+    assert [
+        (c[1]["body"], c[1]["isAppendMode"], c[1]["nodeid"])
+        for c in jelapic()._.call_args_list
+    ] == [("0123", False, node.id), ("4567", True, node.id), ("89", True, node.id)]
+    assert all(c[0] == ("Environment.File.Write",) for c in jelapic()._.call_args_list)
+
+    jelapic()._.reset_mock()
+    node.write_file("/etc/empty", "")
+    jelapic()._.assert_called_once()
+    assert jelapic()._.call_args[1]["body"] == ""
+
+    node.nodeGroup._parent.status = JelasticEnvironment.Status.STOPPED
+    with pytest.raises(JelasticObjectException):
+        node.write_file("/etc/app.conf", "content")
+
+
 def test_JelasticNode_extIPs():
     """
     Setting extIPs only works with IPv4s
@@ -442,3 +596,16 @@ def test_JelasticNode_swapIps():
     )
     # works fine if IPs exist and response is as expected
     nodeA.swap_ip_with(nodeB)
+
+
+def test_JelasticNode_async_save():
+    """
+    Nodes can be saved from a coroutine; the API call runs in an executor
+    """
+    jelapic()._ = Mock()
+    node = JelasticNodeFactory()
+    node.attach_to_node_group(node_group)
+    node.fixedCloudlets = 8
+    asyncio.run(node.asave())
+    jelapic()._.assert_called_once()
+    assert not node.differs_from_api()
@@ -1,3 +1,4 @@
+import asyncio
 import warnings
 from copy import deepcopy
 from unittest.mock import Mock
@@ -5,11 +6,19 @@ from unittest.mock import Mock
 import pytest
 
 from jelapi import api_connector as jelapic
+from jelapi import async_api_connector as jelapic_async
 from jelapi.classes import JelasticEnvironment, JelasticMountPoint, JelasticNodeGroup
-from jelapi.exceptions import JelasticObjectException
+from jelapi.exceptions import JelasticAPIException, JelasticObjectException
 from jelapi.factories import JelasticEnvironmentFactory, JelasticNodeGroupFactory
+from jelapi.jsonbackend import dumps
 
-from .utils import get_standard_mount_point, get_standard_node, get_standard_node_group
+from .utils import (
+    AsyncMock,
+    get_standard_env,
+    get_standard_mount_point,
+    get_standard_node,
+    get_standard_node_group,
+)
 
 jelenv = JelasticEnvironmentFactory()
 
@@ -111,6 +120,24 @@ def test_JelasticNodeGroup_envVars_refreshes_from_API():
     assert not node_group.differs_from_api()
 
 
+def test_JelasticNodeGroup_afetch_env_vars():
+    """
+    envVars can be fetched asynchronously, sharing the lazy-loading
+    """
+    node_group = JelasticNodeGroupFactory()
+    node_group.attach_to_environment(JelasticEnvironmentFactory())
+
+    jelapic()._ = Mock()
+    jelapic_async()._ = AsyncMock(return_value={"object": {"VAR": "value"}})
+    assert asyncio.run(node_group.afetch_env_vars()) == {"VAR": "value"}
+    assert asyncio.run(node_group.afetch_env_vars()) == {"VAR": "value"}
+    jelapic_async()._.assert_called_once()
+    # Then available synchronously, without another call
+    assert node_group.envVars["VAR"] == "value"
+    jelapic()._.assert_not_called()
+    assert not node_group.differs_from_api()
+
+
 def test_JelasticNodeGroup_envVars_raises_if_set_without_fetch():
     """
     Saving a faked envVars without fetch will raise
@@ -464,6 +491,35 @@ def test_JelasticNodeGroup_links_non_empty():
     assert cpng.links["SQLDB"] == JelasticNodeGroup.NodeGroupType.SQL_DATABASE
 
 
+def test_JelasticNodeGroup_afetch_mount_points_and_container_volumes():
+    """
+    mountPoints and containerVolumes can be fetched asynchronously; the mount points
+    are excluded from the container volumes
+    """
+    jelenv = JelasticEnvironmentFactory()
+    ng = jelenv.nodeGroups["cp"]
+    mount_point = get_standard_mount_point(
+        source_node_id=jelenv.nodeGroups["storage"].nodes[0].id
+    )
+
+    jelapic()._ = Mock()
+    jelapic_async()._ = AsyncMock(
+        side_effect=[
+            {"object": ["/tmp/volume1", mount_point["path"]]},
+            {"array": [mount_point]},
+        ]
+    )
+    assert asyncio.run(ng.afetch_container_volumes()) == ["/tmp/volume1"]
+    assert [mp.path for mp in asyncio.run(ng.afetch_mount_points())] == [
+        mount_point["path"]
+    ]
+    assert jelapic_async()._.call_count == 2
+    assert ng.containerVolumes == ["/tmp/volume1"]
+    assert len(ng.mountPoints) == 1
+    jelapic()._.assert_not_called()
+    assert not ng.differs_from_api()
+
+
 def test_JelasticNodeGroup_containerVolumes():
     """
     Get container volumes
@@ -598,3 +654,139 @@ def test_JelasticNodeGroup_copy_from_api():
     assert cpng.is_from_api
     cpng2 = cpng.archive_from_api()
     assert not cpng2.is_from_api
+
+
+def test_JelasticNodeGroup_envVars_mutations_mark_dirty():
+    """
+    Changing the envVars in place makes the nodeGroup differ, even after a clean check
+    """
+    jelapic()._ = Mock(return_value={"object": {"VAR": "value"}})
+    jelenv = JelasticEnvironmentFactory()
+    node_group = jelenv.nodeGroups["cp"]
+    node_group._envVars_need_fetching = True
+    assert node_group.envVars == {"VAR": "value"}
+    assert not jelenv.differs_from_api()
+
+    node_group.envVars["VAR"] = "other value"
+    assert jelenv.differs_from_api()
+    node_group.envVars.update({"VAR": "value"})
+    assert not jelenv.differs_from_api()
+
+
+def get_node_group_with_two_nodes():
+    env = JelasticEnvironment()
+    env.update_from_info(
+        {
+            "env": get_standard_env(),
+            "nodeGroups": [{"name": "cp"}],
+            "nodes": [get_standard_node(id=1), get_standard_node(id=2)],
+        }
+    )
+    return env.nodeGroups["cp"]
+
+
+def test_JelasticNodeGroup_execute_commands():
+    """
+    Commands are executed on all nodes of the nodeGroup in one call
+    """
+    node_group = get_node_group_with_two_nodes()
+    with pytest.raises(TypeError):
+        node_group.execute_commands("ls")
+
+    jelapic()._ = Mock(
+        return_value={
+            "responses": [
+                {"nodeid": 2, "out": "two", "errOut": "", "result": 0},
+                {"nodeid": 1, "out": "one", "errOut": "", "result": 0},
+                {"nodeid": 3, "out": "stranger", "errOut": "", "result": 0},
+            ],
+        },
+    )
+    results = node_group.execute_commands(["hostname"])
+    jelapic()._.assert_called_once_with(
+        "Environment.Control.ExecCmdByGroup",
+        envName="envName",
+        nodeGroup="cp",
+        commandList=dumps([{"command": "hostname", "params": ""}]),
+    )
+    one, two = node_group.nodes
+    assert results == {
+        one: [{"out": "one", "errOut": "", "result": 0}],
+        two: [{"out": "two", "errOut": "", "result": 0}],
+    }
+
+
+def test_JelasticNodeGroup_execute_commands_falls_back_to_nodes():
+    """
+    If the group call isn't available, each node is called
+    """
+    node_group = get_node_group_with_two_nodes()
+
+    def api(function, **kwargs):
+        if function == "Environment.Control.ExecCmdByGroup":
+            raise JelasticAPIException("Not available", status_code=404)
+        return {
+            "responses": [{"out": str(kwargs["nodeid"]), "errOut": "", "result": 0}]
+        }
+
+    jelapic()._ = Mock(side_effect=api)
+    results = node_group.execute_commands(["hostname"], concurrency=2)
+    assert jelapic()._.call_count == 3
+    assert {node.id: r[0]["out"] for node, r in results.items()} == {1: "1", 2: "2"}
+
+    def failing_node_2(function, **kwargs):
+        if kwargs.get("nodeid") == 2:
+            raise JelasticObjectException("node 2")
+        return api(function, **kwargs)
+
+    jelapic()._ = Mock(side_effect=failing_node_2)
+    with pytest.raises(JelasticObjectException):
+        node_group.execute_commands(["hostname"])
+
+
+def test_JelasticNodeGroup_execute_commands_failures_are_not_retried_per_node():
+    """
+    Once the group call is there, its failures are raised, the commands not run again
+    """
+    node_group = get_node_group_with_two_nodes()
+    for exception in [
+        JelasticAPIException("Gateway timeout", status_code=504),
+        JelasticAPIException("Failed", response={"result": 1}),
+    ]:
+        jelapic()._ = Mock(side_effect=exception)
+        with pytest.raises(JelasticAPIException):
+            node_group.execute_commands(["hostname"])
+        jelapic()._.assert_called_once()
+
+
+def test_JelasticNodeGroup_iter_and_write_file():
+    """
+    Files are read from the master node, and written to all nodes, by chunks
+    """
+    node_group = get_node_group_with_two_nodes()
+    node_group.nodes[0]._ismaster = False
+
+    jelapic()._ = Mock(
+        side_effect=[
+            {"responses": [{"out": "3", "errOut": "", "result": 0}]},
+            {"responses": [{"out": "YWJj", "errOut": "", "result": 0}]},
+        ]
+    )
+    assert list(node_group.iter_file("/etc/hosts")) == [b"abc"]
+    assert jelapic()._.call_args[1]["nodeid"] == 2
+
+    jelapic()._ = Mock(return_value={"result": 0})
+    node_group.write_file("/etc/hosts", ["ab", "cd", "e"], chunk_size=3)
+    assert [
+        (c[1]["body"], c[1]["isAppendMode"], c[1]["nodeGroup"])
+        for c in jelapic()._.call_args_list
+    ] == [("abc", False, "cp"), ("de", True, "cp")]
+
+    node_group._parent.status = JelasticEnvironment.Status.STOPPED
+    with pytest.raises(JelasticObjectException):
+        node_group.write_file("/etc/hosts", "")
+    with pytest.raises(JelasticObjectException):
+        node_group.iter_file("/etc/hosts")
+    node_group.nodes = []
+    with pytest.raises(JelasticObjectException):
+        node_group.iter_file("/etc/hosts")
@@ -1,3 +1,4 @@
+import io
 from datetime import datetime
 
 import pytest
@@ -13,6 +14,7 @@ from jelapi.classes.jelasticobject import (
     _JelAttrIPv4,
     _JelAttrList,
     _JelAttrStr,
+    _text_chunks,
 )
 
 
@@ -206,3 +208,88 @@ def test_JelasticObject_is_abstract():
     """
     with pytest.raises(TypeError):
         _JelasticObject()
+
+
+def test_JelasticObject_subclasses_get_attribute_registries():
+    """
+    The read-write _JelasticAttributes are listed once per class
+    """
+
+    class Test(_JelasticObject):
+        ro = _JelAttrStr(read_only=True)
+        rw = _JelAttrStr()
+        lst = _JelAttrList(checked_for_differences=False)
+        dct = _JelAttrDict(checked_for_differences=False)
+
+        def save_to_jelastic(self):
+            pass
+
+    assert [a.public_name for a in Test._jelattrs] == ["rw", "lst", "dct"]
+    assert [a.public_name for a in Test._jelattrs_checked] == ["rw"]
+    assert [a.public_name for a in Test._jelattrs_lists] == ["lst"]
+    assert [a.public_name for a in Test._jelattrs_dicts] == ["dct"]
+
+    t = Test()
+    t._ro = "read-only"
+    t.rw = "read-write"
+    t.copy_self_as_from_api()
+    assert set(t._from_api) == {"rw", "copied_to_api_at"}
+    assert not t.differs_from_api()
+
+    t.lst = []
+    t.copy_self_as_from_api("lst")
+    assert t._from_api["lst"] == []
+    t.rw = "changed"
+    assert t.differs_from_api()
+
+
+def test_JelasticObject_snapshots_are_frozen_and_reference_children():
+    """
+    copy_self_as_from_api() freezes lists and dicts, but doesn't copy the children objects
+    """
+
+    class Child(_JelasticObject):
+        def save_to_jelastic(self):
+            pass
+
+    class Test(_JelasticObject):
+        lst = _JelAttrList()
+        dct = _JelAttrDict()
+        children = _JelAttrList(checked_for_differences=False)
+
+        def save_to_jelastic(self):
+            pass
+
+    child = Child()
+    t = Test()
+    t.lst = ["a", ["b"]]
+    t.dct = {"a": {"b": "c"}}
+    t.children = [child]
+    t.copy_self_as_from_api()
+
+    assert t._from_api["lst"] == ["a", ["b"]]
+    assert t._from_api["dct"] == {"a": {"b": "c"}}
+    assert t._from_api["children"][0] is child
+    with pytest.raises(TypeError):
+        t._from_api["dct"]["a"] = "b"
+    with pytest.raises(TypeError):
+        t._from_api["dct"]["a"]["b"] = "d"
+    with pytest.raises(AttributeError):
+        t._from_api["lst"].append("c")
+
+    # Changes in the attributes don't leak into the snapshot
+    t.lst[1].append("c")
+    assert t._from_api["lst"] == ["a", ["b"]]
+    assert t.lst != t._from_api["lst"]
+
+
+def test_text_chunks():
+    """
+    str, text files and iterables of str are split in chunks of chunk_size characters
+    """
+    for content in ["0123456789", io.StringIO("0123456789"), ["01", "2345678", "9"]]:
+        assert list(_text_chunks(content, 4)) == ["0123", "4567", "89"]
+    assert list(_text_chunks("", 4)) == []
+    assert list(_text_chunks(["0", "123456789ab"], 4)) == ["0123", "4567", "89ab"]
+    with pytest.raises(ValueError):
+        list(_text_chunks("0123", 0))
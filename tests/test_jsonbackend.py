@@ -0,0 +1,91 @@
+import json
+
+import pytest
+
+from jelapi import jsonbackend
+
+
+@pytest.fixture(params=["orjson", "ujson", "json"])
+def backend(request):
+    pytest.importorskip(request.param)
+    previous = jsonbackend.backend
+    assert jsonbackend.use(request.param) == request.param
+    yield request.param
+    jsonbackend.use(previous)
+
+
+def test_jsonbackend_roundtrips(backend):
+    obj = {"envName": "env/name", "nodes": [{"id": 1, "ok": True}], "é": None}
+    assert isinstance(jsonbackend.dumps(obj), str)
+    assert json.loads(jsonbackend.dumps(obj)) == obj
+    assert jsonbackend.loads(json.dumps(obj)) == obj
+    assert jsonbackend.loads(json.dumps(obj).encode()) == obj
+
+
+def test_jsonbackend_serializes_non_str_keys_like_json(backend):
+    assert json.loads(jsonbackend.dumps({1: "a"})) == {"1": "a"}
+
+
+def test_jsonbackend_prefers_the_fastest():
+    previous = jsonbackend.backend
+    try:
+        assert jsonbackend.use() == next(
+            name for name in ["orjson", "ujson", "json"] if _installed(name)
+        )
+    finally:
+        jsonbackend.use(previous)
+
+
+def test_jsonbackend_refuses_missing_backends():
+    jsonbackend._BACKENDS["missing"] = _missing
+    try:
+        with pytest.raises(ImportError):
+            jsonbackend.use("missing")
+    finally:
+        del jsonbackend._BACKENDS["missing"]
+
+
+def _installed(name):
+    try:
+        __import__(name)
+        return True
+    except ImportError:
+        return False
+
+
+def _missing():
+    import jelapi_missing_json_backend  # noqa
+
+
+def test_array_stream_yields_items_whatever_the_chunks():
+    doc = {
+        "result": 0,
+        "before": {"infos": [0]},
+        "note": "infos",
+        "infos": [
+            {"a": 'b\\"}]', "c": [1, {"d": "é"}]},
+            {"e": "\\\\"},
+            [1, 2],
+        ],
+        "after": {"k": "]"},
+    }
+    data = json.dumps(doc).encode()
+    for size in [1, 2, 7, len(data)]:
+        chunks = [data[i:][:size] for i in range(0, len(data), size)]
+        stream = jsonbackend.ArrayStream(chunks, "infos")
+        assert list(stream) == doc["infos"]
+        assert stream.envelope == {**doc, "infos": []}
+
+
+def test_array_stream_is_lazy():
+    def chunks():
+        yield b'{"infos": [{"a": 1}, '
+        raise AssertionError("Read too far")
+
+    assert next(iter(jsonbackend.ArrayStream(chunks(), "infos"))) == {"a": 1}
+
+
+def test_array_stream_without_the_array():
+    stream = jsonbackend.ArrayStream([b'{"result": 1, "error": "failed"}'], "infos")
+    assert list(stream) == []
+    assert stream.envelope == {"result": 1, "error": "failed"}
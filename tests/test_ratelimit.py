@@ -0,0 +1,121 @@
+import threading
+from unittest.mock import Mock, patch
+
+import pytest
+import respx
+from httpx import Response, codes
+
+import jelapi
+from jelapi.connector import JelasticAPIConnector
+from jelapi.ratelimit import FileTokenBucketRateLimiter, TokenBucketRateLimiter
+
+APIURL = "https://api.example.org/"
+
+
+def test_token_bucket_allows_bursts_then_rate():
+    limiter = TokenBucketRateLimiter(rate=2, burst=3)
+    limiter._clock = Mock(return_value=100.0)
+
+    assert [limiter.reserve("Environment.Control") for _ in range(5)] == [
+        0,
+        0,
+        0,
+        0.5,
+        1.0,
+    ]
+    # Families have their own buckets
+    assert limiter.reserve("Environment.File") == 0
+
+    # Tokens come back with time
+    limiter._clock.return_value = 104.0
+    assert limiter.reserve("Environment.Control") == 0
+
+
+def test_token_bucket_rates_per_family():
+    limiter = TokenBucketRateLimiter(
+        rate=10, burst=10, rates={"Environment.File": (1, 1)}
+    )
+    limiter._clock = Mock(return_value=100.0)
+
+    assert limiter.reserve("Environment.File") == 0
+    assert limiter.reserve("Environment.File") == 1.0
+    assert limiter.reserve("Environment.Control") == 0
+
+
+def test_token_bucket_refuses_nonsense():
+    with pytest.raises(ValueError):
+        TokenBucketRateLimiter(rate=0)
+    with pytest.raises(ValueError):
+        TokenBucketRateLimiter(rate=1, burst=0)
+
+
+def test_token_bucket_is_shared_between_threads():
+    limiter = TokenBucketRateLimiter(rate=10, burst=1)
+    limiter._clock = Mock(return_value=100.0)
+    delays = []
+
+    def reserve():
+        for _ in range(10):
+            delays.append(limiter.reserve("Environment.Control"))
+
+    threads = [threading.Thread(target=reserve) for _ in range(4)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+
+    # Each reservation waits for its own slot
+    assert sorted(delays) == pytest.approx([i / 10 for i in range(40)])
+
+
+def test_file_token_bucket_is_shared_between_limiters(tmp_path):
+    path = str(tmp_path / "jelapi-ratelimit")
+    first = FileTokenBucketRateLimiter(path, rate=1, burst=1)
+    second = FileTokenBucketRateLimiter(path, rate=1, burst=1)
+    first._clock = second._clock = Mock(return_value=100.0)
+
+    assert first.reserve("Environment.Control") == 0
+    assert second.reserve("Environment.Control") == 1.0
+    assert first.reserve("Environment.Control") == 2.0
+
+    # A corrupted file is reset
+    with open(path, "w") as f:
+        f.write("not json")
+    assert second.reserve("Environment.Control") == 0
+
+
+@respx.mock
+def test_connector_waits_for_the_rate_limiter():
+    """
+    The connector reserves each call on its function family, and sleeps as told
+    """
+    limiter = Mock()
+    limiter.reserve = Mock(return_value=0.25)
+    japic = JelasticAPIConnector(apiurl=APIURL, apitoken="string", rate_limiter=limiter)
+
+    respx.post(f"{APIURL}environment/control/rest/getenvs").mock(
+        return_value=Response(status_code=codes.OK, json={"result": 0})
+    )
+    with patch("jelapi.connector.time.sleep") as sleep:
+        japic._("Environment.Control.GetEnvs")
+    limiter.reserve.assert_called_once_with("Environment.Control")
+    sleep.assert_called_once_with(0.25)
+
+
+@respx.mock
+def test_connector_uses_the_global_rate_limiter():
+    limiter = Mock()
+    limiter.reserve = Mock(return_value=0)
+    japic = JelasticAPIConnector(apiurl=APIURL, apitoken="string")
+
+    respx.post(f"{APIURL}environment/file/rest/read").mock(
+        return_value=Response(status_code=codes.OK, json={"result": 0})
+    )
+    jelapi.rate_limiter = limiter
+    try:
+        with patch("jelapi.connector.time.sleep") as sleep:
+            japic._("Environment.File.Read")
+    finally:
+        jelapi.rate_limiter = None
+    limiter.reserve.assert_called_once_with("Environment.File")
+    sleep.assert_not_called()
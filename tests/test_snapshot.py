@@ -0,0 +1,208 @@
+import asyncio
+import threading
+from unittest.mock import Mock
+
+import pytest
+import respx
+from httpx import Response, codes
+
+import jelapi
+from jelapi import api_connector as jelapic
+from jelapi.classes import JelasticEnvironment
+from jelapi.connector import AsyncJelasticAPIConnector, JelasticAPIConnector
+from jelapi.snapshot import FleetSnapshot
+
+from .utils import get_standard_env, get_standard_node, get_standard_node_groups
+
+APIURL = "https://api.example.org/"
+
+
+def get_info(envName="envName", fixed_cloudlets=1):
+    return {
+        "env": {**get_standard_env(), "envName": envName},
+        "nodeGroups": get_standard_node_groups(),
+        "nodes": [get_standard_node(fixed_cloudlets=fixed_cloudlets)],
+    }
+
+
+@pytest.fixture
+def snapshot(tmp_path):
+    return FleetSnapshot(str(tmp_path / "jelapi.sqlite"))
+
+
+def record(snapshot, function, response, **kwargs):
+    snapshot.record(jelapi.api_url, jelapi.api_token, function, kwargs, response)
+
+
+@respx.mock
+def test_connector_records_snapshotted_responses(snapshot):
+    respx.post(url__startswith=APIURL).mock(
+        return_value=Response(status_code=codes.OK, json={"result": 0, "infos": []})
+    )
+    japic = JelasticAPIConnector(apiurl=APIURL, apitoken="token")
+    jelapi.fleet_snapshot = snapshot
+    try:
+        japic._("Environment.Control.GetEnvs")
+        japic._("Environment.Control.GetEnvInfo", envName="env")
+        japic._("Environment.Control.GetContainerEnvVars", envName="env")
+    finally:
+        jelapi.fleet_snapshot = None
+
+    api_url, api_token = jelapi.api_url, jelapi.api_token
+    jelapi.api_url, jelapi.api_token = APIURL, "token"
+    try:
+        assert snapshot.stored_at("Environment.Control.GetEnvs")
+        assert snapshot.stored_at("Environment.Control.GetEnvInfo", envName="env")
+        assert not snapshot.stored_at("Environment.Control.GetEnvInfo", envName="o")
+        assert not snapshot.stored_at("Environment.Control.GetContainerEnvVars")
+        # Other accounts don't see it
+        jelapi.api_token = "other-token"
+        assert not snapshot.stored_at("Environment.Control.GetEnvs")
+    finally:
+        jelapi.api_url, jelapi.api_token = api_url, api_token
+
+
+def test_snapshot_expands_the_home_directory(tmp_path, monkeypatch):
+    monkeypatch.setenv("HOME", str(tmp_path))
+    snapshot = FleetSnapshot("~/jelapi.sqlite")
+    assert snapshot.path == str(tmp_path / "jelapi.sqlite")
+    assert (tmp_path / "jelapi.sqlite").exists()
+
+
+@respx.mock
+def test_async_connector_records_off_the_event_loop(snapshot):
+    respx.post(url__startswith=APIURL).mock(
+        return_value=Response(status_code=codes.OK, json={"result": 0, "infos": []})
+    )
+    japic = AsyncJelasticAPIConnector(apiurl=APIURL, apitoken="token")
+    threads = []
+    record = snapshot.record
+
+    def recording(*args):
+        threads.append(threading.current_thread())
+        record(*args)
+
+    snapshot.record = recording
+    jelapi.fleet_snapshot = snapshot
+    try:
+        asyncio.run(japic._("Environment.Control.GetEnvs"))
+        # Not for the functions that aren't snapshotted
+        asyncio.run(japic._("Environment.Control.GetContainerEnvVars", envName="env"))
+    finally:
+        jelapi.fleet_snapshot = None
+
+    assert len(threads) == 1
+    assert threads[0] is not threading.current_thread()
+
+    api_url, api_token = jelapi.api_url, jelapi.api_token
+    jelapi.api_url, jelapi.api_token = APIURL, "token"
+    try:
+        assert snapshot.stored_at("Environment.Control.GetEnvs")
+    finally:
+        jelapi.api_url, jelapi.api_token = api_url, api_token
+
+
+def test_snapshot_hydrates_environments_then_revalidates(snapshot):
+    record(
+        snapshot,
+        "Environment.Control.GetEnvs",
+        {"result": 0, "infos": [get_info(), get_info("gone")]},
+    )
+    jelapic()._ = Mock(return_value={"result": 0, "infos": [get_info()]})
+    envs = snapshot.environments(revalidate=False)
+    assert list(envs) == ["envName", "gone"]
+    jelapic()._.assert_not_called()
+
+    jelapic()._ = Mock(
+        return_value={"result": 0, "infos": [get_info(fixed_cloudlets=3)]}
+    )
+    revalidated = []
+    envs = snapshot.environments(on_revalidated=revalidated.append)
+    env = envs["envName"]
+    snapshot.revalidation.join()
+    jelapic()._.assert_called_once_with("Environment.Control.GetEnvs")
+    assert revalidated == [snapshot.revalidated]
+    assert list(snapshot.revalidated) == ["envName"]
+    assert snapshot.revalidated["envName"].nodeGroups["cp"].nodes[0].fixedCloudlets == 3
+    # The hydrated ones are left alone
+    assert list(envs) == ["envName", "gone"]
+    assert envs["envName"] is env
+    assert env.nodeGroups["cp"].nodes[0].fixedCloudlets == 1
+
+
+def test_snapshot_can_be_iterated_during_revalidation(snapshot):
+    record(
+        snapshot,
+        "Environment.Control.GetEnvs",
+        {"result": 0, "infos": [get_info(f"env{i}") for i in range(20)]},
+    )
+    release = threading.Event()
+
+    def getenvs(*args, **kwargs):
+        release.wait(1)
+        return {"result": 0, "infos": [get_info("other")]}
+
+    jelapic()._ = Mock(side_effect=getenvs)
+    envs = snapshot.environments()
+    names = []
+    for name, env in envs.items():
+        release.set()
+        snapshot.revalidation.join()
+        names.append(env.envName)
+    assert names == [f"env{i}" for i in range(20)]
+    assert list(snapshot.revalidated) == ["other"]
+
+
+def test_snapshot_hydrates_one_environment(snapshot):
+    record(
+        snapshot,
+        "Environment.Control.GetEnvInfo",
+        {"result": 0, **get_info()},
+        envName="envName",
+    )
+    jelapic()._ = Mock(return_value={"result": 0, **get_info(fixed_cloudlets=3)})
+    revalidated = []
+    env = snapshot.environment("envName", on_revalidated=revalidated.append)
+    assert env.envName == "envName"
+    snapshot.revalidation.join()
+    assert revalidated == [snapshot.revalidated]
+    assert snapshot.revalidated.nodeGroups["cp"].nodes[0].fixedCloudlets == 3
+    assert env.nodeGroups["cp"].nodes[0].fixedCloudlets == 1
+
+
+def test_snapshot_hydrates_env_groups(snapshot):
+    def group(name, color="#123456"):
+        return {
+            "id": 1,
+            "name": name,
+            "isIsolated": False,
+            "visibility": 0,
+            "color": color,
+        }
+
+    record(
+        snapshot,
+        "Environment.Group.GetGroups",
+        {"result": 0, "array": [group("a"), group("b")]},
+    )
+    jelapic()._ = Mock(
+        return_value={"result": 0, "array": [group("a", "#654321"), group("c")]}
+    )
+    revalidated = []
+    groups = snapshot.env_groups(on_revalidated=revalidated.append)
+    a = groups["a"]
+    snapshot.revalidation.join()
+    assert revalidated == [snapshot.revalidated]
+    assert sorted(snapshot.revalidated) == ["a", "c"]
+    assert snapshot.revalidated["a"].color == "#654321"
+    assert sorted(groups) == ["a", "b"]
+    assert groups["a"] is a
+    assert a.color == "#123456"
+
+
+def test_snapshot_falls_back_to_the_api(snapshot):
+    jelapic()._ = Mock(return_value={"result": 0, "infos": [get_info()]})
+    JelasticEnvironment.dict.cache_clear()
+    assert list(snapshot.environments()) == ["envName"]
+    jelapic()._.assert_called_once_with("Environment.Control.GetEnvs")
+    assert snapshot.revalidation is None
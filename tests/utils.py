@@ -1,6 +1,17 @@
+from unittest.mock import Mock
+
 from jelapi.classes import JelasticEnvironment, JelasticNodeGroup
 
 
+class AsyncMock(Mock):
+    """
+    Mock whose calls need to be awaited (unittest.mock.AsyncMock is Python 3.8+)
+    """
+
+    async def __call__(self, *args, **kwargs):
+        return super().__call__(*args, **kwargs)
+
+
 def get_standard_node_group(
     node_group_type: JelasticNodeGroup.NodeGroupType = JelasticNodeGroup.NodeGroupType.APPLICATION_SERVER,
 ):